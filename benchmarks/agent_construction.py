@@ -0,0 +1,108 @@
+"""Per-request agent construction cost: `Agent(...)` vs `AgentTemplate.spawn()`
+
+Builds an agent with 10 tools and a managed agent, as a server would do per request, either from scratch (resolving
+the LLM from the settings, wrapping the tools in `Action`s and building the `AgentRegistry`) or by spawning it from
+an `AgentTemplate`.
+
+Usage:
+    python benchmarks/agent_construction.py [--repeat 2000]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable
+
+from game.action import tool
+from game.agent import Agent
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.template import AgentTemplate
+
+GOALS = [
+    Goal(priority=1, name="Answer", description="Answer the questions of the user"),
+    Goal(priority=2, name="Terminate", description="Terminate when you are done"),
+]
+
+
+def _make_tool(i: int):
+    def lookup(query: str) -> str:
+        return query
+
+    lookup.__name__ = f"lookup_{i}"
+    lookup.__doc__ = f"Looks up the query in data source {i}"
+    return tool()(lookup)
+
+
+TOOLS = [_make_tool(i) for i in range(10)]
+LANGUAGE = AgentFunctionCallingActionLanguage()
+HELPER = Agent(
+    name="helper",
+    goals=GOALS,
+    agent_language=LANGUAGE,
+    tools=list(TOOLS),
+    debug_log_memory=False,
+)
+
+
+def build_agent() -> Agent:
+    return Agent(
+        name="assistant",
+        goals=GOALS,
+        agent_language=LANGUAGE,
+        tools=list(TOOLS),
+        managed_agents=[HELPER],
+        debug_log_memory=False,
+    )
+
+
+TEMPLATE = AgentTemplate(
+    name="assistant",
+    goals=GOALS,
+    agent_language=LANGUAGE,
+    tools=TOOLS,
+    managed_agents=[HELPER],
+    debug_log_memory=False,
+)
+
+
+def measure(build: Callable[[], Agent], repeat: int) -> float:
+    """Returns the mean construction time in microseconds"""
+    build()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        build()
+    return (time.perf_counter() - tic) / repeat * 1e6
+
+
+def run(repeat: int) -> list[dict]:
+    results = [
+        {"construction": "Agent(...)", "us_per_agent": measure(build_agent, repeat)},
+        {
+            "construction": "AgentTemplate.spawn()",
+            "us_per_agent": measure(TEMPLATE.spawn, repeat),
+        },
+    ]
+    for r in results:
+        r["speedup"] = results[0]["us_per_agent"] / r["us_per_agent"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=2_000)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"{'construction':<24}{'us/agent':>12}{'speedup':>10}")
+    for r in results:
+        print(f"{r['construction']:<24}{r['us_per_agent']:>12.2f}{r['speedup']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
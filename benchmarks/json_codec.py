@@ -0,0 +1,104 @@
+"""JSON codecs on large tool results: `json` vs `orjson` vs `msgspec` (see `game.codec`)
+
+Encodes a large tool result the way the agent loop does (the result of `Environment.execute_action` rendered as the
+content of a memory), encodes it indented (memories without content and tool descriptions) and decodes it back (LLM
+responses and tool call arguments). The codecs that aren't installed are skipped.
+
+Usage:
+    python benchmarks/json_codec.py [--rows 5000] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable
+
+from game.codec import CODECS, Codec, create_codec
+
+
+def tool_result(rows: int) -> dict:
+    """A search-like tool result with `rows` records"""
+    return {
+        "tool_executed": True,
+        "action": "search",
+        "result": [
+            {
+                "id": i,
+                "title": f"Result {i} – ünïcode",
+                "url": f"https://example.com/{i}",
+                "score": 1 / (i + 1),
+                "snippet": "lorem ipsum dolor sit amet " * 8,
+                "tags": ["a", "b", "c"],
+                "cached": i % 2 == 0,
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    """Returns the mean duration in milliseconds"""
+    function()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - tic) / repeat * 1e3
+
+
+def run(rows: int, repeat: int) -> list[dict]:
+    result = tool_result(rows)
+    codecs: list[Codec] = []
+    for name in CODECS:
+        try:
+            codecs.append(create_codec(name))
+        except ImportError:
+            continue
+
+    encoded = codecs[0].dumps(result)
+    results = []
+    for codec in codecs:
+        if codec.dumps(result) != encoded:
+            raise AssertionError(f"{codec} doesn't write the canonical JSON")
+        results.append(
+            {
+                "codec": codec.name,
+                "result_kb": len(encoded.encode("utf-8")) / 1024,
+                "dumps_ms": measure(lambda: codec.dumps(result), repeat),
+                "dumps_indent_ms": measure(
+                    lambda: codec.dumps(result, indent=True), repeat
+                ),
+                "loads_ms": measure(lambda: codec.loads(encoded), repeat),
+            }
+        )
+    for r in results:
+        r["speedup"] = (results[0]["dumps_ms"] + results[0]["loads_ms"]) / (
+            r["dumps_ms"] + r["loads_ms"]
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"result: {results[0]['result_kb']:.0f} KiB")
+    print(
+        f"{'codec':<10}{'dumps (ms)':>12}{'indent (ms)':>13}{'loads (ms)':>12}{'speedup':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['codec']:<10}{r['dumps_ms']:>12.2f}{r['dumps_indent_ms']:>13.2f}"
+            f"{r['loads_ms']:>12.2f}{r['speedup']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
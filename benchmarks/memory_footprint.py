@@ -0,0 +1,121 @@
+"""Memory footprint of an agent session: plain `dict` memories vs `MemoryItem`s
+
+Measures with `tracemalloc` the bytes allocated by a `DictMemory` holding a session of 1k/10k/100k memories, using:
+    - `dict`: the legacy representation, `{"type": ..., "content": ...}` with eagerly `json.dumps`-ed tool results
+    - `MemoryItem`: slotted items with interned types whose tool results are still pending serialisation
+    - `MemoryItem (rendered)`: the same items after their contents were rendered into a prompt once
+
+Usage:
+    python benchmarks/memory_footprint.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+
+AGENT_NAME = "benchmark_agent"
+
+
+def _result(i: int) -> dict:
+    return {
+        "tool_executed": True,
+        "action": "search",
+        "result": f"Search result number {i} for the user query",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def _response(i: int) -> str:
+    return f'{{"tool": "search", "args": {{"query": "question number {i}"}}}}'
+
+
+def build_dict_session(size: int) -> DictMemory:
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "Find the answers"})
+    for i in range(1, size, 2):
+        memory.add_memory({"type": "assistant", "content": _response(i)})
+        memory.add_memory({"type": "environment", "content": json.dumps(_result(i))})
+    return memory
+
+
+def build_item_session(size: int) -> DictMemory:
+    memory = DictMemory()
+    memory.add_memory(MemoryItem("user", "Find the answers", agent=AGENT_NAME))
+    for i in range(1, size, 2):
+        memory.add_memory(MemoryItem("assistant", _response(i), agent=AGENT_NAME))
+        memory.add_memory(
+            MemoryItem("environment", payload=_result(i), agent=AGENT_NAME)
+        )
+    return memory
+
+
+def build_rendered_item_session(size: int) -> DictMemory:
+    memory = build_item_session(size)
+    for item in memory.get_memories():
+        _ = item.content
+    return memory
+
+
+def measure(build: Callable[[int], DictMemory], size: int) -> int:
+    """Returns the number of bytes still allocated by the session returned by `build`"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    memory = build(size)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del memory
+    return after - before
+
+
+def run(sizes: list[int]) -> list[dict]:
+    representations = {
+        "dict": build_dict_session,
+        "MemoryItem": build_item_session,
+        "MemoryItem (rendered)": build_rendered_item_session,
+    }
+    results = []
+    for size in sizes:
+        for name, build in representations.items():
+            total = measure(build, size)
+            results.append(
+                {
+                    "representation": name,
+                    "items": size,
+                    "bytes_per_session": total,
+                    "bytes_per_item": total / size,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"{'representation':<24}{'items':>10}{'bytes/session':>16}{'bytes/item':>12}")
+    for r in results:
+        print(
+            f"{r['representation']:<24}{r['items']:>10}"
+            f"{r['bytes_per_session']:>16,}{r['bytes_per_item']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
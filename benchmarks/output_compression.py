@@ -0,0 +1,103 @@
+"""Extractive compression of tool results (see `game.compression`)
+
+Compresses a synthetic web page of `--kb` KiB, mostly boilerplate with a few paragraphs relevant to the task, with
+several token budgets. Reports the compression latency, the size reduction and whether the relevant sentences
+survived.
+
+Usage:
+    python benchmarks/output_compression.py [--kb 100] [--repeat 50]
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Callable
+
+from game.compression import OutputCompressor
+
+TASK = "When was Python 3.12 released and what are its new features?"
+GOALS = "Research: answer questions about programming languages"
+RELEVANT = [
+    "Python 3.12 was released on October 2, 2023.",
+    "The new features of Python 3.12 include the type parameter syntax and f-string improvements.",
+    "Python 3.12 also ships a per-interpreter GIL.",
+]
+BOILERPLATE = (
+    "Accept cookies to continue browsing our website. Sign up for our newsletter to get the latest deals. "
+    "Follow us on social media. Copyright all rights reserved. Our partners use tracking technologies. "
+    "Read more articles about gardening, cooking and travel. Download our mobile application today. "
+    "Contact customer support for any questions about your order. Free shipping on orders over fifty dollars."
+).split(". ")
+
+
+def page(kb: int, seed: int = 0) -> str:
+    """A `kb` KiB page of boilerplate lines with the `RELEVANT` sentences spread in it"""
+    rng = random.Random(seed)
+    lines = []
+    while sum(map(len, lines)) < kb * 1024:
+        lines.append(". ".join(rng.sample(BOILERPLATE, 4)) + ".")
+    for i, sentence in enumerate(RELEVANT):
+        lines.insert((i + 1) * len(lines) // (len(RELEVANT) + 1), sentence)
+    return "\n".join(lines)
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    """Returns the mean duration in milliseconds"""
+    function()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - tic) / repeat * 1e3
+
+
+def run(kb: int, repeat: int, budgets: list[int]) -> list[dict]:
+    text = page(kb)
+    query = f"{TASK}\n{GOALS}"
+    results = []
+    for max_tokens in budgets:
+        compressor = OutputCompressor(max_tokens=max_tokens)
+        compression = compressor.compress(text, query)
+        results.append(
+            {
+                "max_tokens": max_tokens,
+                "input_kb": len(text) / 1024,
+                "output_kb": len(compression.text) / 1024,
+                "reduction": len(text) / len(compression.text),
+                "relevant_kept": sum(s in compression.text for s in RELEVANT),
+                "compress_ms": measure(
+                    lambda: compressor.compress(text, query), repeat
+                ),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--kb", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument(
+        "--budgets", type=int, nargs="+", default=[250, 1_000, 4_000], metavar="TOKENS"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.kb, args.repeat, args.budgets)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"page: {results[0]['input_kb']:.0f} KiB, {len(RELEVANT)} relevant sentences")
+    print(
+        f"{'budget':>8}{'output (KiB)':>14}{'reduction':>11}{'relevant':>10}{'time (ms)':>11}"
+    )
+    for r in results:
+        print(
+            f"{r['max_tokens']:>8}{r['output_kb']:>14.1f}{r['reduction']:>10.0f}x"
+            f"{r['relevant_kept']:>8}/{len(RELEVANT)}{r['compress_ms']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""LLM calls and latency of a multi-step task: ReAct (`AgentJsonActionLanguage`) vs plan-and-execute (`AgentPlanLanguage`)
+
+The task looks up N cities (independent tool calls) and answers with a summary. The LLM is scripted and sleeps
+`--llm-latency` seconds per call, the tool sleeps `--tool-latency` seconds per call. ReAct needs N + 1 LLM calls and
+runs the lookups one after the other, a plan needs one LLM call and runs the lookups in parallel.
+
+Usage:
+    python benchmarks/plan_vs_react.py [--cities 4] [--llm-latency 0.5] [--tool-latency 0.2]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+
+import structlog
+
+from game.action import tool
+from game.agent import Agent
+from game.goal import Goal
+from game.language import AgentJsonActionLanguage, AgentPlanLanguage
+from game.language.base import AgentLanguage
+from game.llm.base import Llm
+from game.prompt import Prompt
+
+TOOL_LATENCY = 0.2
+
+
+@tool()
+def get_weather(city: str) -> dict:
+    """Returns the weather of a city"""
+    time.sleep(TOOL_LATENCY)
+    return {"city": city, "temperature": len(city)}
+
+
+class SleepingLlm(Llm):
+    def __init__(self, responses: list[str], latency: float):
+        self.responses = list(responses)
+        self.latency = latency
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "SleepingLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        time.sleep(self.latency)
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def _action(tool_name: str, args: dict) -> str:
+    return f"```action\n{json.dumps({'tool': tool_name, 'args': args})}\n```"
+
+
+def react_responses(cities: list[str]) -> list[str]:
+    return [_action("get_weather", {"city": city}) for city in cities] + [
+        _action("terminate", {"message": "Done"})
+    ]
+
+
+def plan_responses(cities: list[str]) -> list[str]:
+    steps = [
+        {"id": f"city_{i}", "tool": "get_weather", "args": {"city": city}}
+        for i, city in enumerate(cities)
+    ]
+    message = ", ".join(f"${{city_{i}.temperature}}" for i in range(len(cities)))
+    steps.append({"id": "answer", "tool": "terminate", "args": {"message": message}})
+    return [f"```plan\n{json.dumps({'steps': steps})}\n```"]
+
+
+def measure(language: AgentLanguage, responses: list[str], latency: float) -> dict:
+    llm = SleepingLlm(responses, latency)
+    agent = Agent(
+        goals=[Goal(priority=1, name="Weather", description="Report the weather")],
+        agent_language=language,
+        llm=llm,
+        tools=[get_weather],
+        debug_log_memory=False,
+    )
+    tic = time.perf_counter()
+    # `terminate` prints the final message
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        agent.run("What's the weather in these cities?")
+    return {"llm_calls": llm.calls, "wall_secs": time.perf_counter() - tic}
+
+
+def run(n_cities: int, llm_latency: float) -> list[dict]:
+    cities = [f"City{i}" for i in range(n_cities)]
+    results = [
+        {
+            "mode": "react",
+            **measure(AgentJsonActionLanguage(), react_responses(cities), llm_latency),
+        },
+        {
+            "mode": "plan",
+            **measure(AgentPlanLanguage(), plan_responses(cities), llm_latency),
+        },
+    ]
+    for r in results:
+        r["speedup"] = results[0]["wall_secs"] / r["wall_secs"]
+    return results
+
+
+def main():
+    global TOOL_LATENCY
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cities", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tool-latency", type=float, default=0.2)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    TOOL_LATENCY = args.tool_latency
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL)
+    )
+
+    results = run(args.cities, args.llm_latency)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"{'mode':<8}{'llm calls':>10}{'wall (s)':>10}{'speedup':>10}")
+    for r in results:
+        print(
+            f"{r['mode']:<8}{r['llm_calls']:>10}{r['wall_secs']:>10.2f}{r['speedup']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Session snapshot/restore: binary snapshots vs plain JSON
+
+Saves and restores a session of `--items` memories of `--content-size` bytes each (10MB by default) with:
+    - `json`: `json.dump` of the list of memory dictionaries and `json.load` into a `DictMemory`
+    - `binary`: `save_snapshot`/`load_snapshot` (memory-mapped, contents decoded lazily)
+    - `binary+zlib`: `save_snapshot(compression_level=1)`/`load_snapshot`
+
+and reports the file size, the save and restore times and the time to restore and read every content.
+
+Usage:
+    python benchmarks/snapshot.py [--items 10000] [--content-size 1000]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem, as_dict
+from game.memory.snapshot import load_snapshot, save_snapshot
+
+
+def build_session(items: int, content_size: int) -> DictMemory:
+    memory = DictMemory()
+    for i in range(items):
+        memory_type = ("assistant", "environment")[i % 2]
+        sentence = f"Memory {i} of type {memory_type} with some content. "
+        content = (sentence * (content_size // len(sentence) + 1))[:content_size]
+        memory.add_memory(MemoryItem(memory_type, content, agent="benchmark_agent"))
+    return memory
+
+
+def save_json(path: Path, memory: DictMemory) -> None:
+    with path.open("wt", encoding="utf-8") as f:
+        json.dump([as_dict(m) for m in memory.get_memories()], f)
+
+
+def load_json(path: Path) -> DictMemory:
+    memory = DictMemory()
+    with path.open("rt", encoding="utf-8") as f:
+        for m in json.load(f):
+            memory.add_memory(m)
+    return memory
+
+
+def _timeit(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - tic)
+    return min(timings)
+
+
+def _read_all(memory: DictMemory) -> None:
+    for m in memory.get_memories():
+        _ = m["content"]
+
+
+def run(items: int, content_size: int, repeat: int = 5) -> list[dict]:
+    memory = build_session(items, content_size)
+    formats = {
+        "json": (lambda p: save_json(p, memory), load_json),
+        "binary": (
+            lambda p: save_snapshot(p, memory),
+            lambda p: load_snapshot(p).memory,
+        ),
+        "binary+zlib": (
+            lambda p: save_snapshot(p, memory, compression_level=1),
+            lambda p: load_snapshot(p).memory,
+        ),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, (save, load) in formats.items():
+            path = Path(tmp_dir) / name
+            results.append(
+                {
+                    "format": name,
+                    "save_ms": _timeit(lambda: save(path), repeat) * 1000,
+                    "size_bytes": path.stat().st_size,
+                    "restore_ms": _timeit(lambda: load(path), repeat) * 1000,
+                    "restore_and_read_ms": _timeit(
+                        lambda: _read_all(load(path)), repeat
+                    )
+                    * 1000,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--content-size", type=int, default=1_000)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.items, args.content_size)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(
+        f"{'format':<14}{'size':>14}{'save ms':>10}{'restore ms':>12}{'restore+read ms':>17}"
+    )
+    for r in results:
+        print(
+            f"{r['format']:<14}{r['size_bytes']:>14,}{r['save_ms']:>10.2f}"
+            f"{r['restore_ms']:>12.2f}{r['restore_and_read_ms']:>17.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
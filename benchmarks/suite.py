@@ -0,0 +1,409 @@
+"""Framework overhead benchmark suite, runs offline with scripted LLMs
+
+Measures the time per operation of:
+    - `agent_run`: an `Agent.run` iteration vs the length of the history
+    - `agent_iterations`: an `Agent.run` of several tool calls, ie the overhead of the loop per iteration
+    - `construct_prompt`: both languages vs the number of tools and memories
+    - `parse_response`: both languages
+    - `tool_decoration`: the `@tool` decorator
+    - `execute_action`: `Environment.execute_action` dispatch with context injection
+    - `memory_handoff`: `call_agent_memory_handoff` to a sub-agent vs the length of the caller's history
+
+Each case is timed like `timeit`: the number of loops is calibrated to `--min-time` seconds, and the best and the
+median of `--repeat` repeats are reported. Logging is disabled unless `--log` is set, so the results measure the
+framework and not the console.
+
+Usage:
+    python benchmarks/suite.py run [--output results.json] [--filter construct_prompt] [--quick]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 0.1]
+    python benchmarks/suite.py run --output results.json --baseline baseline.json
+
+`compare` (or `run --baseline`) exits with status 1 if a case is more than `--threshold` slower than the baseline.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+import structlog
+
+# silence the logs emitted while importing the framework, `--log` enables them again
+structlog.configure(
+    wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL)
+)
+
+import game  # noqa: E402
+from game.action import tool
+from game.action.context import ActionContext
+from game.action.library.multi_agent import call_agent_memory_handoff
+from game.agent import Agent, AgentRegistry
+from game.environment import Environment
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.llm.base import Llm
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+from game.prompt import Prompt
+
+GOALS = [
+    Goal(priority=1, name="Answer", description="Answer the questions of the user"),
+    Goal(priority=2, name="Terminate", description="Terminate when you are done"),
+]
+LANGUAGES = {
+    "json": AgentJsonActionLanguage,
+    "function_calling": AgentFunctionCallingActionLanguage,
+}
+TERMINATE_CALL = {"tool": "terminate", "args": {"message": "done"}}
+RESPONSES = {
+    "json": f"I am done.\n\n```action\n{json.dumps(TERMINATE_CALL)}\n```",
+    "function_calling": json.dumps(TERMINATE_CALL),
+}
+LOOKUP_CALL = {"tool": "lookup_0", "args": {"query": "question", "limit": 2}}
+LOOKUP_RESPONSES = {
+    "json": f"Let me look it up.\n\n```action\n{json.dumps(LOOKUP_CALL)}\n```",
+    "function_calling": json.dumps(LOOKUP_CALL),
+}
+
+
+class ScriptedLlm(Llm):
+    def __init__(self, response: str):
+        self.response = response
+
+    @property
+    def name(self) -> str:
+        return "ScriptedLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        return self.response
+
+
+class CyclingLlm(Llm):
+    """Returns the responses in a loop"""
+
+    def __init__(self, *responses: str):
+        self.responses = responses
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "CyclingLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return response
+
+
+def _lookup(query: str, limit: int = 10) -> list[str]:
+    """Looks up the query in the knowledge base
+
+    Args:
+        query: The query
+        limit: The maximum number of results
+    """
+    return [query] * limit
+
+
+def make_tools(n: int) -> list:
+    tools = []
+    for i in range(n):
+
+        def lookup(query: str, limit: int = 10) -> list[str]:
+            return _lookup(query, limit)
+
+        lookup.__name__ = f"lookup_{i}"
+        lookup.__doc__ = _lookup.__doc__
+        tools.append(tool()(lookup))
+    return tools
+
+
+def make_history(n: int, agent_name: str = "benchmark_agent") -> list[MemoryItem]:
+    items = [MemoryItem("user", "Find the answers", agent=agent_name)]
+    for i in range(1, n):
+        if i % 2:
+            call = {"tool": "lookup_0", "args": {"query": f"question {i}"}}
+            items.append(MemoryItem("assistant", json.dumps(call), agent=agent_name))
+        else:
+            result = {"tool_executed": True, "result": f"Answer number {i}"}
+            items.append(MemoryItem("environment", payload=result, agent=agent_name))
+    return items
+
+
+def make_memory(items: list[MemoryItem]) -> DictMemory:
+    memory = DictMemory()
+    memory.items = list(items)
+    return memory
+
+
+def make_agent(
+    language: str = "function_calling",
+    tools: int = 5,
+    llm: Optional[Llm] = None,
+    **kwargs,
+) -> Agent:
+    return Agent(
+        name="benchmark_agent",
+        goals=GOALS,
+        agent_language=LANGUAGES[language](),
+        llm=llm or ScriptedLlm(RESPONSES[language]),
+        tools=make_tools(tools),
+        debug_log_memory=False,
+        **kwargs,
+    )
+
+
+# Each benchmark yields `(case parameters, operation)`, where the operation is the timed zero-argument callable
+
+
+def bench_agent_run(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    agent = make_agent()
+    for history in (0, 100) if quick else (0, 100, 1_000, 10_000):
+        items = make_history(history)
+        yield {"history": history}, lambda items=items: agent.run(
+            "Go", memory=make_memory(items)
+        )
+
+
+def bench_agent_iterations(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    iterations = 10
+    for language in LANGUAGES:
+        # `iterations - 1` tool calls and a `terminate`
+        llm = CyclingLlm(
+            *[LOOKUP_RESPONSES[language]] * (iterations - 1), RESPONSES[language]
+        )
+        agent = make_agent(language, llm=llm)
+        yield {
+            "language": language,
+            "iterations": iterations,
+        }, lambda agent=agent: agent.run("Go")
+
+
+def bench_construct_prompt(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    for language, language_class in LANGUAGES.items():
+        for tools in (1, 20) if quick else (1, 20, 100):
+            actions = make_tools(tools)
+            for memories in (10, 1_000) if quick else (10, 1_000, 10_000):
+                memory = make_memory(make_history(memories))
+
+                def construct_prompt(agent_language=language_class()):
+                    return agent_language.construct_prompt(
+                        actions=actions, goals=GOALS, memory=memory
+                    )
+
+                yield {
+                    "language": language,
+                    "tools": tools,
+                    "memories": memories,
+                }, construct_prompt
+
+
+def bench_parse_response(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    for language, language_class in LANGUAGES.items():
+        agent_language, response = language_class(), RESPONSES[language]
+        yield {"language": language}, lambda: agent_language.parse_response(response)
+
+
+def bench_tool_decoration(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    yield {}, lambda: tool()(_lookup)
+
+
+def bench_execute_action(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    environment = Environment()
+    action = make_tools(1)[0]
+    for properties in (0, 10):
+        action_context = ActionContext({f"prop_{i}": i for i in range(properties)})
+        yield {
+            "context_properties": properties
+        }, lambda action_context=action_context: environment.execute_action(
+            action_context, action, {"query": "question"}
+        )
+
+
+def bench_memory_handoff(quick: bool) -> Iterator[tuple[dict, Callable]]:
+    sub_agent = make_agent(tools=1)
+    sub_agent._name = "sub_agent"
+    registry = AgentRegistry([sub_agent])
+    for history in (10, 1_000) if quick else (10, 1_000, 10_000):
+        items = make_history(history)
+
+        def handoff():
+            action_context = ActionContext(
+                {"memory": make_memory(items), "agent_registry": registry}
+            )
+            return call_agent_memory_handoff(action_context, "sub_agent", "Go")
+
+        yield {"history": history}, handoff
+
+
+BENCHMARKS = {
+    "agent_run": bench_agent_run,
+    "agent_iterations": bench_agent_iterations,
+    "construct_prompt": bench_construct_prompt,
+    "parse_response": bench_parse_response,
+    "tool_decoration": bench_tool_decoration,
+    "execute_action": bench_execute_action,
+    "memory_handoff": bench_memory_handoff,
+}
+
+
+def case_name(benchmark: str, params: dict) -> str:
+    if not params:
+        return benchmark
+    return f"{benchmark}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def measure(operation: Callable, repeat: int, min_time: float) -> dict:
+    """Returns the best and median seconds per operation, `timeit` style"""
+    loops = 1
+    while True:
+        tic = time.perf_counter()
+        for _ in range(loops):
+            operation()
+        elapsed = time.perf_counter() - tic
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        tic = time.perf_counter()
+        for _ in range(loops):
+            operation()
+        timings.append((time.perf_counter() - tic) / loops)
+    return {
+        "loops": loops,
+        "best_secs": min(timings),
+        "median_secs": statistics.median(timings),
+    }
+
+
+def run(
+    filters: Optional[list[str]] = None,
+    repeat: int = 5,
+    min_time: float = 0.2,
+    quick: bool = False,
+) -> dict:
+    results = {}
+    for benchmark, cases in BENCHMARKS.items():
+        if filters and not any(f in benchmark for f in filters):
+            continue
+        for params, operation in cases(quick):
+            name = case_name(benchmark, params)
+            # the `terminate` tool prints the final message
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                timings = measure(operation, repeat, min_time)
+            results[name] = {"benchmark": benchmark, "params": params, **timings}
+            print(
+                f"{name:<70}{results[name]['best_secs'] * 1e6:>14.2f} us",
+                file=sys.stderr,
+            )
+    return {
+        "metadata": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "game_version": game.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "min_time": min_time,
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """
+    Compares the best times of the cases present in both results
+
+    Returns:
+        A row per case with the `ratio` current/baseline, `regression` is set if the ratio exceeds `1 + threshold`
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["best_secs"] / baseline["results"][name]["best_secs"]
+        rows.append(
+            {
+                "case": name,
+                "baseline_secs": baseline["results"][name]["best_secs"],
+                "current_secs": result["best_secs"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: list[dict]) -> None:
+    print(f"{'case':<70}{'baseline us':>14}{'current us':>14}{'ratio':>8}")
+    for r in rows:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(
+            f"{r['case']:<70}{r['baseline_secs'] * 1e6:>14.2f}"
+            f"{r['current_secs'] * 1e6:>14.2f}{r['ratio']:>8.2f}{flag}"
+        )
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Runs the benchmarks")
+    run_parser.add_argument("--output", help="Writes the results as JSON to a file")
+    run_parser.add_argument(
+        "--filter", action="append", help="Runs the benchmarks containing this string"
+    )
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2)
+    run_parser.add_argument(
+        "--quick", action="store_true", help="Runs the small cases only"
+    )
+    run_parser.add_argument("--baseline", help="Compares the results to a baseline")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+    run_parser.add_argument("--log", action="store_true", help="Keeps the logging")
+
+    compare_parser = commands.add_parser("compare", help="Compares two results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows = compare(_load(args.baseline), _load(args.current), args.threshold)
+    else:
+        if args.log:
+            structlog.configure(
+                wrapper_class=structlog.make_filtering_bound_logger(logging.NOTSET)
+            )
+        results = run(args.filter, args.repeat, args.min_time, args.quick)
+        output = json.dumps(results, indent=4)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(output)
+        else:
+            print(output)
+        if not args.baseline:
+            return
+        rows = compare(_load(args.baseline), results, args.threshold)
+
+    print_comparison(rows)
+    if any(r["regression"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from colorama import Fore, Style, init
 from game.action import tool
 from game.action.context import ActionContext
 from game.logger import get_logger
+from game.suspension import SuspendRun
 
 init(autoreset=True)
 
@@ -41,7 +42,13 @@ def user_input(action_context: ActionContext, message: str) -> str:
 
     Returns:
         User's response as a string
+
+    Raises:
+        SuspendRun: If the agent suspends runs instead of blocking (see `game.suspension`), the reply is passed to
+            `Agent.resume`
     """
+    if action_context.get("suspend_user_input", False):
+        raise SuspendRun(message)
     agent_name = action_context.get("name", "")
     print("------")
     print(f"{Fore.YELLOW}[ASSISTANT ('{agent_name}')] {message}{Style.RESET_ALL}")
@@ -1,11 +1,36 @@
 """Multi-agent communication and memory patterns defined as tools"""
 
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Iterator
+
+from game import metrics, tracing
 from game.action import tool
 from game.action.context import ActionContext
 from game.action.library.default import logging
+from game.budget import Budget, use_budget
 from game.memory.dict_memory import DictMemory
 
 
+@contextmanager
+def _agent_call(agent, agent_name: str, pattern: str) -> Iterator[None]:
+    """Traces and measures the invocation of a sub-agent"""
+    with (
+        metrics.timed(
+            metrics.AGENT_CALL_DURATION,
+            metrics.AGENT_CALLS,
+            # the registered name is the label of the agents without one, eg duck-typed agents
+            agent=getattr(agent, "metrics_label", agent_name),
+            pattern=pattern,
+        ),
+        tracing.start_span(
+            "agent.call", {"agent.name": agent_name, "agent.call.pattern": pattern}
+        ),
+    ):
+        yield
+
+
 @tool(tool_name="call_agent")
 def call_agent_message_passing(
     action_context: ActionContext, agent_name: str, task: str
@@ -45,7 +70,8 @@ def call_agent_message_passing(
 
     try:
         # Run the agent with the provided task
-        result_memory = agent.run(user_input=task)
+        with _agent_call(agent, agent_name, "message_passing"):
+            result_memory = agent.run(user_input=task)
 
         # Get the last memory item as the result
         if result_memory.items:
@@ -107,31 +133,27 @@ def call_agent_with_reflection(
 
     logging.debug(f"Handing over to '{agent.name}': '{agent.description}'")
 
+    # The invoked agent starts with an empty view of the caller's memory, so its memories can be merged back
+    # without copying them one by one
+    invoked_memory = action_context.get_memory().fork(types=[])
+
     try:
         # Run the agent with the provided task
-        result_memory = agent.run(user_input=task)
+        with _agent_call(agent, agent_name, "reflection"):
+            result_memory = agent.run(user_input=task, memory=invoked_memory)
 
         # Get the last memory item as the result
         if result_memory.items:
-            # Get the caller's memory
-            caller_memory = action_context.get_memory()
-            # Add all memories from invoked agent to caller,
-            # although we could leave off the last memory to
-            # avoid duplication
-            for memory_item in result_memory.items:
-                caller_memory.add_memory(
-                    {
-                        "type": f"{agent_name}_thought",  # Mark source of memory
-                        "content": memory_item["content"],
-                    }
-                )
+            # Add all memories from invoked agent to caller marking the source of memory,
+            # although we could leave off the last memory to avoid duplication
+            memories_added = invoked_memory.merge(memory_type=f"{agent_name}_thought")
 
             last_memory = result_memory.items[-1]
             result = {
                 "success": True,
                 "agent": agent_name,
                 "result": last_memory.get("content", "No result content"),
-                "memories_added": len(result_memory.items),
+                "memories_added": memories_added,
             }
             logging.debug(f"Switching from agent: '{agent_name}' with result: {result}")
             return result
@@ -158,7 +180,8 @@ def call_agent_memory_handoff(
     """
     Invoke another agent to perform a specific task using the `Memory Handoff: Continuing the Conversation` pattern
     where the second agent picks up where the first agent left off, with full context of what’s happened so far.
-    All agents share and update the same `Memory` object.
+    The invoked agent works on a copy-on-write fork of the caller's `Memory` and its new memories are merged back
+    into the caller's memory once it terminates, or fails.
 
     Args:
         action_context: Contains registry of available agents
@@ -186,14 +209,15 @@ def call_agent_memory_handoff(
 
     logging.debug(f"Handing over to '{agent.name}': '{agent.description}'")
 
-    invoked_memory = action_context.get_memory()
+    invoked_memory = action_context.get_memory().fork()
 
     try:
         # Run the agent with the provided task
-        result_memory = agent.run(
-            user_input=task,
-            memory=invoked_memory,
-        )
+        with _agent_call(agent, agent_name, "memory_handoff"):
+            result_memory = agent.run(
+                user_input=task,
+                memory=invoked_memory,
+            )
 
         # Get the last memory item as the result
         if result_memory.items:
@@ -219,3 +243,122 @@ def call_agent_memory_handoff(
             f"Switching from agent: '{agent_name}' with error: {e.__class__.__name__}('{e}')"
         )
         return {"success": False, "error": str(e), "agent": agent_name}
+    finally:
+        # the caller keeps what the agent did, even when it failed
+        invoked_memory.merge()
+
+
+def _run_agent(agent, agent_name: str, task: str, budget: Budget) -> dict:
+    """
+    Runs the `agent` with a new memory and returns the content of its last memory as the result. The run stops at
+    its next budget check once `budget` is cancelled.
+    """
+    logging.debug(f"Running agent: '{agent_name}' for the task: '{task}'")
+    try:
+        with use_budget(budget), _agent_call(agent, agent_name, "parallel"):
+            result_memory = agent.run(user_input=task)
+        if result_memory.items:
+            return {
+                "success": True,
+                "agent": agent_name,
+                "result": result_memory.items[-1].get("content", "No result content"),
+            }
+        return {"success": False, "error": "Agent failed to run.", "agent": agent_name}
+    except Exception as e:
+        logging.debug(
+            f"Agent: '{agent_name}' failed with error: {e.__class__.__name__}('{e}')"
+        )
+        return {"success": False, "error": str(e), "agent": agent_name}
+
+
+@tool(tool_name="call_agents_parallel")
+def call_agents_parallel(
+    action_context: ActionContext,
+    calls: list[dict],
+    _default_timeout_secs: float = 300.0,
+) -> dict:
+    """
+    Invoke several agents concurrently, each one with its own task, using the `Message Passing` pattern.
+    Use it when the tasks are independent of each other, all the results are returned at once.
+
+    Args:
+        action_context: Contains registry of available agents
+        calls: A list of objects with the keys `agent_name` (name of the agent to call) and `task` (the task to
+            ask the agent to perform)
+        _default_timeout_secs: The default number of seconds to wait for each agent, unless the `ActionContext`
+            has an `agent_timeout_secs` property (this argument is hidden). The agents still running after the
+            timeout are cancelled, they stop before their next LLM call or tool (see `game.budget`). Agents hosted
+            in worker processes can't be cancelled.
+
+    Returns:
+        The results of all invoked agents in the order of the `calls`
+    """
+    agent_registry = action_context.get_agent_registry()
+    if not agent_registry:
+        error_message = f"No agent registry found in context!"
+        logging.error(error_message)
+        raise ValueError(error_message)
+
+    timeout = action_context.get("agent_timeout_secs", _default_timeout_secs)
+    # don't wait for the agents after the deadline of the budget of the run (see `game.budget`)
+    budget = action_context.get("budget")
+    if budget is not None and (seconds := budget.remaining()["seconds"]) is not None:
+        timeout = min(timeout, max(seconds, 0.0))
+    results = [None] * len(calls)
+    futures = {}
+    budgets: dict[int, Budget] = {}
+
+    # every agent runs on its own thread with a new memory, so the agents don't share any state
+    executor = ThreadPoolExecutor(
+        max_workers=max(len(calls), 1), thread_name_prefix="call_agents_parallel"
+    )
+    try:
+        for i, call in enumerate(calls):
+            agent_name, task = call.get("agent_name"), call.get("task")
+            agent = agent_registry.get_agent(agent_name)
+            if not agent:
+                results[i] = {
+                    "success": False,
+                    "error": f"Agent '{agent_name}' not found in registry: {agent_registry.get_agent_descriptions()}",
+                    "agent": agent_name,
+                }
+                continue
+            # each agent runs with its own budget, charging the one of the run if any, so it can be cancelled alone
+            budgets[i] = budget.child() if budget is not None else Budget()
+            # each agent runs in a copy of the caller's context, so its spans nest under the caller's span
+            context = contextvars.copy_context()
+            futures[
+                executor.submit(
+                    context.run, _run_agent, agent, agent_name, task, budgets[i]
+                )
+            ] = i
+
+        # all agents start together, so waiting once for `timeout` gives each of them `timeout` seconds
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            results[futures[future]] = future.result()
+        for future in not_done:
+            future.cancel()
+            budgets[futures[future]].cancel(f"Timed out after {timeout} seconds")
+            agent_name = calls[futures[future]].get("agent_name")
+            logging.error(f"Agent: '{agent_name}' timed out after {timeout} seconds")
+            results[futures[future]] = {
+                "success": False,
+                "error": f"Agent timed out after {timeout} seconds.",
+                "agent": agent_name,
+            }
+    finally:
+        # don't block the caller on agents that timed out, they stop at their next budget check
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    result = {"success": all(r["success"] for r in results), "results": results}
+    logging.debug(f"Parallel agents finished with result: {result}")
+    return result
+
+
+# The item schema of `calls` can't be inferred from the type hints, some providers reject arrays without it
+call_agents_parallel.parameters["properties"]["calls"]["items"] = {
+    "type": "object",
+    "properties": {"agent_name": {"type": "string"}, "task": {"type": "string"}},
+    "required": ["agent_name", "task"],
+}
@@ -0,0 +1,52 @@
+"""Plan-and-execute: runs a DAG of tool calls emitted by the LLM, see `game.plan`"""
+
+from game.action import tool
+from game.action.context import ActionContext
+from game.environment import Environment
+from game.plan import Plan, PlanExecutor
+
+PLAN_TOOL_NAME = "execute_plan"
+
+
+@tool(tool_name=PLAN_TOOL_NAME)
+def execute_plan(
+    action_context: ActionContext,
+    steps: list[dict],
+    _max_parallel_steps: int = 8,
+) -> dict:
+    """
+    Runs a plan of tool calls, the independent steps in parallel. The args of a step can reference the result of
+    an earlier step with `${step_id}` or `${step_id.key}`.
+
+    Args:
+        action_context: Contains the action registry and the environment of the agent (this argument is hidden)
+        steps: A list of objects with the keys `id`, `tool`, `args` and the optional `depends_on` (a list of step ids)
+        _max_parallel_steps: The maximum number of steps running concurrently, unless the `ActionContext` has a
+            `max_parallel_steps` property (this argument is hidden)
+
+    Returns:
+        The status and the result (or error) of every step, `terminated` is set if the terminal step ran
+    """
+    actions = action_context.get("actions")
+    if actions is None:
+        raise ValueError("No action registry found in context!")
+    executor = PlanExecutor(
+        action_context.get("environment") or Environment(),
+        max_parallel_steps=action_context.get(
+            "max_parallel_steps", _max_parallel_steps
+        ),
+    )
+    return executor.execute(Plan.from_dict(steps), actions, action_context).to_dict()
+
+
+# The item schema of `steps` can't be inferred from the type hints, some providers reject arrays without it
+execute_plan.parameters["properties"]["steps"]["items"] = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "tool": {"type": "string"},
+        "args": {"type": "object"},
+        "depends_on": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["id", "tool", "args"],
+}
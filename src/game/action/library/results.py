@@ -0,0 +1,37 @@
+"""Paged reads of the large tool results spilled by an `OutputPolicy`, see `game.results`"""
+
+from typing import Optional
+
+from game.action import tool
+from game.action.context import ActionContext
+from game.results import BlobNotFoundError
+
+READ_RESULT_TOOL_NAME = "read_result"
+
+
+@tool(tool_name=READ_RESULT_TOOL_NAME)
+def read_result(
+    action_context: ActionContext,
+    handle: str,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> dict:
+    """
+    Reads a part of a large tool result that was only previewed, by its handle
+
+    Args:
+        action_context: Contains the output policy of the agent (this argument is hidden)
+        handle: The handle of the result
+        offset: The index of the first character to read
+        length: The number of characters to read, capped by the output policy
+
+    Returns:
+        The `content` read, the `size` of the result and the `next_offset` to read (`None` at the end)
+    """
+    output_policy = action_context.get("output_policy")
+    if output_policy is None:
+        raise ValueError("No output policy found in context!")
+    try:
+        return output_policy.read(handle, offset, length)
+    except BlobNotFoundError:
+        raise ValueError(f"Unknown result handle '{handle}'")
@@ -8,32 +8,49 @@ different agents simply by changing the goals, actions, and environment without
 https://www.coursera.org/learn/ai-agents-python/ungradedWidget/h7RLK/agent-loop-customization
 """
 
-import json
 import time
 import uuid
+from functools import cached_property
 from json import JSONDecodeError
-from typing import Callable, Optional, Union
+from typing import Any, Callable, Optional, Union
 
 import game.action.library.multi_agent as multi_agent_communication
+from game import metrics, tracing
 from game.action import Action
 from game.action.context import ActionContext
 from game.action.library.default import terminate
+from game.action.library.plan import PLAN_TOOL_NAME
+from game.action.library.results import READ_RESULT_TOOL_NAME, read_result
 from game.action.python_registry import PythonActionRegistry
 from game.action.registry import ActionRegistry
+from game.budget import Budget, BudgetExceeded, current_budget, use_budget
+from game.compression import OutputCompressor
+from game.dedup import DEDUP_SAVED_CHARS_KEY, PromptDeduplicator
 from game.environment import Environment
 from game.goal import Goal
+from game.hooks import Hook, Stage, stage
 from game.language.base import AgentLanguage
 from game.language.exceptions import (
     ActionNotPresentInResponseError,
     ResponseIsNoneError,
 )
+from game.language.json_action_language import (
+    RETRY_AVOIDED_KEY,
+    STRUCTURED_OUTPUT_KEY,
+    StructuredOutputStats,
+)
+from game.language.repair import REPAIRS_KEY, RepairStats, match_tool_name
 from game.llm.base import Llm
 from game.llm.litellm_completion import LiteLlm
 from game.logger import get_logger
 from game.memory.base import Memory
 from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
 from game.prompt import Prompt
+from game.results import OutputPolicy
 from game.settings import get_settings
+from game.suspension import RunSuspended, SuspendedRun, SuspendedRunStore, SuspendRun
+from game.turn import Turn, TurnStage
 from game.utils.logs import log_memory
 
 logger = get_logger(__name__)
@@ -41,6 +58,15 @@ logger = get_logger(__name__)
 settings = get_settings()
 
 
+def _prompt_size(prompt: Prompt) -> dict:
+    """The size of a prompt as span attributes"""
+    return {
+        "prompt.messages": len(prompt.messages),
+        "prompt.chars": sum(len(str(m.get("content") or "")) for m in prompt.messages),
+        "prompt.tools": len(prompt.tools or []),
+    }
+
+
 class AgentRegistry:
     def __init__(self, managed_agents: Optional[list["Agent"]]):
         self.agents = {}
@@ -81,6 +107,13 @@ class Agent:
             Action, Callable
         ] = multi_agent_communication.call_agent_memory_handoff,
         debug_log_memory: bool = True,
+        agent_registry: Optional[AgentRegistry] = None,
+        hooks: Optional[list[Hook]] = None,
+        suspended_run_store: Optional[SuspendedRunStore] = None,
+        output_policy: Optional[OutputPolicy] = None,
+        output_compressor: Optional[OutputCompressor] = None,
+        prompt_deduplicator: Optional[PromptDeduplicator] = None,
+        budget_share: float = 1.0,
     ):
         """
         Initialize an agent with its core GAME components and capabilities.
@@ -99,12 +132,35 @@ class Agent:
             max_iterations: Maximum number of action loops
             debug_log_memory: If set to `True` it will print the memory of the agent right before it terminates using
                 the logger.
+            agent_registry: An optional `AgentRegistry` of the agents to manage, eg a `ProcessAgentRegistry` hosting
+                agents in worker processes. The `managed_agents` are registered to it.
+            hooks: Optional profiling hooks called around each stage of the agent loop, in addition to the globally
+                registered ones (see `game.hooks`)
+            suspended_run_store: If set, tools like `user_input` suspend the run instead of blocking, `run` raises
+                `RunSuspended` with a token and `resume` continues the run (see `game.suspension`). Managed agents
+                called by this agent use their own setting.
+            output_policy: If set, the tool results larger than its `max_result_chars` are spilled to its blob store,
+                the memory only keeps a preview and a handle, and the `read_result` tool is added to page through
+                them (see `game.results`)
+            output_compressor: If set, the long textual tool results are compressed to the sentences most relevant
+                to the task and the goals before being added to the memory (see `game.compression`)
+            prompt_deduplicator: If set, the large blocks repeated in the prompts (eg the tool list of every parse
+                error) are replaced with back-references to their first copy (see `game.dedup`)
+            budget_share: When the agent is called by another agent running with a budget, the fraction of the
+                caller's remaining budget its runs can spend (see `game.budget`)
         """
         self.goals = goals
         self.agent_language = agent_language
         self.llm = llm or LiteLlm.from_settings()
         self.tools = tools or []
-        if managed_agents:
+        for language_tool in agent_language.get_tools():
+            if not any(t.name == language_tool.name for t in self.tools):
+                self.tools.append(language_tool)
+        if output_policy is not None and not any(
+            t.name == READ_RESULT_TOOL_NAME for t in self.tools
+        ):
+            self.tools.append(read_result)
+        if managed_agents or agent_registry:
             self.tools.append(multi_agents_memory_model)
 
         # if there isn't any terminal tool, add a basic one
@@ -114,20 +170,49 @@ class Agent:
             )
             self.tools.append(terminate)
 
-        self.agent_registry = AgentRegistry(managed_agents) if managed_agents else None
+        if agent_registry:
+            for agent in managed_agents or []:
+                agent_registry.register_agent(agent)
+        elif managed_agents:
+            agent_registry = AgentRegistry(managed_agents)
+        self.agent_registry = agent_registry
 
         self.actions = PythonActionRegistry(self.tools)
         self.environment = environment or Environment()
         self.max_iterations = max_iterations
         self.debug_log_memory = debug_log_memory
+        self.hooks = list(hooks or [])
+        self.suspended_run_store = suspended_run_store
+        self.repair_stats = RepairStats()
+        self.structured_output_stats = StructuredOutputStats()
+        self.output_policy = output_policy
+        self.output_compressor = output_compressor
+        self.prompt_deduplicator = prompt_deduplicator
+        self.budget_share = budget_share
+        # the stages of each iteration of the loop, see `game.turn`
+        self.turn_stages: list[tuple[str, TurnStage]] = [
+            (Stage.PROMPT, self._prompt_stage),
+            (Stage.LLM, self._llm_stage),
+            (Stage.PARSE, self._parse_stage),
+            (Stage.TOOL, self._tool_stage),
+            (Stage.MEMORY, self._memory_stage),
+            (Stage.TERMINATION, self._termination_stage),
+        ]
 
         self._name = name or str(uuid.uuid4())
+        # the agents spawned by a template keep its label, see `game.metrics`
+        self._metrics_label = name or metrics.ANONYMOUS_AGENT
         self._description = description
 
     @property
     def name(self) -> str:
         return self._name
 
+    @property
+    def metrics_label(self) -> str:
+        """The `agent` label of the metrics, the name given to the agent or its template, or `anonymous`"""
+        return self._metrics_label
+
     @property
     def description(self) -> str:
         if self._description:
@@ -139,6 +224,28 @@ class Agent:
     def __repr__(self):
         return f"Agent(name='{self.name}, description='{self.description}')"
 
+    def __copy__(self) -> "Agent":
+        """
+        A shallow copy, the stages of its turns bound to the copy so it uses its own environment, hooks... and with
+        its own (empty) repair and structured output stats
+        """
+        agent = self.__class__.__new__(self.__class__)
+        agent.__dict__.update(self.__dict__)
+        agent.repair_stats = RepairStats()
+        agent.structured_output_stats = StructuredOutputStats()
+        agent.turn_stages = [
+            (
+                name,
+                (
+                    getattr(agent, function.__name__)
+                    if getattr(function, "__self__", None) is self
+                    else function
+                ),
+            )
+            for name, function in self.turn_stages
+        ]
+        return agent
+
     def _construct_prompt(
         self,
         goals: list[Goal],
@@ -146,16 +253,27 @@ class Agent:
         actions: ActionRegistry,
     ) -> Prompt:
         """Build prompt with memory context"""
-        return self.agent_language.construct_prompt(
-            actions=actions.get_actions(),
-            goals=goals,
-            memory=memory,
-            managed_agent_descriptions=(
-                self.agent_registry.get_agent_descriptions()
-                if self.agent_registry
-                else None
-            ),
-        )
+        with tracing.start_span("agent.construct_prompt") as span:
+            prompt = self.agent_language.construct_prompt(
+                actions=actions.get_actions(),
+                goals=goals,
+                memory=memory,
+                managed_agent_descriptions=(
+                    self.agent_registry.get_agent_descriptions()
+                    if self.agent_registry
+                    else None
+                ),
+            )
+            if self.prompt_deduplicator is not None:
+                prompt.messages, saved = self.prompt_deduplicator.deduplicate(
+                    prompt.messages
+                )
+                prompt.metadata[DEDUP_SAVED_CHARS_KEY] = saved
+                metrics.PROMPT_DEDUP_SAVED_CHARS.inc(saved, agent=self._metrics_label)
+                span.set_attribute("prompt.dedup_saved_chars", saved)
+            if tracing.is_enabled():
+                span.set_attributes(_prompt_size(prompt))
+            return prompt
 
     def _get_action(self, response) -> tuple[Action, dict]:
         """
@@ -165,45 +283,118 @@ class Agent:
             response: The LLM response as a string
 
         Returns:
-            A tuple of the Action object and the deserialized `response` as dictionary
+            A tuple of the Action object and the deserialized `response` as dictionary. If the response was repaired
+            (see `game.language.repair`) the dictionary lists the repairs under `REPAIRS_KEY`.
         """
-        invocation = self.agent_language.parse_response(response)
-        action = self.actions.get_action(invocation["tool"])
+        with tracing.start_span("agent.parse_response") as span:
+            invocation = self.agent_language.parse_response(response)
+            action = self.actions.get_action(invocation["tool"])
+            if action is None and self.agent_language.repair:
+                tool_name = match_tool_name(invocation["tool"], self.actions.actions)
+                if tool_name is not None:
+                    action = self.actions.get_action(tool_name)
+                    invocation["tool"] = tool_name
+                    invocation[REPAIRS_KEY] = invocation.get(REPAIRS_KEY, []) + [
+                        "tool_name"
+                    ]
+            span.set_attribute("tool.name", invocation["tool"])
+            if repairs := invocation.get(REPAIRS_KEY):
+                span.set_attribute("parse.repairs", ",".join(repairs))
         logger.debug(
             f"Getting action for agent '{self.name}' for {response=} is {invocation=} {action=}"
         )
         return action, invocation
 
-    def _should_terminate(self, response: str) -> bool:
+    def _should_terminate(
+        self, action: Optional[Action], result: Optional[dict] = None
+    ) -> bool:
         """
-        Checks weather the agent loop should terminate based on the action taken from the `response`
+        Checks weather the agent loop should terminate based on the action taken
 
         Args:
-            response: The LLM response as a string
+            action: The `Action` parsed from the LLM response, `None` if the response couldn't be parsed
+            result: The result of the executed `Action`
 
         Returns:
-        `True` if the `Action` is terminal, `False` otherwise
+        `True` if the `Action` is terminal, or if it is a plan whose terminal step ran, `False` otherwise
 
         """
-        try:
-            action_def, _ = self._get_action(response)
-            should_terminate_based_action = action_def.terminal if action_def else False
-            logger.debug(
-                f"Checking termination condition for agent '{self.name}': {should_terminate_based_action}"
-            )
-            return should_terminate_based_action
-        except Exception as e:
-            logger.error(
-                f"'should_terminate' failed for for agent '{self.name}' response={response} with error: {e.__class__.__name__}('{str(e)}')"
-            )
+        if action is None:
             return False
+        if action.name == PLAN_TOOL_NAME:
+            return bool(
+                result and result["tool_executed"] and result["result"]["terminated"]
+            )
+        logger.debug(
+            f"Checking termination condition for agent '{self.name}': {action.terminal}"
+        )
+        return action.terminal
+
+    def _is_final_result(self, result: dict) -> bool:
+        """Whether the `result` is the answer of the agent, of a terminal tool or of a plan whose terminal step ran"""
+        return self._should_terminate(
+            self.actions.get_action(result.get("action")), result
+        )
+
+    def _apply_output_policy(self, result: dict) -> dict:
+        """Spills a large tool result to the blob store of the `output_policy`, see `game.results`"""
+        # the pages of `read_result` are already capped, and the final answer is kept whole
+        if (
+            self.output_policy is None
+            or result.get("action") == READ_RESULT_TOOL_NAME
+            or self._is_final_result(result)
+        ):
+            return result
+        return self.output_policy.apply(result)
+
+    def _compress_result(self, memory: Memory, result: dict) -> dict:
+        """Compresses a long textual tool result against the current task and the goals, see `game.compression`"""
+        if (
+            self.output_compressor is None
+            or not result.get("tool_executed")
+            or not isinstance(result.get("result"), str)
+            or result.get("action") == READ_RESULT_TOOL_NAME
+            # the final answer is kept whole
+            or self._is_final_result(result)
+        ):
+            return result
+        task = next(
+            (
+                m.get("content") or ""
+                for m in reversed(memory.get_memories())
+                if m["type"] == "user"
+            ),
+            "",
+        )
+        query = "\n".join([task] + [f"{g.name}: {g.description}" for g in self.goals])
+        compression = self.output_compressor.compress(result["result"], query)
+        if compression is None:
+            return result
+        logger.debug(
+            f"Agent '{self.name}' compressed the result of '{result['action']}' from "
+            f"{compression.original_chars} to {len(compression.text)} characters"
+        )
+        metrics.TOOL_OUTPUT_COMPRESSED_CHARS.inc(
+            compression.saved_chars, agent=self._metrics_label, tool=result["action"]
+        )
+        return {
+            **result,
+            "result": compression.text,
+            "compression": compression.to_dict(),
+        }
 
-    @staticmethod
-    def _update_memory(memory: Memory, response: str, result: dict) -> None:
+    def _update_memory(self, memory: Memory, response: str, result: dict) -> None:
         """Update memory with the agent's decision and the environment's response."""
         new_memories = [
-            {"type": "assistant", "content": response},
-            {"type": "environment", "content": json.dumps(result)},
+            MemoryItem("assistant", response, agent=self.name),
+            # the result is only serialised to JSON when it is rendered in a prompt
+            MemoryItem(
+                "environment",
+                payload=self._apply_output_policy(
+                    self._compress_result(memory, result)
+                ),
+                agent=self.name,
+            ),
         ]
         for m in new_memories:
             memory.add_memory(m)
@@ -211,63 +402,185 @@ class Agent:
     def _prompt_llm_for_action(self, full_prompt: Prompt) -> str:
         """Invokes the LLM with the `prompt` and returns the response as a string."""
         logger.debug(f"Agent '{self.name}' thinking...")
-        response = self.llm(full_prompt)
+        with tracing.start_span("llm.call", {"llm.name": self.llm.name}) as span:
+            if tracing.is_enabled():
+                span.set_attributes(_prompt_size(full_prompt))
+            budget = current_budget()
+            tokens = budget.tokens if budget is not None else 0
+            # the llm sets the token counts on the current span, and charges them to the budget
+            response = self.llm(full_prompt)
+        if budget is not None:
+            if budget.tokens == tokens:
+                # the llm doesn't report its usage, estimate it with 4 characters per token
+                chars = sum(
+                    len(str(m.get("content") or "")) for m in full_prompt.messages
+                )
+                tokens = (chars + len(response or "")) // 4
+            else:
+                tokens = 0
+            budget.charge(tokens=tokens, llm_calls=1)
         logger.debug(f"Agent '{self.name}' response: {response}")
         return response
 
-    def _handle_agent_response(
-        self, action_context: ActionContext, response: str
-    ) -> dict:
+    def _record_parse(self, invocation: dict) -> None:
+        """Counts a parsed response in the `repair_stats`, the `structured_output_stats` and the metrics"""
+        if mode := invocation.get(STRUCTURED_OUTPUT_KEY):
+            metrics.STRUCTURED_OUTPUT_RESPONSES.inc(
+                agent=self._metrics_label, mode=mode
+            )
+            retry_avoided = invocation.get(RETRY_AVOIDED_KEY, False)
+            self.structured_output_stats.record(mode, retry_avoided)
+            if retry_avoided:
+                metrics.STRUCTURED_OUTPUT_RETRIES_AVOIDED.inc(agent=self._metrics_label)
+        repairs = invocation.get(REPAIRS_KEY)
+        self.repair_stats.record(repairs)
+        if not repairs:
+            return
+        logger.info(f"Agent '{self.name}' repaired the response with {repairs}")
+        metrics.PARSE_REPAIR_SAVED_ITERATIONS.inc(agent=self._metrics_label)
+        for repair in repairs:
+            metrics.PARSE_REPAIRS.inc(agent=self._metrics_label, repair=repair)
+
+    @cached_property
+    def _available_tools(self) -> str:
+        """The tools listed in the parse errors, so the LLM can correct its response"""
+        return str([f"{a.name}: {a.description}" for a in self.tools])
+
+    def _parse_error_result(self, response: str, error: Exception) -> dict:
+        """The result of a `response` that couldn't be parsed, fed back to the LLM"""
+        error_str = f"{error.__class__.__name__}('{str(error)}')"
+        metrics.PARSE_FAILURES.inc(
+            agent=self._metrics_label, error=error.__class__.__name__
+        )
+        self.repair_stats.record(None, failed=True)
+        logger.error(
+            f"Agent '{self.name}' get_action failed for response={response} with error: ".replace(
+                "\n", ""
+            )
+            + error_str
+        )
+        if isinstance(error, ActionNotPresentInResponseError):
+            error_str += f" Use one of the available tools: {self._available_tools}"
+        elif isinstance(error, ResponseIsNoneError):
+            error_str += (
+                " Failed to receive response from LLM. Use one of the available tools: "
+                f"{self._available_tools}"
+            )
+        return {"tool_executed": False, "error": error_str}
+
+    def add_turn_stage(
+        self,
+        name: str,
+        function: TurnStage,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> None:
         """
-        Executes an `Action` from the parsed LLM `response` string.
-        Args:
-            action_context:
-            response: The LLM response as a string
+        Inserts a stage in the pipeline of the iterations of the agent loop, see `game.turn`
 
-        Returns:
-            The result of the executed `Action` as dictionary
+        Args:
+            name: The name of the stage, passed to the hooks (see `game.hooks`) and used as key of `Turn.timings`
+            function: Called with the `Turn` of the iteration
+            before: The name of the stage to insert it before, eg `Stage.TOOL`
+            after: The name of the stage to insert it after. If neither `before` nor `after` is set, the stage is
+                appended.
+
+        Raises:
+            ValueError: If `before` or `after` isn't a stage of the pipeline
         """
-        error_message = (
-            f"get_action failed for response={response} with error: ".replace("\n", "")
+        names = [n for n, _ in self.turn_stages]
+        anchor = before if before is not None else after
+        if anchor is None:
+            index = len(names)
+        elif anchor not in names:
+            raise ValueError(f"Unknown stage '{anchor}', use one of {names}")
+        else:
+            index = names.index(anchor) + (0 if before is not None else 1)
+        self.turn_stages.insert(index, (name, function))
+
+    def _prompt_stage(self, turn: Turn) -> None:
+        """Constructs a prompt that includes the Goals, Actions, and the current Memory"""
+        if turn.prompt is None:
+            turn.prompt = self._construct_prompt(self.goals, turn.memory, self.actions)
+
+    def _llm_stage(self, turn: Turn) -> None:
+        """Generates a response, unless the budget of the run (or of a caller) ran out"""
+        if turn.response is not None:
+            return
+        budget = turn.action_context.get("budget")
+        if budget is not None:
+            budget.check()
+        turn.response = self._prompt_llm_for_action(turn.prompt)
+
+    def _parse_stage(self, turn: Turn) -> None:
+        """Parses the response once, the following stages use the parsed action"""
+        if turn.invocation is not None or turn.result is not None:
+            return
+        try:
+            turn.action, turn.invocation = self._get_action(turn.response)
+        except (
+            ActionNotPresentInResponseError,
+            ResponseIsNoneError,
+            JSONDecodeError,
+        ) as e:
+            turn.result = self._parse_error_result(turn.response, e)
+            return
+        except Exception as e:
+            logger.error(
+                f"Agent '{self.name}' get_action failed for response={turn.response} with error: "
+                f"{e.__class__.__name__}('{str(e)}')"
+            )
+            raise
+        self._record_parse(turn.invocation)
+
+    def _tool_stage(self, turn: Turn) -> None:
+        """Executes the action in the environment"""
+        if turn.result is not None:
+            return
+        # the terminal tools still run, so the answer of the agent isn't lost
+        budget = turn.action_context.get("budget")
+        if budget is not None and not (turn.action and turn.action.terminal):
+            budget.check()
+        logger.info(
+            f"Agent '{self.name}' executing action={turn.action} action={turn.invocation}"
         )
-        result_in_case_of_error = {"tool_executed": False}
         try:
-            action_def, action = self._get_action(response)
-            logger.info(f"Agent '{self.name}' executing action={action_def} {action=}")
-            result = self.environment.execute_action(
-                action_context, action_def, action["args"]
+            turn.result = self.environment.execute_action(
+                turn.action_context, turn.action, turn.invocation["args"]
             )
-        except ActionNotPresentInResponseError as e:
-            error_str = f"{e.__class__.__name__}('{str(e)}')"
-            logger.error(f"Agent '{self.name}' " + error_message + error_str)
-            result = {
-                **result_in_case_of_error,
-                "error": error_str
-                + f" Use one of the available tools: {[f'{a.name}: {a.description}' for a in self.tools]}",
-            }
-        except ResponseIsNoneError as e:
-            error_str = f"{e.__class__.__name__}('{str(e)}')"
-            logger.error(f"Agent '{self.name}' " + error_message + error_str)
-            result = {
-                **result_in_case_of_error,
-                "error": error_str
-                + f" Failed to receive response from LLM. Use one of the available tools: {[f'{a.name}: {a.description}' for a in self.tools]}",
-            }
-        except JSONDecodeError as e:
-            error_str = f"{e.__class__.__name__}('{str(e)}')"
-            logger.error(f"Agent '{self.name}' " + error_message + error_str)
-            result = {**result_in_case_of_error, "error": error_str}
+        except (SuspendRun, BudgetExceeded):
+            raise
         except Exception as e:
-            error_str = f"{e.__class__.__name__}('{str(e)}')"
-            logger.error(f"Agent '{self.name}' " + error_message + error_str)
+            logger.error(
+                f"Agent '{self.name}' failed to execute the action of response={turn.response} with error: "
+                f"{e.__class__.__name__}('{str(e)}')"
+            )
             raise
-        return result
+
+    def _memory_stage(self, turn: Turn) -> None:
+        """Updates the memory with what happened"""
+        self._update_memory(turn.memory, turn.response, turn.result)
+
+    def _termination_stage(self, turn: Turn) -> None:
+        """Checks if the agent has decided to terminate"""
+        turn.terminate = turn.terminate or self._should_terminate(
+            turn.action, turn.result
+        )
+
+    def _run_turn(self, turn: Turn) -> None:
+        """Runs the stages of the pipeline on the `turn`, within the hooks"""
+        for name, function in self.turn_stages:
+            with stage(name, self):
+                tic = time.perf_counter_ns()
+                function(turn)
+                turn.timings[name] = time.perf_counter_ns() - tic
 
     def run(
         self,
         user_input: str,
         memory: Optional[Memory] = None,
         action_context_props: Optional[dict] = None,
+        budget: Optional[Budget] = None,
     ) -> Memory:
         """
         Execute the GAME loop for this agent with a maximum iteration limit.
@@ -277,51 +590,216 @@ class Agent:
             memory: An optional `Memory` object. If `None` an in-memory dictionary based memory will be used
             action_context_props: Additional optional parameters as a dictionary that are appended to the
                 `ActionContext` object. The `ActionContext` is passed as an optional hidden argument to the tools
+            budget: Limits the time, tokens, cost and LLM calls of the run and of the sub-agents it calls. If `None`
+                and the agent is called by an agent running with a budget, a `budget_share` of the remaining budget
+                of the caller. When the budget runs out the run stops and the partial memory is returned (see
+                `game.budget`).
 
         Returns:
             The `Memory` object of the agent with all messages when the agent terminates
+
+        Raises:
+            RunSuspended: If the agent has a `suspended_run_store` and a tool suspended the run, eg `user_input`.
+                Continue it with `resume`.
         """
-        memory = memory or DictMemory()
+        memory = memory if memory is not None else DictMemory()
         # Set's initial `user_input` as the current task
-        memory.add_memory({"type": "user", "content": user_input})
-
-        action_context_props = action_context_props or {}
-        # Create context with all necessary resources
-        action_context = ActionContext(
-            {
-                "name": self.name,
-                "memory": memory,
-                "llm": self.llm,
-                "agent_registry": self.agent_registry,
-                **action_context_props,
-            }
+        memory.add_memory(MemoryItem("user", user_input, agent=self.name))
+        return self._run_loop(
+            memory, action_context_props or {}, start_iteration=0, budget=budget
         )
 
-        # The agent loop
-        for _ in range(self.max_iterations):
-            tic = time.time()
-            # Construct a prompt that includes the Goals, Actions, and the current Memory
-            prompt = self._construct_prompt(self.goals, memory, self.actions)
-            # Generate a response from the agent
-            response = self._prompt_llm_for_action(prompt)
-            # # Determine which action the agent wants to execute and execute it in the environment
-            result = self._handle_agent_response(
-                action_context=action_context, response=response
+    def resume(
+        self,
+        token: str,
+        reply: Any,
+        action_context_props: Optional[dict] = None,
+        budget: Optional[Budget] = None,
+        expected_properties: Optional[dict] = None,
+    ) -> Memory:
+        """
+        Continues a suspended run where it stopped, with `reply` as the result of the tool that suspended it
+
+        Args:
+            token: The token of the `RunSuspended` exception
+            reply: The result of the suspended tool, eg the answer of the user
+            action_context_props: Additional `ActionContext` properties, merged over the ones of the suspended run.
+                Stores persisting the runs only keep the properties that can be serialised to JSON, pass the others
+                again here.
+            budget: The budget of the rest of the run, see `run`
+            expected_properties: If set, the run is only resumed if it was suspended with these `ActionContext`
+                properties, eg `{"session_id": ...}` so a token can't continue the run of another session
+
+        Returns:
+            The `Memory` object of the agent with all messages when the agent terminates
+
+        Raises:
+            ValueError: If the agent doesn't have a `suspended_run_store`
+            SuspendedRunNotFoundError: If there isn't any suspended run with `token` suspended by this agent (and
+                with the `expected_properties`). The runs of other agents stay in the store.
+            RunSuspended: If the run was suspended again
+        """
+        if self.suspended_run_store is None:
+            raise ValueError(
+                f"Agent '{self.name}' can't resume runs without a suspended_run_store"
             )
-            # Update the agent's memory with information about what happened
+        suspended = self.suspended_run_store.pop(
+            token, agent_name=self.name, properties=expected_properties
+        )
+        logger.debug(
+            f"Agent '{self.name}' resuming run {token} suspended by '{suspended.tool_name}'"
+        )
+        suspended.memory.add_memory(
+            MemoryItem(
+                "environment",
+                payload=self._apply_output_policy(
+                    Environment.format_result(
+                        reply, self.actions.get_action(suspended.tool_name)
+                    )
+                ),
+                agent=self.name,
+            )
+        )
+        return self._run_loop(
+            suspended.memory,
+            {**suspended.properties, **(action_context_props or {})},
+            start_iteration=suspended.iteration + 1,
+            budget=budget,
+        )
+
+    def _suspend(
+        self,
+        memory: Memory,
+        action_context_props: dict,
+        turn: Turn,
+        suspension: SuspendRun,
+    ) -> RunSuspended:
+        """Parks the run in the `suspended_run_store` and returns the `RunSuspended` exception to raise"""
+        memory.add_memory(MemoryItem("assistant", turn.response, agent=self.name))
+        action = turn.action
+        token = self.suspended_run_store.save(
+            SuspendedRun(
+                agent_name=self.name,
+                memory=memory,
+                iteration=turn.iteration,
+                tool_name=action.name,
+                message=suspension.message,
+                properties=action_context_props,
+            )
+        )
+        logger.info(
+            f"Agent '{self.name}' suspended by '{action.name}' with token {token}"
+        )
+        return RunSuspended(token, suspension.message, memory)
+
+    def _stop_on_budget(
+        self, memory: Memory, response: Optional[str], exceeded: BudgetExceeded
+    ) -> None:
+        """Records in the memory why the run stopped, after the LLM `response` if there was one"""
+        logger.warning(f"Agent '{self.name}' stopped: {exceeded}")
+        metrics.BUDGET_EXCEEDED.inc(agent=self._metrics_label, limit=exceeded.limit)
+        result = {
+            "tool_executed": False,
+            "error": f"{exceeded.__class__.__name__}('{exceeded}')",
+        }
+        if response is not None:
             self._update_memory(memory, response, result)
-            # Check if the agent has decided to terminate
-            if self._should_terminate(response):
-                break
-            logger.debug(
-                f"Agent '{self.name}' iteration took {time.time()-tic} seconds"
+        else:
+            memory.add_memory(
+                MemoryItem("environment", payload=result, agent=self.name)
             )
 
-            # This is to prevent rate limits of the LLMs
-            if sleep_for := settings.AGENT_SLEEP_SECS:
-                logger.debug(f"Agent '{self.name}' sleeping for {sleep_for} seconds")
-                time.sleep(sleep_for)
+    def _run_loop(
+        self,
+        memory: Memory,
+        action_context_props: dict,
+        start_iteration: int,
+        budget: Optional[Budget] = None,
+    ) -> Memory:
+        """Runs the agent loop from `start_iteration` until a terminal tool, `max_iterations` or the budget runs out"""
+        if budget is None and (parent := current_budget()) is not None:
+            budget = parent.child(self.budget_share)
+        with (
+            use_budget(budget),
+            stage(Stage.RUN, self),
+            metrics.timed(
+                metrics.AGENT_RUN_DURATION,
+                metrics.AGENT_RUNS,
+                metrics.AGENT_RUNS_IN_FLIGHT,
+                agent=self._metrics_label,
+            ) as timing,
+            tracing.start_span(
+                "agent.run",
+                {"agent.name": self.name, "agent.max_iterations": self.max_iterations},
+            ) as span,
+        ):
+            # Create context with all necessary resources
+            action_context = ActionContext(
+                {
+                    "name": self.name,
+                    "memory": memory,
+                    "llm": self.llm,
+                    "agent_registry": self.agent_registry,
+                    "actions": self.actions,
+                    "environment": self.environment,
+                    "output_policy": self.output_policy,
+                    "budget": budget,
+                    # tools like `user_input` suspend the run instead of blocking
+                    "suspend_user_input": self.suspended_run_store is not None,
+                    **action_context_props,
+                }
+            )
 
-        if self.debug_log_memory:
-            log_memory(memory, agent_name=self.name, agent_description=self.description)
-        return memory
+            # The agent loop
+            iteration = start_iteration
+            dedup_saved_chars = 0
+            for iteration in range(start_iteration, self.max_iterations):
+                span.set_attribute("agent.iterations", iteration + 1)
+                # Prompt, think, parse, act, remember and check for termination, see `turn_stages`
+                turn = Turn(iteration, memory, action_context)
+                with tracing.start_span(
+                    "agent.iteration", {"agent.iteration": iteration}
+                ):
+                    try:
+                        self._run_turn(turn)
+                    except SuspendRun as suspension:
+                        if self.suspended_run_store is None:
+                            raise
+                        timing.status = "suspended"
+                        raise self._suspend(
+                            memory, action_context_props, turn, suspension
+                        )
+                    except BudgetExceeded as exceeded:
+                        timing.status = "budget_exceeded"
+                        span.set_attribute("agent.budget_exceeded", exceeded.limit)
+                        self._stop_on_budget(memory, turn.response, exceeded)
+                        break
+                    if turn.prompt is not None:
+                        dedup_saved_chars += turn.prompt.metadata.get(
+                            DEDUP_SAVED_CHARS_KEY, 0
+                        )
+                    if turn.terminate:
+                        break
+                logger.debug(
+                    f"Agent '{self.name}' iteration took {sum(turn.timings.values()) / 1e9} seconds"
+                )
+
+                # This is to prevent rate limits of the LLMs
+                if sleep_for := settings.AGENT_SLEEP_SECS:
+                    logger.debug(
+                        f"Agent '{self.name}' sleeping for {sleep_for} seconds"
+                    )
+                    time.sleep(sleep_for)
+
+            metrics.AGENT_ITERATIONS.observe(iteration + 1, agent=self._metrics_label)
+            if self.prompt_deduplicator is not None:
+                span.set_attribute("agent.dedup_saved_chars", dedup_saved_chars)
+                logger.info(
+                    f"Agent '{self.name}' deduplication saved {dedup_saved_chars} prompt characters "
+                    f"(~{dedup_saved_chars // 4} tokens) in this run"
+                )
+            if self.debug_log_memory:
+                log_memory(
+                    memory, agent_name=self.name, agent_description=self.description
+                )
+            return memory
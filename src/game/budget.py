@@ -0,0 +1,210 @@
+"""Hierarchical run budgets with cooperative cancellation
+
+`max_iterations` only limits the loop of one agent, a manager calling sub-agents (which get their own
+`max_iterations`) can fan out into unbounded work. A `Budget` limits a whole run, sub-agents included: a wall-clock
+deadline, the total tokens, the estimated cost and the number of LLM calls:
+
+    memory = agent.run("Research the topic", budget=Budget(max_seconds=120, max_tokens=200_000, max_cost=0.5))
+
+The budget of a run is the current budget of the context (like the current span of `game.tracing`) and the
+`budget` property of its `ActionContext`. The sub-agents called by its tools, on the same thread or on others with
+`contextvars.copy_context()`, run with a child budget limited to a share of the remaining budget (see
+`Agent.budget_share`). What a child spends is charged to all its ancestors.
+
+The agents check their budget, and so the budgets of all the ancestors, before each LLM call and tool dispatch. When
+a budget runs out, or is cancelled with `Budget.cancel`, every agent of the tree under it stops at its next check and
+returns its partial memory, the last memory telling why it stopped. The checks are cooperative: an LLM call or a tool
+in progress isn't interrupted, although `LiteLlm` bounds the LLM calls by the remaining time. Only the deadline applies
+to the agents hosted in worker processes (see `game.worker_pool`).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+LIMITS = ("seconds", "tokens", "cost", "llm_calls")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a budget runs out or is cancelled"""
+
+    def __init__(self, limit: str, message: str):
+        """
+        Args:
+            limit: One of `LIMITS` or `"cancelled"`
+            message: What ran out
+        """
+        super().__init__(message)
+        self.limit = limit
+
+
+class Budget:
+    def __init__(
+        self,
+        max_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        max_llm_calls: Optional[int] = None,
+        parent: Optional["Budget"] = None,
+    ):
+        """
+        Args:
+            max_seconds: The wall-clock time of the run, the deadline starts with the budget
+            max_tokens: The input and output tokens of all the LLM calls
+            max_cost: The estimated cost of all the LLM calls, in USD
+            max_llm_calls: The number of LLM calls
+            parent: The budget charged with everything charged to this one, and whose limits apply to this one too
+        """
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.max_llm_calls = max_llm_calls
+        self.parent = parent
+        self.started = time.monotonic()
+        self.deadline = None if max_seconds is None else self.started + max_seconds
+        self.tokens = 0
+        self.cost = 0.0
+        self.llm_calls = 0
+        self._cancelled: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        limits = ", ".join(
+            f"max_{limit}={getattr(self, f'max_{limit}')}"
+            for limit in LIMITS
+            if getattr(self, f"max_{limit}") is not None
+        )
+        return f"{self.__class__.__name__}({limits})"
+
+    def _own_remaining(self) -> dict:
+        return {
+            "seconds": (
+                None if self.deadline is None else self.deadline - time.monotonic()
+            ),
+            "tokens": (
+                None if self.max_tokens is None else self.max_tokens - self.tokens
+            ),
+            "cost": None if self.max_cost is None else self.max_cost - self.cost,
+            "llm_calls": (
+                None
+                if self.max_llm_calls is None
+                else self.max_llm_calls - self.llm_calls
+            ),
+        }
+
+    def remaining(self) -> dict:
+        """
+        Returns:
+            The remaining `seconds`, `tokens`, `cost` and `llm_calls`, the smallest of this budget and its ancestors,
+            `None` for the unlimited ones
+        """
+        remaining = self._own_remaining()
+        if self.parent is not None:
+            for limit, value in self.parent.remaining().items():
+                if value is not None and (
+                    remaining[limit] is None or value < remaining[limit]
+                ):
+                    remaining[limit] = value
+        return remaining
+
+    def child(self, share: float = 1.0) -> "Budget":
+        """
+        A budget for a sub-agent, charging this budget too
+
+        Args:
+            share: The fraction of the remaining tokens, cost and LLM calls the child can spend. The deadline is
+                shared, the sub-agents running in parallel.
+        """
+        if not 0 < share <= 1:
+            raise ValueError(
+                f"The share of a child budget must be in ]0, 1], not {share}"
+            )
+        remaining = self.remaining()
+        scaled = {
+            limit: None if value is None else max(value, 0) * share
+            for limit, value in remaining.items()
+        }
+        return Budget(
+            max_seconds=remaining["seconds"],
+            max_tokens=None if scaled["tokens"] is None else int(scaled["tokens"]),
+            max_cost=scaled["cost"],
+            max_llm_calls=(
+                None if scaled["llm_calls"] is None else int(scaled["llm_calls"])
+            ),
+            parent=self,
+        )
+
+    def charge(self, tokens: int = 0, cost: float = 0.0, llm_calls: int = 0) -> None:
+        """Records what was spent, in this budget and all its ancestors"""
+        budget = self
+        while budget is not None:
+            with budget._lock:
+                budget.tokens += tokens
+                budget.cost += cost
+                budget.llm_calls += llm_calls
+            budget = budget.parent
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Stops the agents running with this budget or a descendant at their next check"""
+        self._cancelled = reason
+
+    def exceeded(self) -> Optional[BudgetExceeded]:
+        """
+        Returns:
+            A `BudgetExceeded` if this budget or one of its ancestors is cancelled or ran out, `None` otherwise
+        """
+        budget = self
+        while budget is not None:
+            if budget._cancelled is not None:
+                return BudgetExceeded("cancelled", budget._cancelled)
+            for limit, value in budget._own_remaining().items():
+                if value is not None and value <= 0:
+                    maximum = getattr(budget, f"max_{limit}")
+                    return BudgetExceeded(
+                        limit, f"The budget of {maximum} {limit} ran out"
+                    )
+            budget = budget.parent
+        return None
+
+    def check(self) -> None:
+        """
+        Raises:
+            BudgetExceeded: If this budget or one of its ancestors is cancelled or ran out
+        """
+        if (exceeded := self.exceeded()) is not None:
+            raise exceeded
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": time.monotonic() - self.started,
+            "tokens": self.tokens,
+            "cost": self.cost,
+            "llm_calls": self.llm_calls,
+            "remaining": self.remaining(),
+        }
+
+
+_current_budget: ContextVar[Optional[Budget]] = ContextVar("game_budget", default=None)
+
+
+def current_budget() -> Optional[Budget]:
+    """The budget of the agent running in the current context, if any"""
+    return _current_budget.get()
+
+
+@contextmanager
+def use_budget(budget: Optional[Budget]) -> Iterator[Optional[Budget]]:
+    """Makes `budget` the current budget of the context"""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def charge(tokens: int = 0, cost: float = 0.0, llm_calls: int = 0) -> None:
+    """Charges the current budget, if any, see `Budget.charge`"""
+    if (budget := current_budget()) is not None:
+        budget.charge(tokens=tokens, cost=cost, llm_calls=llm_calls)
@@ -0,0 +1,225 @@
+"""JSON codec of the serialisation hot paths
+
+Tool results, memories rendered in prompts, tool descriptions and LLM responses are encoded and decoded on every
+iteration. They all go through the codec of this module, which uses `orjson` (or `msgspec`) when installed and the
+standard library `json` otherwise:
+
+    from game import codec
+
+    codec.dumps({"tool_executed": True, "result": "ünïcode"})  # '{"tool_executed":true,"result":"ünïcode"}'
+    codec.loads('{"tool": "terminate"}')
+
+Prompts must not depend on the installed backend, or the prompt caches of the providers would miss after a
+deployment. So every codec writes the same canonical JSON, the one the fast libraries write natively: compact
+separators, UTF-8 instead of `\\u` escapes and, with `indent=True`, two spaces of indentation. The backends only differ
+on edge cases that tool results shouldn't contain: non finite floats (`NaN` with `json`, `null` with `orjson`) and the
+exponent of small floats (`1e-07` vs `1e-7`). Integers above 64 bits and non string keys are encoded by `json` in the
+fast codecs too.
+
+The fast libraries also serialise types `json` rejects (dataclasses, sets, datetimes, UUIDs, enums, bytes...). The fast
+codecs only encode the plain JSON types themselves, anything else (subclasses included) goes through `json`, which
+encodes it or raises `TypeError` exactly as with the `json` codec.
+
+The codec is picked with the `JSON_CODEC` setting (`json`, `orjson` or `msgspec`), by default the fastest one installed.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Union
+
+from game.logger import get_logger
+from game.settings import get_settings
+
+logger = get_logger(__name__)
+
+
+class Codec(ABC):
+    name: str
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+    @abstractmethod
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        """
+        Encodes `obj` to canonical JSON
+
+        Args:
+            obj: A JSON serialisable object
+            indent: Indents the JSON with two spaces
+
+        Raises:
+            TypeError: If `obj` isn't JSON serialisable
+        """
+
+    def dumpb(self, obj: Any, indent: bool = False) -> bytes:
+        """Encodes `obj` to canonical UTF-8 encoded JSON, see `dumps`"""
+        return self.dumps(obj, indent=indent).encode("utf-8")
+
+    @abstractmethod
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """
+        Decodes JSON
+
+        Raises:
+            json.JSONDecodeError: If `data` isn't valid JSON
+        """
+
+
+class JsonCodec(Codec):
+    """The standard library `json`"""
+
+    name = "json"
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2)
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+_PLAIN_SCALARS = frozenset({str, int, float, bool, type(None)})
+
+
+def _is_plain(obj: Any) -> bool:
+    """Whether `obj` only holds the exact types `json` serialises, which the fast libraries encode the same way"""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        value_type = type(value)
+        if value_type in _PLAIN_SCALARS:
+            continue
+        if value_type is dict:
+            stack.extend(value)
+            stack.extend(value.values())
+        elif value_type is list or value_type is tuple:
+            stack.extend(value)
+        else:
+            return False
+    return True
+
+
+def _decode_error(e: ValueError, data: Any) -> json.JSONDecodeError:
+    document = data if isinstance(data, str) else bytes(data).decode("utf-8", "replace")
+    return json.JSONDecodeError(str(e), document, getattr(e, "pos", 0) or 0)
+
+
+class OrjsonCodec(Codec):
+    """`orjson`, falling back to `json` for the objects it doesn't support"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._fallback = JsonCodec()
+
+    def dumpb(self, obj: Any, indent: bool = False) -> bytes:
+        if not _is_plain(obj):
+            return self._fallback.dumpb(obj, indent=indent)
+        try:
+            return self._orjson.dumps(
+                obj, option=self._orjson.OPT_INDENT_2 if indent else None
+            )
+        except self._orjson.JSONEncodeError:
+            # eg integers above 64 bits or non string keys, `json` raises if `obj` isn't serialisable at all
+            return self._fallback.dumpb(obj, indent=indent)
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return str(self.dumpb(obj, indent=indent), "utf-8")
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        # `orjson.JSONDecodeError` is a `json.JSONDecodeError`
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(Codec):
+    """`msgspec`, falling back to `json` for the objects it doesn't support"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self._fallback = JsonCodec()
+
+    def dumpb(self, obj: Any, indent: bool = False) -> bytes:
+        if not _is_plain(obj):
+            return self._fallback.dumpb(obj, indent=indent)
+        try:
+            encoded = self._encoder.encode(obj)
+        except (TypeError, OverflowError, self._msgspec.EncodeError):
+            return self._fallback.dumpb(obj, indent=indent)
+        return self._msgspec.json.format(encoded, indent=2) if indent else encoded
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return str(self.dumpb(obj, indent=indent), "utf-8")
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._msgspec.DecodeError as e:
+            raise _decode_error(e, data) from e
+
+
+CODECS = {c.name: c for c in (JsonCodec, OrjsonCodec, MsgspecCodec)}
+
+_codec: Optional[Codec] = None
+
+
+def create_codec(name: Optional[str] = None) -> Codec:
+    """
+    Args:
+        name: `json`, `orjson` or `msgspec`. If `None`, the first installed of `orjson`, `msgspec` and `json`.
+
+    Raises:
+        ValueError: If `name` is unknown
+        ImportError: If the library of `name` isn't installed
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"Unknown JSON codec '{name}', use one of {list(CODECS)}")
+        return CODECS[name]()
+    for codec_class in (OrjsonCodec, MsgspecCodec):
+        try:
+            return codec_class()
+        except ImportError:
+            continue
+    return JsonCodec()
+
+
+def get_codec() -> Codec:
+    """The codec of the framework, created from the `JSON_CODEC` setting on first use"""
+    global _codec
+    if _codec is None:
+        _codec = create_codec(get_settings().JSON_CODEC)
+        logger.debug(f"Using the JSON codec {_codec}")
+    return _codec
+
+
+def set_codec(codec: Union[Codec, str, None]) -> Codec:
+    """Replaces the codec of the framework, by name or instance (`None` picks the fastest installed one)"""
+    global _codec
+    _codec = codec if isinstance(codec, Codec) else create_codec(codec)
+    return _codec
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Encodes `obj` to canonical JSON with the codec of the framework, see `Codec.dumps`"""
+    return get_codec().dumps(obj, indent=indent)
+
+
+def dumpb(obj: Any, indent: bool = False) -> bytes:
+    """Encodes `obj` to canonical UTF-8 encoded JSON with the codec of the framework, see `Codec.dumps`"""
+    return get_codec().dumpb(obj, indent=indent)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Decodes JSON with the codec of the framework, see `Codec.loads`"""
+    return get_codec().loads(data)
@@ -0,0 +1,168 @@
+"""Extractive compression of long textual tool results
+
+Web pages, logs and search results returned by the tools are mostly irrelevant to the task at hand, but every
+character of a result is sent again to the LLM at each later iteration. An `OutputCompressor` splits a long result in
+sentences (or lines), scores them against the task and the goals of the agent with BM25 and only keeps the best ones
+under a token budget, in their original order:
+
+    agent = Agent(..., output_compressor=OutputCompressor(max_tokens=1_000))
+
+The scoring is a handful of vectorised NumPy operations on the query terms only, so it is CPU only, deterministic and
+takes a few milliseconds for a 100KB page. Combined with an `OutputPolicy` (see `game.results`) the compressed result
+is the one spilled if it is still too large.
+"""
+
+import re
+from dataclasses import dataclass
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+
+from game.memory.embedding import TOKEN_PATTERN
+
+GAP_MARKER = "[...]"
+
+
+@dataclass(frozen=True)
+class Compression:
+    """A compressed text and how much of the original it kept"""
+
+    text: str
+    original_chars: int
+    kept_chunks: int
+    total_chunks: int
+
+    @property
+    def saved_chars(self) -> int:
+        return max(0, self.original_chars - len(self.text))
+
+    def to_dict(self) -> dict:
+        return {
+            "original_chars": self.original_chars,
+            "kept_chunks": self.kept_chunks,
+            "total_chunks": self.total_chunks,
+        }
+
+
+class OutputCompressor:
+    def __init__(
+        self,
+        max_tokens: int = 1_000,
+        chars_per_token: int = 4,
+        max_chunk_chars: int = 400,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        """
+        Args:
+            max_tokens: The token budget of a compressed text. The texts under the budget are kept as they are.
+            chars_per_token: The number of characters per token used to estimate the size of the texts
+            max_chunk_chars: The chunks are sentences or lines, the longer ones (eg minified content) are cut at
+                this size
+            k1: The BM25 term frequency saturation
+            b: The BM25 chunk length normalisation
+        """
+        if max_chunk_chars > max_tokens * chars_per_token:
+            raise ValueError("The chunks must be smaller than the token budget")
+        self.max_tokens = max_tokens
+        self.chars_per_token = chars_per_token
+        self.max_chunk_chars = max_chunk_chars
+        self.k1 = k1
+        self.b = b
+        # a sentence ended by a punctuation followed by a space, a line, or a cut of `max_chunk_chars`
+        self._chunk_pattern = re.compile(
+            rf"\S[^\n]{{0,{max_chunk_chars - 2}}}?(?:[.!?](?=\s)|$)|\S[^\n]{{0,{max_chunk_chars - 1}}}",
+            re.MULTILINE,
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(max_tokens={self.max_tokens}, max_chunk_chars={self.max_chunk_chars})"
+
+    @property
+    def max_chars(self) -> int:
+        return self.max_tokens * self.chars_per_token
+
+    def score(self, chunks: list[str], query: str) -> np.ndarray:
+        """
+        Scores the `chunks` against the `query` with BM25, the chunks being the documents of the corpus
+
+        Returns:
+            A `(len(chunks),)` float64 array of scores, 0 for the chunks without any query term
+        """
+        vocabulary = {
+            term: i
+            for i, term in enumerate(
+                dict.fromkeys(TOKEN_PATTERN.findall(query.lower()))
+            )
+        }
+        scores = np.zeros(len(chunks))
+        if not vocabulary or not chunks:
+            return scores
+        tokens = [TOKEN_PATTERN.findall(chunk.lower()) for chunk in chunks]
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(chunks))
+        # the index of the query term of each token of the text, -1 for the other tokens
+        terms = np.fromiter(
+            (vocabulary.get(t, -1) for t in chain.from_iterable(tokens)),
+            dtype=np.int64,
+            count=int(lengths.sum()),
+        )
+        rows = np.repeat(np.arange(len(chunks)), lengths)
+        matched = terms >= 0
+        n_terms = len(vocabulary)
+        tf = np.bincount(
+            rows[matched] * n_terms + terms[matched], minlength=len(chunks) * n_terms
+        ).reshape(len(chunks), n_terms)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1))
+        return (tf * (self.k1 + 1) / (tf + norm[:, None])) @ idf
+
+    def compress(self, text: str, query: str) -> Optional[Compression]:
+        """
+        Keeps the chunks of `text` scoring the best against `query` under the token budget, in their original order.
+        The removed chunks are replaced by `GAP_MARKER`.
+
+        Args:
+            text: A long text, eg the result of a tool
+            query: What is relevant, eg the task and the goals of the agent
+
+        Returns:
+            The compressed text, or `None` if `text` is under the budget
+        """
+        if len(text) <= self.max_chars:
+            return None
+        spans = [m.span() for m in self._chunk_pattern.finditer(text)]
+        chunks = [text[start:end] for start, end in spans]
+        scores = self.score(chunks, query)
+
+        # the ties (eg no query term at all) are broken by the position in the text
+        budget = self.max_chars
+        kept = []
+        for i in np.argsort(-scores, kind="stable").tolist():
+            size = len(chunks[i]) + len(GAP_MARKER) + 2
+            if size <= budget:
+                kept.append(i)
+                budget -= size
+            if budget < len(GAP_MARKER) + 3:
+                break
+        kept.sort()
+
+        parts = []
+        previous = None
+        for i in kept:
+            if previous is not None and i == previous + 1:
+                # the original separator between consecutive chunks
+                parts.append(text[spans[previous][1] : spans[i][0]])
+            elif parts or i > 0:
+                parts.append(f"\n{GAP_MARKER}\n" if parts else f"{GAP_MARKER}\n")
+            parts.append(chunks[i])
+            previous = i
+        if previous is not None and previous < len(chunks) - 1:
+            parts.append(f"\n{GAP_MARKER}")
+        return Compression(
+            text="".join(parts),
+            original_chars=len(text),
+            kept_chunks=len(kept),
+            total_chunks=len(chunks),
+        )
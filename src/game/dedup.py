@@ -0,0 +1,157 @@
+"""Deduplication of the content repeated in prompts
+
+The whole memory is sent to the LLM at every iteration, and some content ends up in it many times: every parse error
+result lists all the tools with their descriptions, `call_agent_with_reflection` merges sub-agent memories repeating
+what the caller already knows, tools are called again with the same arguments... A `PromptDeduplicator` replaces
+the later copies of the large repeated blocks with a short back-reference to a message showing the block, eg
+`[1204 characters repeated from 2 messages above, starting with "Use one of the available tools"]`:
+
+    agent = Agent(..., prompt_deduplicator=PromptDeduplicator(min_block_chars=200))
+
+The messages are split in chunks (lines, sentences, list items) that are looked up by hash in the chunks of the
+previous messages, the runs of consecutive repeated chunks of at least `min_block_chars` are replaced. A run only
+covers chunks the LLM sees verbatim, never content that was itself replaced, so a reference doesn't lead to another
+one. A message only references the messages before it (or its own start), so the prompt prefix stays the same from
+one iteration to the next and the prompt caches of the providers keep hitting. The system message and the responses of the LLM are never rewritten.
+"""
+
+import re
+
+# the chunks end after a line break (or an escaped one in JSON) or after a punctuation followed by spaces
+CHUNK_END_PATTERN = re.compile(r"\n|\\n|(?<=[.!?:;,\]}])\s+")
+
+# the `Prompt.metadata` key of the number of characters saved in the prompt
+DEDUP_SAVED_CHARS_KEY = "dedup_saved_chars"
+
+REFERENCE_TEMPLATE = (
+    '[{chars} characters repeated from {source}, starting with "{anchor}"]'
+)
+
+# the maximum size of the start of the block quoted in the back-references
+ANCHOR_CHARS = 30
+
+# the largest back-reference, the repeated blocks must be larger
+MAX_REFERENCE_CHARS = len(
+    REFERENCE_TEMPLATE.format(
+        chars=10**6, source="999 messages above", anchor="x" * ANCHOR_CHARS + "..."
+    )
+)
+
+
+def _reference(chars: int, distance: int, first_chunk: str) -> str:
+    if distance == 0:
+        source = "earlier in this message"
+    elif distance == 1:
+        source = "the message above"
+    else:
+        source = f"{distance} messages above"
+    anchor = first_chunk.rstrip().removesuffix("\\n")
+    if len(anchor) > ANCHOR_CHARS:
+        anchor = anchor[:ANCHOR_CHARS] + "..."
+    return REFERENCE_TEMPLATE.format(chars=chars, source=source, anchor=anchor)
+
+
+class PromptDeduplicator:
+    def __init__(
+        self, min_block_chars: int = 200, skip_roles: tuple = ("system", "assistant")
+    ):
+        """
+        Args:
+            min_block_chars: The minimum size of a repeated block to replace with a back-reference
+            skip_roles: The roles of the messages that are never rewritten. Their content can still be referenced.
+        """
+        if min_block_chars <= MAX_REFERENCE_CHARS:
+            raise ValueError(
+                f"min_block_chars must be larger than the back-references ({MAX_REFERENCE_CHARS} characters)"
+            )
+        self.min_block_chars = min_block_chars
+        self.skip_roles = skip_roles
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(min_block_chars={self.min_block_chars})"
+
+    @staticmethod
+    def _chunks(text: str) -> list[str]:
+        chunks = []
+        start = 0
+        for match in CHUNK_END_PATTERN.finditer(text):
+            chunks.append(text[start : match.end()])
+            start = match.end()
+        if start < len(text):
+            chunks.append(text[start:])
+        return chunks
+
+    def deduplicate(self, messages: list[dict]) -> tuple[list[dict], int]:
+        """
+        Replaces the blocks of the `messages` repeated from a previous message (or from earlier in the same message)
+        with a back-reference to a message showing the block verbatim, located relative to the rewritten message
+        and quoting the start of the block.
+
+        Args:
+            messages: The messages of a `Prompt`, their content being strings
+
+        Returns:
+            The messages, the rewritten ones being copies, and the number of characters saved
+        """
+        # the first occurrence of each chunk, as (message, chunk) indexes
+        seen: dict[str, tuple[int, int]] = {}
+        message_chunks: list[list[str]] = []
+        # whether each chunk is kept verbatim in the deduplicated messages, filled as the chunks are processed
+        message_visible: list[list[bool]] = []
+        deduplicated = []
+        saved = 0
+        for m, message in enumerate(messages):
+            content = message.get("content")
+            if not isinstance(content, str):
+                message_chunks.append([])
+                message_visible.append([])
+                deduplicated.append(message)
+                continue
+            chunks = self._chunks(content)
+            message_chunks.append(chunks)
+            visible: list[bool] = []
+            message_visible.append(visible)
+            rewrite = (
+                message.get("role") not in self.skip_roles
+                and len(content) >= self.min_block_chars
+            )
+            parts = []
+            rewritten = False
+            c = 0
+            while c < len(chunks):
+                origin = seen.get(chunks[c]) if rewrite else None
+                # the run of chunks following the first occurrence of this one, as long as the origin chunks are
+                # shown verbatim: not replaced by a reference themselves, nor part of this run when the block
+                # repeats in the same message (eg the same log line 10 times)
+                end = c + 1
+                if origin is not None:
+                    origin_chunks = message_chunks[origin[0]]
+                    origin_visible = message_visible[origin[0]]
+                    while (
+                        end < len(chunks)
+                        and origin[1] + end - c < len(origin_visible)
+                        and origin_visible[origin[1] + end - c]
+                        and origin_chunks[origin[1] + end - c] == chunks[end]
+                    ):
+                        end += 1
+                run_chars = sum(map(len, chunks[c:end]))
+                if origin is not None and run_chars >= self.min_block_chars:
+                    reference = _reference(run_chars, m - origin[0], chunks[c])
+                    # keep the line break closing the block
+                    if chunks[end - 1].endswith("\n"):
+                        reference += "\n"
+                    parts.append(reference)
+                    visible.extend([False] * (end - c))
+                    rewritten = True
+                    saved += run_chars - len(reference)
+                else:
+                    parts.extend(chunks[c:end])
+                    visible.extend([True] * (end - c))
+                for i in range(c, end):
+                    seen.setdefault(chunks[i], (m, i))
+                c = end
+            if rewritten:
+                deduplicated.append({**message, "content": "".join(parts)})
+            else:
+                deduplicated.append(message)
+        return deduplicated, saved
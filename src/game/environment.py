@@ -11,19 +11,37 @@ https://www.coursera.org/learn/ai-agents-python/ungradedWidget/3d8su/modular-ai-
 
 import inspect
 import time
+from functools import lru_cache
 from typing import Any
 
+from game import metrics, tracing
 from game.action import Action
 from game.action.context import ActionContext
+from game.suspension import SuspendRun
+
+# the metric and span label of the calls of tools that don't exist
+UNKNOWN_TOOL = "unknown"
+
+
+@lru_cache(maxsize=1024)
+def _parameter_names(func) -> frozenset[str]:
+    """The names of the parameters of a function, computed once per tool instead of at every call"""
+    try:
+        return frozenset(inspect.signature(func).parameters)
+    except (ValueError, TypeError):
+        return frozenset()
 
 
 def has_named_parameter(func, param_name: str) -> bool:
     """Check if a function has a named parameter."""
     try:
-        signature = inspect.signature(func)
-        return param_name in signature.parameters
-    except (ValueError, TypeError):
-        return False
+        return param_name in _parameter_names(func)
+    except TypeError:
+        # unhashable callables aren't cached
+        try:
+            return param_name in inspect.signature(func).parameters
+        except (ValueError, TypeError):
+            return False
 
 
 class Environment:
@@ -31,6 +49,31 @@ class Environment:
         self, action_context: ActionContext, action: Action, args: dict
     ) -> dict:
         """Execute an action with automatic dependency injection."""
+        # the action is `None` when the response names a tool that doesn't exist
+        tool_name = action.name if action is not None else UNKNOWN_TOOL
+        with (
+            metrics.timed(
+                metrics.TOOL_DURATION, metrics.TOOL_CALLS, tool=tool_name
+            ) as timing,
+            tracing.start_span(
+                "environment.execute_action", {"tool.name": tool_name}
+            ) as span,
+        ):
+            result = self._execute_action(action_context, action, args)
+            if not result["tool_executed"]:
+                timing.status = "error"
+                span.set_status(tracing.SpanStatus.ERROR, result["error"])
+            return result
+
+    def _execute_action(
+        self, action_context: ActionContext, action: Action, args: dict
+    ) -> dict:
+        if action is None:
+            return {
+                "tool_executed": False,
+                "action": None,
+                "error": "The tool doesn't exist",
+            }
         try:
             # Create a copy of args to avoid modifying the original
             args_copy = args.copy()
@@ -48,6 +91,9 @@ class Environment:
             # Execute the function with injected dependencies
             result = action.execute(**args_copy)
             return self.format_result(result, action)
+        except SuspendRun:
+            # the agent suspends the run, it's not a failure of the tool
+            raise
         except Exception as e:
             return {"tool_executed": False, "action": None, "error": str(e)}
 
@@ -0,0 +1,314 @@
+"""Profiling hooks of the agent loop
+
+A `Hook` gets a `before` and an `after` callback around each stage of the agent loop, with the monotonic duration
+of the stage in nanoseconds. Hooks are set per agent (`Agent(hooks=[...])`) or globally with `register_hook`, so
+agents running in production can be profiled without patching `game.agent`:
+
+    from game.hooks import CProfileHook, register_hook
+
+    register_hook(CProfileHook(output_dir="profiles"))
+
+When no hook is registered a stage costs a function call and entering a `nullcontext`.
+
+The built-in hooks profile whole runs (the outermost `run` stage of each thread, so sub-agent runs are part of
+their caller's profile):
+    - `StageTimer`: aggregates the count and total duration of each stage
+    - `CProfileHook`: a `cProfile` profile per run, written as a `.prof` file (`python -m pstats`, snakeviz)
+    - `SamplingProfilerHook`: samples the stack of the running thread and writes collapsed stacks (`.folded`), the
+      input of `flamegraph.pl` and speedscope
+    - `TracemallocHook`: the top memory allocations of the run from two `tracemalloc` snapshots
+"""
+
+import cProfile
+import itertools
+import sys
+import threading
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+from game.logger import get_logger
+
+if TYPE_CHECKING:
+    from game.agent import Agent
+
+logger = get_logger(__name__)
+
+
+class Stage:
+    RUN = "run"
+    PROMPT = "prompt"
+    LLM = "llm"
+    PARSE = "parse"
+    TOOL = "tool"
+    MEMORY = "memory"
+    TERMINATION = "termination"
+
+
+class Hook:
+    """Base class of the hooks, override the callbacks of interest"""
+
+    def before(self, stage: str, agent: "Agent") -> None:
+        """Called before `stage` starts"""
+
+    def after(self, stage: str, agent: "Agent", duration_ns: int) -> None:
+        """Called after `stage` ends, also when it raised, with its monotonic duration in nanoseconds"""
+
+
+_global_hooks: list[Hook] = []
+_NULL_STAGE = nullcontext()
+
+
+def register_hook(hook: Hook) -> None:
+    """Registers a hook called for the stages of all agents"""
+    _global_hooks.append(hook)
+
+
+def unregister_hook(hook: Hook) -> None:
+    _global_hooks.remove(hook)
+
+
+def get_hooks() -> list[Hook]:
+    """Returns the globally registered hooks"""
+    return list(_global_hooks)
+
+
+class _StageContext:
+    __slots__ = ("hooks", "stage", "agent", "start_ns")
+
+    def __init__(self, hooks: list[Hook], stage: str, agent: "Agent"):
+        self.hooks = hooks
+        self.stage = stage
+        self.agent = agent
+
+    def __enter__(self):
+        for hook in self.hooks:
+            try:
+                hook.before(self.stage, self.agent)
+            except Exception as e:
+                logger.error(
+                    f"Hook {hook} failed before stage '{self.stage}': {e.__class__.__name__}('{e}')"
+                )
+        self.start_ns = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        for hook in reversed(self.hooks):
+            try:
+                hook.after(self.stage, self.agent, duration_ns)
+            except Exception as e:
+                logger.error(
+                    f"Hook {hook} failed after stage '{self.stage}': {e.__class__.__name__}('{e}')"
+                )
+
+
+def stage(name: str, agent: "Agent"):
+    """
+    Returns a context manager calling the hooks of `agent` and the global hooks around a stage
+
+    Args:
+        name: The name of the stage, one of `Stage`
+        agent: The agent running the stage
+    """
+    if not agent.hooks and not _global_hooks:
+        return _NULL_STAGE
+    return _StageContext(agent.hooks + _global_hooks, name, agent)
+
+
+class StageTimer(Hook):
+    """Aggregates the number of calls and the total duration of each stage"""
+
+    def __init__(self):
+        self.counts: Counter[str] = Counter()
+        self.total_ns: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def after(self, stage: str, agent: "Agent", duration_ns: int) -> None:
+        with self._lock:
+            self.counts[stage] += 1
+            self.total_ns[stage] += duration_ns
+
+    def summary(self) -> dict[str, dict]:
+        """Returns the `count`, `total_ms` and `mean_ms` of each stage"""
+        return {
+            stage: {
+                "count": count,
+                "total_ms": self.total_ns[stage] / 1e6,
+                "mean_ms": self.total_ns[stage] / count / 1e6,
+            }
+            for stage, count in self.counts.items()
+        }
+
+
+class RunProfilerHook(Hook, ABC):
+    """
+    Base class of the hooks profiling the outermost run of each thread. Subclasses implement `start` and `stop`,
+    `stop` returns the path of the written file.
+    """
+
+    def __init__(self, output_dir: Union[str, Path] = "."):
+        """
+        Args:
+            output_dir: The directory of the written files, created if it doesn't exist
+        """
+        self.output_dir = Path(output_dir)
+        self.files: list[Path] = []
+        self._local = threading.local()
+        self._counter = itertools.count()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(output_dir='{self.output_dir}')"
+
+    def _path(self, agent: "Agent", suffix: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = time.strftime("%Y%m%dT%H%M%S")
+        return (
+            self.output_dir / f"{agent.name}-{timestamp}-{next(self._counter)}{suffix}"
+        )
+
+    def before(self, stage: str, agent: "Agent") -> None:
+        if stage != Stage.RUN:
+            return
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        if depth == 0:
+            # stays `None` if `start` raises, eg when another profiler is active
+            self._local.state = None
+            self._local.state = self.start(agent)
+
+    def after(self, stage: str, agent: "Agent", duration_ns: int) -> None:
+        if stage != Stage.RUN:
+            return
+        self._local.depth -= 1
+        if self._local.depth == 0 and self._local.state is not None:
+            path = self.stop(agent, self._local.state)
+            self._local.state = None
+            self.files.append(path)
+            logger.debug(f"{self} wrote '{path}'")
+
+    @abstractmethod
+    def start(self, agent: "Agent"):
+        """Starts profiling, returns the state passed to `stop`"""
+
+    @abstractmethod
+    def stop(self, agent: "Agent", state) -> Path:
+        """Stops profiling and writes the results, returns the path of the written file"""
+
+
+class CProfileHook(RunProfilerHook):
+    """Writes a `cProfile` profile (`.prof`) per run"""
+
+    def start(self, agent: "Agent") -> cProfile.Profile:
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, agent: "Agent", state: cProfile.Profile) -> Path:
+        state.disable()
+        path = self._path(agent, ".prof")
+        state.dump_stats(path)
+        return path
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, thread_id: int, interval_secs: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval_secs = interval_secs
+        self.stacks: Counter[str] = Counter()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_secs):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class SamplingProfilerHook(RunProfilerHook):
+    """Samples the stack of the thread running the agent and writes collapsed stacks (`.folded`) per run"""
+
+    def __init__(
+        self, output_dir: Union[str, Path] = ".", interval_secs: float = 0.005
+    ):
+        """
+        Args:
+            output_dir: The directory of the written files, created if it doesn't exist
+            interval_secs: The sampling interval
+        """
+        super().__init__(output_dir)
+        self.interval_secs = interval_secs
+
+    def start(self, agent: "Agent") -> _StackSampler:
+        sampler = _StackSampler(threading.get_ident(), self.interval_secs)
+        sampler.start()
+        return sampler
+
+    def stop(self, agent: "Agent", state: _StackSampler) -> Path:
+        state.stop_event.set()
+        state.join()
+        path = self._path(agent, ".folded")
+        with path.open("w", encoding="utf-8") as f:
+            for stack, count in state.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class TracemallocHook(RunProfilerHook):
+    """Writes the top memory allocations of each run (`.tracemalloc.txt`), from a snapshot before and after it"""
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path] = ".",
+        top_n: int = 25,
+        key_type: str = "lineno",
+        nframes: int = 1,
+    ):
+        """
+        Args:
+            output_dir: The directory of the written files, created if it doesn't exist
+            top_n: The number of allocation sites to write
+            key_type: How the allocations are grouped, `"lineno"`, `"filename"` or `"traceback"`
+            nframes: The number of frames stored per allocation, if `tracemalloc` isn't already tracing
+        """
+        super().__init__(output_dir)
+        self.top_n = top_n
+        self.key_type = key_type
+        self.nframes = nframes
+
+    def start(self, agent: "Agent") -> tuple[bool, tracemalloc.Snapshot]:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.nframes)
+        return started, tracemalloc.take_snapshot()
+
+    def stop(self, agent: "Agent", state: tuple[bool, tracemalloc.Snapshot]) -> Path:
+        started, before = state
+        diff = tracemalloc.take_snapshot().compare_to(before, self.key_type)
+        if started:
+            tracemalloc.stop()
+
+        sizes = defaultdict(int)
+        for stat in diff:
+            sizes["allocated" if stat.size_diff > 0 else "freed"] += stat.size_diff
+        path = self._path(agent, ".tracemalloc.txt")
+        with path.open("w", encoding="utf-8") as f:
+            f.write(
+                f"agent: {agent.name}\n"
+                f"allocated: {sizes['allocated']} B\n"
+                f"freed: {-sizes['freed']} B\n\n"
+            )
+            for stat in diff[: self.top_n]:
+                f.write(f"{stat}\n")
+        return path
@@ -1,3 +1,4 @@
 from game.language.base import AgentLanguage
 from game.language.function_calling_language import AgentFunctionCallingActionLanguage
 from game.language.json_action_language import AgentJsonActionLanguage
+from game.language.plan_language import AgentPlanLanguage
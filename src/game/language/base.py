@@ -14,11 +14,13 @@ https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VNHjO/how-your-ag
 """
 
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Callable, Optional
 
 from game.action import Action
 from game.goal import Goal
 from game.memory.base import Memory
+from game.memory.vector_memory import VectorMemory
+from game.memory.view import MemoryView
 from game.prompt import Prompt
 
 
@@ -30,6 +32,34 @@ class AgentLanguage(ABC):
         - Response Parsing: Interpreting the LLM’s response to determine what action the agent should take
     """
 
+    def __init__(self, memory_top_k: Optional[int] = None, repair: bool = True):
+        """
+        Args:
+            memory_top_k: If set and the agent uses a `VectorMemory`, only the `memory_top_k` past memories most
+                relevant to the current context (plus the initial task and the most recent memories) are rendered in
+                the prompt instead of the full history.
+            repair: If set, almost valid responses (eg trailing commas, single quotes or a tool name with another
+                case) are repaired locally instead of failing, see `game.language.repair`
+        """
+        self.memory_top_k = memory_top_k
+        self.repair = repair
+
+    def _get_memories(self, memory: Memory) -> list[dict]:
+        """Returns the memories that should be rendered in the prompt"""
+        if self.memory_top_k and isinstance(memory, VectorMemory):
+            return memory.get_relevant_memories(top_k=self.memory_top_k)
+        return memory.get_memories()
+
+    def _render_memories(self, memory: Memory, render: Callable) -> list[dict]:
+        """Renders the memories of the prompt into messages, reusing the rendered prefix of the memory views"""
+        if isinstance(memory, MemoryView):
+            return memory.render_memories(render)
+        return [render(m) for m in self._get_memories(memory)]
+
+    def get_tools(self) -> list[Action]:
+        """The tools the language relies on, added to the tools of the agents using it"""
+        return []
+
     @abstractmethod
     def construct_prompt(
         self,
@@ -48,7 +78,8 @@ class AgentLanguage(ABC):
             response:
 
         Returns:
-            A dictionary with {"tool": "TOOL_NAME", "args": {"message": response}}
+            A dictionary with {"tool": "TOOL_NAME", "args": {"message": response}}, if the response was repaired the
+            names of the repairs are listed under `REPAIRS_KEY`
 
         Raises:
             ActionNotPresentInResponseError: When no tool is provided in the response
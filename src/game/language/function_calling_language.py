@@ -7,10 +7,10 @@ to see the LLM’s reasoning, but the upside is that it simplifies getting valid
 https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VNHjO/how-your-agent-communicates-with-the-llm-the-agent-language
 """
 
-import json
 from json import JSONDecodeError
 from typing import Any, List, Optional
 
+from game import codec
 from game.action import Action
 from game.goal import Goal
 from game.language.base import AgentLanguage
@@ -19,8 +19,10 @@ from game.language.exceptions import (
     ActionNotPresentInResponseError,
     ResponseIsNoneError,
 )
+from game.language.repair import REPAIRS_KEY, repair_json
 from game.logger import get_logger
 from game.memory.base import Memory
+from game.memory.item import as_dict
 from game.prompt import Prompt
 
 logging = get_logger(__name__)
@@ -40,8 +42,8 @@ class AgentFunctionCallingActionLanguage(AgentLanguage):
         4. Parse function calls from the LLM’s responses
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, memory_top_k: Optional[int] = None, repair: bool = True):
+        super().__init__(memory_top_k=memory_top_k, repair=repair)
 
     def _format_goals_agents(
         self,
@@ -65,32 +67,29 @@ class AgentFunctionCallingActionLanguage(AgentLanguage):
             }
         ]
 
-    @staticmethod
-    def _format_memory(memory: Memory) -> List:
+    def _format_memory(self, memory: Memory) -> List:
         """Generate response from language model"""
+        return self._render_memories(memory, self._format_memory_item)
+
+    @staticmethod
+    def _format_memory_item(item) -> dict:
         # Map all environment results to a role:user messages
         # Map all assistant messages to a role:assistant messages
         # Map all user messages to a role:user messages
-        items = memory.get_memories()
-        mapped_items = []
-        for item in items:
-
-            content = item.get("content", None)
-            if not content:
-                content = json.dumps(item, indent=4)
-
-            if item["type"] == "assistant":
-                mapped_items.append({"role": "assistant", "content": content})
-            elif item["type"] == "environment":
-                # here: https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VCvzH/ai-agent-feedback-and-memory
-                ##   type: is user
-                #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/9r3Ux/gail-goals-actions-information-language
-                #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/034la/tool-results-and-agent-feedback
-                mapped_items.append({"role": "user", "content": content})
-            else:
-                mapped_items.append({"role": "user", "content": content})
-
-        return mapped_items
+        content = item.get("content", None)
+        if not content:
+            content = codec.dumps(as_dict(item), indent=True)
+
+        if item["type"] == "assistant":
+            return {"role": "assistant", "content": content}
+        elif item["type"] == "environment":
+            # here: https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VCvzH/ai-agent-feedback-and-memory
+            ##   type: is user
+            #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/9r3Ux/gail-goals-actions-information-language
+            #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/034la/tool-results-and-agent-feedback
+            return {"role": "user", "content": content}
+        else:
+            return {"role": "user", "content": content}
 
     @staticmethod
     def _format_actions(
@@ -144,12 +143,30 @@ class AgentFunctionCallingActionLanguage(AgentLanguage):
             ActionNotPresentInResponseError: If no tool call (serialized dict) is present in the `response`.
         """
         try:
-            return json.loads(response)
+            if not self.repair:
+                invocation, repairs = codec.loads(response), []
+            else:
+                invocation, repairs = repair_json(response)
+            if not isinstance(invocation, dict):
+                logging.debug(f"The tool call of response='{response}' isn't an object")
+                raise ActionNotPresentInResponseError(
+                    "The tool call must be a JSON object, please provide a tool call"
+                )
+            # the arguments of a malformed tool call are passed on as a string, see `LiteLlm`
+            if self.repair and isinstance(invocation.get("args"), str):
+                invocation["args"], args_repairs = repair_json(invocation["args"])
+                repairs += [r for r in args_repairs if r not in repairs]
+            if repairs:
+                logging.debug(f"Repaired the tool call of {response=} with {repairs}")
+                invocation[REPAIRS_KEY] = repairs
+            return invocation
         except JSONDecodeError:
             logging.debug(f"No tool call specified in response='{response}'")
             raise ActionNotPresentInResponseError(
                 "No tool call specified, please provide a tool call"
             )
+        except ActionNotPresentInResponseError:
+            raise
         except Exception as e:
             error_message = (
                 f"Failed to parse action in response='{response}'. "
@@ -3,19 +3,23 @@
 https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VNHjO/how-your-agent-communicates-with-the-llm-the-agent-language
 """
 
-import json
+import threading
+from dataclasses import dataclass, field
 from json import JSONDecodeError
 from typing import Optional
 
+from game import codec
 from game.action import Action
 from game.goal import Goal
 from game.logger import get_logger
 from game.memory.base import Memory
+from game.memory.item import as_dict
 from game.prompt import Prompt
 
 from .base import AgentLanguage
 from .common import format_goals, format_managed_agents
 from .exceptions import ActionNotPresentInResponseError
+from .repair import REPAIRS_KEY, repair_json
 
 logger = get_logger(__name__)
 
@@ -30,12 +34,121 @@ ACTION_FORMAT = """
 }
 ```"""
 
+STRUCTURED_FORMAT = """
+Respond with a single JSON object with your step by step thoughts and the tool to call:
+
+{
+    "thought": "<Stop and think step by step. Insert your thoughts here.>",
+    "action": {
+        "tool": "tool_name",
+        "args": {...fill in arguments...}
+    }
+}"""
+
+# set in the invocations parsed from a structured output response, to `"structured"` or `"fallback"`
+STRUCTURED_OUTPUT_KEY = "_structured_output"
+# set to `True` in the invocations parsed from a structured output response that would have failed to parse as text,
+# costing a retry
+RETRY_AVOIDED_KEY = "_retry_avoided"
+
+
+@dataclass
+class StructuredOutputStats:
+    """Counts the responses of the structured output mode by how they were parsed"""
+
+    responses: int = 0
+    structured: int = 0
+    fallback: int = 0
+    retries_avoided: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record(self, mode: str, retry_avoided: bool = False) -> None:
+        """
+        Args:
+            mode: `"structured"` if the response was parsed with a single `codec.loads`, `"fallback"` if the action
+                was extracted from a markdown block
+            retry_avoided: If parsing the response as text would have failed, see `RETRY_AVOIDED_KEY`
+        """
+        with self._lock:
+            self.responses += 1
+            if mode == "structured":
+                self.structured += 1
+            else:
+                self.fallback += 1
+            if retry_avoided:
+                self.retries_avoided += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "structured": self.structured,
+                "fallback": self.fallback,
+                "retries_avoided": self.retries_avoided,
+            }
+
+
+def action_response_format(actions: list[Action]) -> dict:
+    """
+    The `response_format` constraining the response to a thought and a call of one of the `actions`
+
+    The action is a discriminated union of the tools: its `tool` is the name of a tool and its `args` follow the
+    parameters of this tool.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "agent_action",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "thought": {"type": "string"},
+                    "action": {
+                        "anyOf": [
+                            {
+                                "type": "object",
+                                "properties": {
+                                    "tool": {"type": "string", "enum": [action.name]},
+                                    "args": action.parameters,
+                                },
+                                "required": ["tool", "args"],
+                                "additionalProperties": False,
+                            }
+                            for action in actions
+                        ]
+                    },
+                },
+                "required": ["thought", "action"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
 
 class AgentJsonActionLanguage(AgentLanguage):
     """This language allows the LLM to output text and specify actions in special ```action markdown blocks"""
 
-    def __init__(self, action_labels: Optional[list[str]] = None):
-        super().__init__()
+    def __init__(
+        self,
+        action_labels: Optional[list[str]] = None,
+        memory_top_k: Optional[int] = None,
+        repair: bool = True,
+        structured_output: bool = False,
+    ):
+        """
+        Args:
+            action_labels: The labels of the markdown blocks with the action, eg ```action
+            memory_top_k: See `AgentLanguage`
+            repair: See `AgentLanguage`
+            structured_output: If set, the prompts have a `response_format` with the JSON schema of the actions (see
+                `action_response_format`) so models supporting constrained decoding answer with a JSON object parsed
+                by a single `codec.loads`. The responses of the other models are still parsed from markdown blocks.
+        """
+        super().__init__(memory_top_k=memory_top_k, repair=repair)
+        self.structured_output = structured_output
+        self._response_format: tuple[tuple, Optional[dict]] = ((), None)
 
         self.action_labels = action_labels or [
             "action",
@@ -60,9 +173,9 @@ class AgentJsonActionLanguage(AgentLanguage):
             {
                 "role": "system",
                 "content": f"""
-Available Tools: {json.dumps(action_descriptions, indent=4)}
+Available Tools: {codec.dumps(action_descriptions, indent=True)}
 
-{ACTION_FORMAT}
+{STRUCTURED_FORMAT if self.structured_output else ACTION_FORMAT}
 """,
             }
         ]
@@ -88,29 +201,27 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
 
     def format_memory(self, memory: Memory) -> list:
         """Generate response from language model"""
+        return self._render_memories(memory, self._format_memory_item)
+
+    @staticmethod
+    def _format_memory_item(item) -> dict:
         # Map all environment results to a role:user messages
         # Map all assistant messages to a role:assistant messages
         # Map all user messages to a role:user messages
-        items = memory.get_memories()
-        mapped_items = []
-        for item in items:
-
-            content = item.get("content", None)
-            if not content:
-                content = json.dumps(item, indent=4)
-
-            if item["type"] == "assistant":
-                mapped_items.append({"role": "assistant", "content": content})
-            elif item["type"] == "environment":
-                # here: https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VCvzH/ai-agent-feedback-and-memory
-                ##   type: is user
-                #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/9r3Ux/gail-goals-actions-information-language
-                #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/034la/tool-results-and-agent-feedback
-                mapped_items.append({"role": "user", "content": content})
-            else:
-                mapped_items.append({"role": "user", "content": content})
-
-        return mapped_items
+        content = item.get("content", None)
+        if not content:
+            content = codec.dumps(as_dict(item), indent=True)
+
+        if item["type"] == "assistant":
+            return {"role": "assistant", "content": content}
+        elif item["type"] == "environment":
+            # here: https://www.coursera.org/learn/ai-agents-python/ungradedWidget/VCvzH/ai-agent-feedback-and-memory
+            ##   type: is user
+            #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/9r3Ux/gail-goals-actions-information-language
+            #    also here: https://www.coursera.org/learn/ai-agents-python/lecture/034la/tool-results-and-agent-feedback
+            return {"role": "user", "content": content}
+        else:
+            return {"role": "user", "content": content}
 
     def construct_prompt(
         self,
@@ -126,18 +237,62 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
         )
         prompt += self.format_memory(memory)
         return Prompt(
-            messages=prompt, managed_agent_descriptions=managed_agent_descriptions
+            messages=prompt,
+            managed_agent_descriptions=managed_agent_descriptions,
+            response_format=(
+                self.get_response_format(actions) if self.structured_output else None
+            ),
         )
 
+    def get_response_format(self, actions: list[Action]) -> dict:
+        """The `action_response_format` of the `actions`, cached while the actions don't change"""
+        key = tuple(map(id, actions))
+        cached_key, response_format = self._response_format
+        if cached_key != key or response_format is None:
+            response_format = action_response_format(actions)
+            self._response_format = (key, response_format)
+        return response_format
+
     def parse_response(self, response: str) -> dict:
         """
-        Extract and parse the action block by attempting
+        Extract and parse the action block by attempting each of the `action_labels`. In the structured output mode
+        the response is first parsed as a JSON object with a thought and an action.
+
         Args:
-            response:
+            response: The LLM response
 
         Returns:
+            The action, in the structured output mode with `STRUCTURED_OUTPUT_KEY` telling how it was parsed and
+            `RETRY_AVOIDED_KEY` if parsing it as text would have failed
 
+        Raises:
+            ActionNotPresentInResponseError: If there isn't any action in the response
         """
+        if not self.structured_output:
+            return self._parse_markdown(response)
+        try:
+            result = codec.loads(response)
+        except (JSONDecodeError, TypeError):
+            result = None
+        if isinstance(action := self._unwrap_action(result), dict) and isinstance(
+            action.get("tool"), str
+        ):
+            invocation = {**action, STRUCTURED_OUTPUT_KEY: "structured"}
+            # without a markdown block `_parse_markdown` only finds the action by repairing the whole response
+            if not self.repair and "```" not in response:
+                invocation[RETRY_AVOIDED_KEY] = True
+            return invocation
+        logger.debug("The response isn't structured, parsing its markdown blocks")
+        return {**self._parse_markdown(response), STRUCTURED_OUTPUT_KEY: "fallback"}
+
+    @staticmethod
+    def _unwrap_action(result):
+        """The action of a structured output `{"thought": ..., "action": {...}}`, or else `result`"""
+        if isinstance(result, dict) and isinstance(result.get("action"), dict):
+            return result["action"]
+        return result
+
+    def _parse_markdown(self, response: str) -> dict:
         response_filtered = response.replace("\n", "")
         final_error_message = (
             f"Please use the following format in your responses: {ACTION_FORMAT}"
@@ -148,8 +303,10 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
                 logger.debug(
                     f"Trying to parse response: '{response_filtered}' with '{action_label}'"
                 )
-                result = self._parse_response(
-                    response, start_marker=f"```{action_label}", end_marker="```"
+                result = self._unwrap_action(
+                    self._parse_response(
+                        response, start_marker=f"```{action_label}", end_marker="```"
+                    )
                 )
                 logger.debug(f"Success, the result is '{result}'")
                 return result
@@ -159,6 +316,11 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
                     f"'{response_filtered}'. Trying again..."
                 )
             except JSONDecodeError:
+                repaired = self._repair_block(
+                    response, start_marker=f"```{action_label}"
+                )
+                if repaired is not None:
+                    return repaired
                 logger.debug(
                     f"Failed to parse response: No '```{action_label}' found in response="
                     f"'{response_filtered}'. Trying again..."
@@ -169,6 +331,10 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
                     f"Error raised: {e.__class__.__name__}('{e}'). {final_error_message}"
                 )
 
+        # the action may not be in a markdown block at all
+        if (repaired := self._repair_block(response, start_marker="")) is not None:
+            return repaired
+
         error_message = (
             f"Failed to parse response: '{response_filtered}'. {final_error_message}"
         )
@@ -178,8 +344,42 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
             f"No action found in response. Please provide an appropriate action."
         )
 
-    @staticmethod
-    def _parse_response(response: str, start_marker: str, end_marker="```") -> dict:
+    def _repair_block(
+        self, response: str, start_marker: str, end_marker="```"
+    ) -> Optional[dict]:
+        """
+        Repairs the malformed action json of a response, see `game.language.repair`
+
+        Args:
+            response: Response coming from the LLM
+            start_marker: Start marker of the action json in the response, the whole response is repaired if empty
+            end_marker: End marker of the action json in the response
+
+        Returns:
+            The action with the names of the repairs under `REPAIRS_KEY`, `None` if the repairs are disabled or
+            the json can't be repaired into an action
+        """
+        if not self.repair:
+            return None
+        try:
+            json_str = (
+                self._extract_block(response, start_marker, end_marker)
+                if start_marker
+                else response
+            )
+            result, repairs = repair_json(json_str)
+        except (ActionNotPresentInResponseError, JSONDecodeError):
+            return None
+        result = self._unwrap_action(result)
+        if not isinstance(result, dict) or not isinstance(result.get("tool"), str):
+            return None
+        logger.debug(f"Repaired the action of response='{response}' with {repairs}")
+        return {**result, REPAIRS_KEY: repairs} if repairs else result
+
+    @classmethod
+    def _parse_response(
+        cls, response: str, start_marker: str, end_marker="```"
+    ) -> dict:
         """
         Helper function that extracts the action json from an LLM response.
 
@@ -196,6 +396,17 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
             JSONDecodeError: If the json description of the action is malformed
 
         """
+        return codec.loads(cls._extract_block(response, start_marker, end_marker))
+
+    @staticmethod
+    def _extract_block(response: str, start_marker: str, end_marker="```") -> str:
+        """
+        Helper function that extracts the action json string from an LLM response, up to the end of the response if
+        the block isn't closed
+
+        Raises:
+            ActionNotPresentInResponseError: If the `start_marker` is not present in the response
+        """
         stripped_response = response.strip()
         start_index = stripped_response.find(start_marker)
 
@@ -210,13 +421,12 @@ Available Tools: {json.dumps(action_descriptions, indent=4)}
             )
             start_index = start_index + new_line_offset
 
+        end_offset = stripped_response[start_index + len(start_marker) :].find(
+            end_marker
+        )
         end_index = (
-            stripped_response[start_index + len(start_marker) :].find(end_marker)
-            + start_index
-            + len(start_marker)
+            end_offset + start_index + len(start_marker)
+            if end_offset > -1
+            else len(stripped_response)
         )
-        json_str = stripped_response[
-            start_index + len(start_marker) : end_index
-        ].strip()
-
-        return json.loads(json_str)
+        return stripped_response[start_index + len(start_marker) : end_index].strip()
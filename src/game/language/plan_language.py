@@ -0,0 +1,101 @@
+"""Plan-and-execute Action Language
+
+The LLM answers with a plan, a DAG of tool calls in a ```plan block, that the agent validates and runs with the
+`execute_plan` tool, independent steps in parallel (see `game.plan`). The LLM is only called again to replan when
+a step failed, or to answer once the results are in when the plan has no terminal step. A single ```action block is
+still accepted, eg to terminate with a summary.
+"""
+
+from json import JSONDecodeError
+
+from game import codec
+from game.action import Action
+from game.action.library.plan import PLAN_TOOL_NAME, execute_plan
+from game.logger import get_logger
+
+from .exceptions import ActionNotPresentInResponseError
+from .json_action_language import ACTION_FORMAT, AgentJsonActionLanguage
+from .repair import REPAIRS_KEY, repair_json
+
+logger = get_logger(__name__)
+
+
+PLAN_FORMAT = """
+Plan all the tool calls needed for the task at once, as a list of steps. The args of a step can use the result of an
+earlier step with "${step_id}" (or "${step_id.key}" for a key of the result). Steps that don't depend on each other
+run in parallel. If the final answer can be written from the results, end the plan with a `terminate` step, otherwise
+leave it out and you will get the results of the steps.
+
+<Stop and think step by step. Insert your thoughts here.>
+
+```plan
+{
+    "steps": [
+        {"id": "first", "tool": "tool_name", "args": {...fill in arguments...}},
+        {"id": "second", "tool": "other_tool_name", "args": {"argument": "${first}"}},
+        {"id": "answer", "tool": "terminate", "args": {"message": "... ${second} ..."}}
+    ]
+}
+```
+
+If a step failed, reply with a new plan for the remaining work. To call a single tool you can also use:
+"""
+
+
+class AgentPlanLanguage(AgentJsonActionLanguage):
+    """The LLM outputs a plan of tool calls in a ```plan markdown block, or a single action"""
+
+    def get_tools(self) -> list[Action]:
+        return [execute_plan]
+
+    def _format_actions(self, actions: list[Action]) -> list:
+        # the plan tool is called through the ```plan block
+        action_descriptions = [
+            {
+                "name": action.name,
+                "description": action.description,
+                "args": action.parameters,
+            }
+            for action in actions
+            if action.name != PLAN_TOOL_NAME
+        ]
+
+        return [
+            {
+                "role": "system",
+                "content": f"""
+Available Tools: {codec.dumps(action_descriptions, indent=True)}
+
+{PLAN_FORMAT}
+{ACTION_FORMAT}
+""",
+            }
+        ]
+
+    def parse_response(self, response: str) -> dict:
+        """
+        Extracts the ```plan block as an `execute_plan` invocation, or else a single action
+
+        Raises:
+            ActionNotPresentInResponseError: When there isn't any plan nor action in the response
+        """
+        repairs = []
+        try:
+            plan = self._parse_response(response, start_marker="```plan")
+        except ActionNotPresentInResponseError:
+            return super().parse_response(response)
+        except JSONDecodeError as e:
+            try:
+                if not self.repair:
+                    raise
+                plan, repairs = repair_json(
+                    self._extract_block(response, start_marker="```plan")
+                )
+            except JSONDecodeError:
+                logger.debug(f"Failed to parse the plan of response='{response}': {e}")
+                raise ActionNotPresentInResponseError(
+                    f"The plan is not valid JSON: {e}. Please provide a valid plan."
+                )
+        steps = plan.get("steps") if isinstance(plan, dict) else plan
+        invocation = {"tool": PLAN_TOOL_NAME, "args": {"steps": steps}}
+        return {**invocation, REPAIRS_KEY: repairs} if repairs else invocation
@@ -0,0 +1,213 @@
+"""Local repair of almost valid LLM responses
+
+LLMs often answer with actions that are almost valid JSON: trailing commas, single quotes, Python literals
+(`True`/`None`), unquoted keys, raw newlines in strings, a missing closing brace or a tool name with another case.
+Instead of spending an LLM iteration on an error message, the agent languages repair these deterministically:
+
+    >>> repair_json("{'tool': 'search', 'args': {'query': 'x', 'exact': True,}")
+    ({'tool': 'search', 'args': {'query': 'x', 'exact': True}}, ['single_quotes', 'python_literals', 'trailing_comma', 'missing_brackets'])
+    >>> match_tool_name("Search", ["search", "terminate"])
+    'search'
+
+The repairs applied to a response are recorded in the invocation under `REPAIRS_KEY`, the agent counts them in its
+`RepairStats` and the `game_parse_repairs_total` metric.
+"""
+
+import difflib
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from json import JSONDecodeError
+from typing import Any, Iterable, Optional
+
+from game import codec
+
+REPAIRS_KEY = "_repairs"
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+JSON_LITERALS = {"true", "false", "null"}
+CLOSING_BRACKETS = {"{": "}", "[": "]"}
+_WORD_PATTERN = re.compile(r"[A-Za-z_][\w-]*")
+
+
+def _strip_trailing_comma(output: list[str]) -> bool:
+    """Removes a `,` (and the whitespace after it) at the end of `output`"""
+    i = len(output) - 1
+    while i >= 0 and output[i].isspace():
+        i -= 1
+    if i >= 0 and output[i] == ",":
+        del output[i:]
+        return True
+    return False
+
+
+def repair_json(text: str) -> tuple[Any, list[str]]:
+    """
+    Parses `text` as JSON, repairing the common mistakes of LLMs
+
+    Args:
+        text: The JSON, possibly surrounded by text
+
+    Returns:
+        The parsed value and the names of the applied repairs, empty if `text` was valid JSON
+
+    Raises:
+        JSONDecodeError: If `text` doesn't contain a JSON object or array or it can't be repaired
+    """
+    try:
+        return codec.loads(text), []
+    except JSONDecodeError:
+        pass
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise JSONDecodeError("No JSON object found", text, 0)
+    start = min(starts)
+    repairs = ["extracted_json"] if text[:start].strip() else []
+
+    def repaired(name: str) -> None:
+        if name not in repairs:
+            repairs.append(name)
+
+    output: list[str] = []
+    stack: list[str] = []
+    quote: Optional[str] = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote is not None:
+            if char == "\\" and i + 1 < len(text):
+                following = text[i + 1]
+                # `\'` isn't a valid JSON escape
+                output.append(following if following == "'" else char + following)
+                i += 2
+                continue
+            if char == quote:
+                output.append('"')
+                quote = None
+            elif char == '"':
+                output.append('\\"')
+            elif char in "\n\r\t":
+                output.append(json.dumps(char)[1:-1])
+                repaired("control_characters")
+            else:
+                output.append(char)
+        elif char in "\"'":
+            quote = char
+            output.append('"')
+            if char == "'":
+                repaired("single_quotes")
+        elif char in CLOSING_BRACKETS:
+            stack.append(char)
+            output.append(char)
+        elif char in "}]":
+            if _strip_trailing_comma(output):
+                repaired("trailing_comma")
+            if not stack:
+                break
+            output.append(CLOSING_BRACKETS[stack.pop()])
+            if not stack:
+                i += 1
+                break
+        elif match := _WORD_PATTERN.match(text, i):
+            word = match.group(0)
+            if word in PYTHON_LITERALS:
+                output.append(PYTHON_LITERALS[word])
+                repaired("python_literals")
+            elif word in JSON_LITERALS:
+                output.append(word)
+            elif text[match.end() :].lstrip().startswith(":"):
+                output.append(json.dumps(word))
+                repaired("unquoted_keys")
+            else:
+                output.append(word)
+            i = match.end()
+            continue
+        else:
+            output.append(char)
+        i += 1
+
+    if text[i:].strip().strip("`").strip():
+        repaired("extracted_json")
+    if quote is not None:
+        output.append('"')
+        repaired("unclosed_string")
+    if stack:
+        _strip_trailing_comma(output)
+        output.extend(CLOSING_BRACKETS[b] for b in reversed(stack))
+        repaired("missing_brackets")
+
+    return codec.loads("".join(output)), repairs
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def match_tool_name(
+    name: str, tool_names: Iterable[str], cutoff: float = 0.85
+) -> Optional[str]:
+    """
+    Finds the tool an LLM meant with `name`
+
+    Args:
+        name: The tool name of the LLM response
+        tool_names: The names of the available tools
+        cutoff: The minimum similarity ratio of a fuzzy match
+
+    Returns:
+        `name` if it is a tool, else the only tool equal to `name` ignoring case and separators (eg `getWeather` and
+        `get_weather`) or the only tool similar enough to it, `None` if there isn't a single match
+    """
+    tool_names = list(tool_names)
+    if name in tool_names:
+        return name
+    normalized = [n for n in tool_names if _normalize(n) == _normalize(name)]
+    if len(normalized) == 1:
+        return normalized[0]
+    by_normalized = {_normalize(n): n for n in tool_names}
+    matches = difflib.get_close_matches(
+        _normalize(name), list(by_normalized), n=2, cutoff=cutoff
+    )
+    if len(matches) == 1:
+        return by_normalized[matches[0]]
+    return None
+
+
+@dataclass
+class RepairStats:
+    """Counts the responses parsed by an agent, the ones that were repaired and the ones that still failed"""
+
+    responses: int = 0
+    repaired: int = 0
+    failed: int = 0
+    repairs: dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @property
+    def iterations_saved(self) -> int:
+        """The LLM iterations saved: without the repairs, each repaired response would have cost an error round-trip"""
+        return self.repaired
+
+    def record(self, repairs: Optional[list[str]], failed: bool = False) -> None:
+        with self._lock:
+            self.responses += 1
+            if failed:
+                self.failed += 1
+            elif repairs:
+                self.repaired += 1
+                for repair in repairs:
+                    self.repairs[repair] = self.repairs.get(repair, 0) + 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "repaired": self.repaired,
+                "failed": self.failed,
+                "iterations_saved": self.iterations_saved,
+                "repairs": dict(self.repairs),
+            }
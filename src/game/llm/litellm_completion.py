@@ -1,6 +1,6 @@
 """Interact with LLMs using litellm"""
 
-import json
+from json import JSONDecodeError
 from typing import Optional, Union
 
 import litellm
@@ -8,6 +8,7 @@ from litellm import completion
 from litellm.litellm_core_utils.streaming_handler import CustomStreamWrapper
 from litellm.types.utils import ModelResponse
 
+from game import budget, codec, metrics, tracing
 from game.llm import Llm
 from game.logger import get_logger
 from game.prompt import Prompt
@@ -34,18 +35,43 @@ class LiteLlm(Llm):
         self.max_tokens = max_tokens
         self.base_url = base_url
         self.max_retries = max_reties
+        self._supports_response_schema: Optional[bool] = None
 
     @property
     def name(self) -> str:
         return self.model
 
+    @property
+    def supports_response_schema(self) -> bool:
+        """If the model supports JSON-schema constrained decoding with `response_format`"""
+        if self._supports_response_schema is None:
+            try:
+                self._supports_response_schema = litellm.supports_response_schema(
+                    model=self.model
+                )
+            except Exception as e:
+                logger.debug(f"Failed to check the response schema support: {e}")
+                self._supports_response_schema = False
+        return self._supports_response_schema
+
     def _run_completion(
-        self, messages: list[dict], tools: Optional[list[dict]] = None
+        self,
+        messages: list[dict],
+        tools: Optional[list[dict]] = None,
+        response_format: Optional[dict] = None,
     ) -> Union[ModelResponse, CustomStreamWrapper]:
+        # `response_format` is only passed when set, not all providers accept the argument
+        kwargs = {"response_format": response_format} if response_format else {}
+        # the call must not outlive the deadline of the budget of the run
+        current_budget = budget.current_budget()
+        if current_budget is not None:
+            if (seconds := current_budget.remaining()["seconds"]) is not None:
+                kwargs["timeout"] = max(seconds, 1.0)
         return completion(
             model=self.model,
             messages=messages,
             tools=tools,
+            **kwargs,
             max_tokens=self.max_tokens,
             temperature=self.temperature,
             api_key=self.api_key,
@@ -53,6 +79,28 @@ class LiteLlm(Llm):
             max_retries=self.max_retries,
         )
 
+    def _response_format(self, prompt: Prompt) -> Optional[dict]:
+        """The `response_format` of the prompt, if the model supports it"""
+        if not prompt.response_format:
+            return None
+        if not self.supports_response_schema:
+            # the agent language falls back to parsing the response text
+            logger.debug(
+                f"Model '{self.model}' doesn't support response schemas, dropping the response_format"
+            )
+            return None
+        return prompt.response_format
+
+    def _cost(self, response: ModelResponse) -> float:
+        """The estimated cost of a completion in USD, 0 if litellm doesn't know the price of the model"""
+        try:
+            return litellm.completion_cost(completion_response=response) or 0.0
+        except Exception as e:
+            logger.debug(
+                f"Failed to estimate the cost of a '{self.model}' completion: {e}"
+            )
+            return 0.0
+
     def __call__(self, prompt: Prompt) -> str:
 
         # if tools are provided check if the llm supports tool calling
@@ -61,15 +109,41 @@ class LiteLlm(Llm):
                 f"Model: '{self.name}' doesn't support tool calling and tool calling was requested!"
             )
 
-        response = self._run_completion(messages=prompt.messages, tools=prompt.tools)
+        with metrics.timed(
+            metrics.LLM_REQUEST_DURATION, metrics.LLM_REQUESTS, model=self.model
+        ):
+            response = self._run_completion(
+                messages=prompt.messages,
+                tools=prompt.tools,
+                response_format=self._response_format(prompt),
+            )
         logger.debug(response)
+        if usage := getattr(response, "usage", None):
+            tracing.get_current_span().set_attributes(
+                {
+                    "gen_ai.usage.input_tokens": usage.prompt_tokens,
+                    "gen_ai.usage.output_tokens": usage.completion_tokens,
+                }
+            )
+            metrics.LLM_TOKENS.inc(
+                usage.prompt_tokens or 0, model=self.model, type="input"
+            )
+            metrics.LLM_TOKENS.inc(
+                usage.completion_tokens or 0, model=self.model, type="output"
+            )
+            budget.charge(
+                tokens=(usage.prompt_tokens or 0) + (usage.completion_tokens or 0),
+                cost=self._cost(response),
+            )
         if response.choices[0].message.tool_calls:
             tool = response.choices[0].message.tool_calls[0]
-            result = {
-                "tool": tool.function.name,
-                "args": json.loads(tool.function.arguments),
-            }
-            result = json.dumps(result)
+            try:
+                args = codec.loads(tool.function.arguments)
+            except JSONDecodeError:
+                # malformed arguments are repaired (or reported) by the agent language
+                args = tool.function.arguments
+            result = {"tool": tool.function.name, "args": args}
+            result = codec.dumps(result)
         else:
             result = response.choices[0].message.content
 
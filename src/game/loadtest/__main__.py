@@ -0,0 +1,123 @@
+"""Load tests agents against the bundled mock completion server
+
+Every session runs an agent using `LiteLlm` pointed at a local `MockCompletionServer`, which calls the `lookup` tool
+`--steps - 1` times and then `terminate`.
+
+Usage:
+    python -m game.loadtest --sessions 200 --concurrency 20 --latency lognormal --latency-median 0.3 \
+        --tokens-per-sec 80 --rate-limit-rate 0.02
+"""
+
+import argparse
+import json
+import logging
+import os
+from contextlib import redirect_stdout
+
+import structlog
+
+from game.action import tool
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.llm.litellm_completion import LiteLlm
+from game.loadtest.harness import run_load
+from game.loadtest.mock_server import LatencyModel, MockCompletionServer, tool_call
+from game.template import AgentTemplate
+
+
+@tool()
+def lookup(query: str) -> str:
+    """Looks up the query in the knowledge base"""
+    return f"Answer to '{query}'"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=3, help="LLM calls per session")
+    parser.add_argument(
+        "--language", choices=("function_calling", "json"), default="function_calling"
+    )
+    parser.add_argument(
+        "--model",
+        default="openai/gpt-4o-mini",
+        help="The litellm model name, its provider must be OpenAI-compatible",
+    )
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument(
+        "--latency", choices=("constant", "uniform", "lognormal"), default="constant"
+    )
+    parser.add_argument("--latency-median", type=float, default=0.1)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--latency-low", type=float, default=0.05)
+    parser.add_argument("--latency-high", type=float, default=0.2)
+    parser.add_argument("--tokens-per-sec", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--log", action="store_true", help="Keeps the agent logging")
+    args = parser.parse_args()
+
+    if not args.log:
+        structlog.configure(
+            wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL)
+        )
+
+    script = [
+        tool_call("lookup", query=f"question {i}") for i in range(args.steps - 1)
+    ] + [tool_call("terminate", message="done")]
+    server = MockCompletionServer(
+        script=script,
+        latency=LatencyModel(
+            distribution=args.latency,
+            median=args.latency_median,
+            sigma=args.latency_sigma,
+            low=args.latency_low,
+            high=args.latency_high,
+            tokens_per_sec=args.tokens_per_sec,
+        ),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    server.start()
+
+    language_class = (
+        AgentFunctionCallingActionLanguage
+        if args.language == "function_calling"
+        else AgentJsonActionLanguage
+    )
+    template = AgentTemplate(
+        name="load_test_agent",
+        goals=[Goal(priority=1, name="Answer", description="Answer the user")],
+        agent_language=language_class(),
+        llm=LiteLlm(
+            model=args.model,
+            base_url=server.base_url,
+            api_key="mock",
+            max_reties=args.max_retries,
+        ),
+        tools=[lookup],
+        max_iterations=args.steps + 2,
+        debug_log_memory=False,
+    )
+    # the `terminate` tool prints the final message of every session
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            report = run_load(
+                template.spawn,
+                sessions=args.sessions,
+                concurrency=args.concurrency,
+                user_input=lambda i: f"Question {i}",
+                server_stats=server.stats.to_dict,
+            )
+    finally:
+        server.stop()
+
+    print(json.dumps(report.to_dict(), indent=4) if args.json else report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Load generator running concurrent agent sessions
+
+Runs `sessions` agent runs with at most `concurrency` of them in flight, each one on its own thread with a new agent
+from `agent_factory` (eg `AgentTemplate.spawn`), and reports the throughput, the session latency percentiles, the
+errors and the resource usage of the process.
+"""
+
+import resource
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional, Union
+
+from game.agent import Agent
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """The nearest-rank percentile `q` (0-100) of already sorted values"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+@dataclass
+class LoadTestReport:
+    sessions: int
+    concurrency: int
+    succeeded: int
+    failed: int
+    duration_secs: float
+    throughput_per_sec: float
+    latency_secs: dict[str, float]
+    errors: dict[str, int]
+    cpu_secs: float
+    cpu_utilisation: float
+    max_rss_mb: float
+    peak_threads: int
+    server: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def summary(self) -> str:
+        latency = "  ".join(
+            f"{name}={value * 1e3:.1f}ms" for name, value in self.latency_secs.items()
+        )
+        lines = [
+            f"sessions:    {self.sessions} ({self.failed} failed), concurrency {self.concurrency}",
+            f"throughput:  {self.throughput_per_sec:.2f} sessions/s over {self.duration_secs:.2f}s",
+            f"latency:     {latency}",
+            f"cpu:         {self.cpu_secs:.2f}s ({self.cpu_utilisation:.0%} of one core)",
+            f"memory:      max RSS {self.max_rss_mb:.1f} MB, peak threads {self.peak_threads}",
+        ]
+        if self.errors:
+            lines.append(f"errors:      {self.errors}")
+        if self.server:
+            lines.append(f"server:      {self.server}")
+        return "\n".join(lines)
+
+
+def run_load(
+    agent_factory: Callable[[], Agent],
+    sessions: int,
+    concurrency: int,
+    user_input: Union[str, Callable[[int], str]] = "Hello",
+    server_stats: Optional[Callable[[], dict]] = None,
+) -> LoadTestReport:
+    """
+    Runs `sessions` agent sessions with at most `concurrency` in flight
+
+    Args:
+        agent_factory: Returns the agent of a session, eg `AgentTemplate.spawn`
+        sessions: The total number of sessions
+        concurrency: The number of sessions running concurrently
+        user_input: The user input of the sessions, or a function of the session index returning it
+        server_stats: An optional function returning the stats of the mocked server, added to the report
+
+    Returns:
+        The `LoadTestReport`
+    """
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+    peak_threads = threading.active_count()
+
+    def _session(index: int) -> None:
+        nonlocal peak_threads
+        task = user_input(index) if callable(user_input) else user_input
+        tic = time.perf_counter()
+        try:
+            agent_factory().run(user_input=task)
+        except Exception as e:
+            with lock:
+                errors[e.__class__.__name__] += 1
+            return
+        finally:
+            with lock:
+                peak_threads = max(peak_threads, threading.active_count())
+        with lock:
+            latencies.append(time.perf_counter() - tic)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    tic = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="load-session"
+    ) as executor:
+        for future in [executor.submit(_session, i) for i in range(sessions)]:
+            future.result()
+    duration = time.perf_counter() - tic
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu_secs = (usage_after.ru_utime - usage_before.ru_utime) + (
+        usage_after.ru_stime - usage_before.ru_stime
+    )
+    latencies.sort()
+    latency_secs = {f"p{q}": percentile(latencies, q) for q in PERCENTILES}
+    latency_secs["max"] = latencies[-1] if latencies else float("nan")
+    latency_secs["mean"] = (
+        sum(latencies) / len(latencies) if latencies else float("nan")
+    )
+    return LoadTestReport(
+        sessions=sessions,
+        concurrency=concurrency,
+        succeeded=len(latencies),
+        failed=sum(errors.values()),
+        duration_secs=duration,
+        throughput_per_sec=len(latencies) / duration if duration else 0.0,
+        latency_secs=latency_secs,
+        errors=dict(errors),
+        cpu_secs=cpu_secs,
+        cpu_utilisation=cpu_secs / duration if duration else 0.0,
+        # kilobytes on Linux
+        max_rss_mb=usage_after.ru_maxrss / 1024,
+        peak_threads=peak_threads,
+        server=server_stats() if server_stats else {},
+    )
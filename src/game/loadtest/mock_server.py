@@ -0,0 +1,291 @@
+"""A local mock of an OpenAI-compatible chat completions server
+
+Serves `POST /v1/chat/completions` (and `/chat/completions`) with scripted responses, simulated latency and injected
+errors, so agents using `LiteLlm` can be load tested without a provider:
+
+    server = MockCompletionServer(script=[tool_call("lookup", query="weather"), tool_call("terminate", message="done")])
+    server.start()
+    llm = LiteLlm(model="openai/gpt-4o-mini", base_url=server.base_url, api_key="mock")
+
+The server is stateless: the n-th scripted response is returned to a request whose messages contain n-1 assistant
+messages, so every session walks through the script independently. The last response is repeated afterwards.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+
+from game.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def tool_call(name: str, **arguments) -> dict:
+    """A scripted response calling the tool `name` with `arguments`"""
+    return {"tool_call": {"name": name, "arguments": arguments}}
+
+
+def text(content: str) -> dict:
+    """A scripted plain text response"""
+    return {"content": content}
+
+
+DEFAULT_SCRIPT = [tool_call("terminate", message="done")]
+
+
+@dataclass
+class LatencyModel:
+    """
+    The simulated latency of a completion: a time to first token drawn from a distribution, plus the generation
+    time of the output tokens at `tokens_per_sec`
+
+    Args:
+        distribution: `"constant"`, `"uniform"` (between `low` and `high`) or `"lognormal"` (with `median` and
+            `sigma`)
+        median: The median (or constant) time to first token in seconds
+        sigma: The shape of the lognormal distribution, larger values have longer tails
+        low: The lower bound of the uniform distribution in seconds
+        high: The upper bound of the uniform distribution in seconds
+        tokens_per_sec: The generation speed, `None` adds no generation time
+    """
+
+    distribution: str = "constant"
+    median: float = 0.0
+    sigma: float = 0.5
+    low: float = 0.0
+    high: float = 0.0
+    tokens_per_sec: Optional[float] = None
+
+    def sample(self, output_tokens: int, rng: random.Random) -> float:
+        if self.distribution == "constant":
+            latency = self.median
+        elif self.distribution == "uniform":
+            latency = rng.uniform(self.low, self.high)
+        elif self.distribution == "lognormal":
+            latency = (
+                rng.lognormvariate(math.log(self.median), self.sigma)
+                if self.median > 0
+                else 0.0
+            )
+        else:
+            raise ValueError(f"Unknown latency distribution '{self.distribution}'")
+        if self.tokens_per_sec:
+            latency += output_tokens / self.tokens_per_sec
+        return latency
+
+
+@dataclass
+class MockServerStats:
+    requests: int = 0
+    completions: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+
+
+def _count_tokens(text: str) -> int:
+    # ~4 characters per token, good enough for simulated usage
+    return max(1, len(text) // 4)
+
+
+class MockCompletionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 refuses connections under load
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        script: Optional[list[dict]] = None,
+        latency: Optional[LatencyModel] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_secs: float = 1.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            script: The scripted responses, see `tool_call` and `text`. Defaults to calling `terminate`.
+            latency: The simulated latency of the completions. Defaults to no latency.
+            error_rate: The fraction of requests answered with a `500` error
+            rate_limit_rate: The fraction of requests answered with a `429` error
+            retry_after_secs: The `Retry-After` header of the `429` responses
+            host: The interface to listen on
+            port: The port to listen on, `0` picks a free port
+            seed: The seed of the random latencies and errors
+        """
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_secs = retry_after_secs
+        self.stats = MockServerStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        super().__init__((host, port), _CompletionHandler)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(base_url='{self.base_url}')"
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> threading.Thread:
+        """Serves requests on a daemon thread"""
+        thread = threading.Thread(
+            target=self.serve_forever, name="mock-completion-server", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _sample_latency(self, output_tokens: int) -> float:
+        with self._rng_lock:
+            return self.latency.sample(output_tokens, self._rng)
+
+    def complete(self, request: dict) -> tuple[int, dict, dict]:
+        """
+        Answers a chat completion request
+
+        Returns:
+            A tuple of the HTTP status, the headers and the body
+        """
+        self.stats.add(requests=1)
+        draw = self._random()
+        if draw < self.rate_limit_rate:
+            self.stats.add(rate_limited=1)
+            return (
+                429,
+                {"Retry-After": str(self.retry_after_secs)},
+                {
+                    "error": {
+                        "message": "Rate limit exceeded",
+                        "type": "rate_limit_error",
+                    }
+                },
+            )
+        if draw < self.rate_limit_rate + self.error_rate:
+            self.stats.add(errors=1)
+            return (
+                500,
+                {},
+                {"error": {"message": "Injected error", "type": "server_error"}},
+            )
+
+        messages = request.get("messages", [])
+        step = sum(1 for m in messages if m.get("role") == "assistant")
+        scripted = self.script[min(step, len(self.script) - 1)]
+        message: dict[str, Union[str, list, None]] = {"role": "assistant"}
+        if "tool_call" in scripted and request.get("tools"):
+            arguments = json.dumps(scripted["tool_call"]["arguments"])
+            message["content"] = None
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {
+                        "name": scripted["tool_call"]["name"],
+                        "arguments": arguments,
+                    },
+                }
+            ]
+            output = arguments
+        elif "tool_call" in scripted:
+            # without tools the agent uses the JSON action language
+            call = {
+                "tool": scripted["tool_call"]["name"],
+                "args": scripted["tool_call"]["arguments"],
+            }
+            output = message["content"] = f"```action\n{json.dumps(call)}\n```"
+        else:
+            output = message["content"] = scripted["content"]
+
+        prompt_tokens = _count_tokens(
+            "".join(str(m.get("content") or "") for m in messages)
+        )
+        completion_tokens = _count_tokens(output)
+        time.sleep(self._sample_latency(completion_tokens))
+        self.stats.add(
+            completions=1,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        return (
+            200,
+            {},
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": (
+                            "tool_calls" if "tool_calls" in message else "stop"
+                        ),
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, headers: dict, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {}, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError as e:
+            self._send(400, {}, {"error": {"message": f"Invalid JSON: {e}"}})
+            return
+        self._send(*self.server.complete(request))
+
+    def log_message(self, format, *args):
+        pass
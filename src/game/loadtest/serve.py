@@ -0,0 +1,230 @@
+"""Load tests the ASGI serving layer against the bundled mock completion server
+
+Every simulated chat session sends `--turns` requests to `POST /agents/load_test_agent/runs` of an in-process
+`AgentApp`, reusing its session id. The agent uses `LiteLlm` pointed at a local `MockCompletionServer`, the first
+turn of a session calls the `lookup` tool before `terminate`. Requests rejected with `503` are retried after their
+`Retry-After` delay, and the app is shut down (draining the runs) at the end.
+
+Usage:
+    python -m game.loadtest.serve --sessions 100 --turns 3 --clients 50 --max-concurrency 8 --max-queue 16 \
+        --latency-median 0.2 --stream
+
+With `--session-dir` the sessions are kept in a `LruSessionStore` bounded by `--max-resident-mb`, spilling the
+cold ones to the directory.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+
+import httpx
+import structlog
+
+from game.action import tool
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.litellm_completion import LiteLlm
+from game.loadtest.harness import PERCENTILES, percentile
+from game.loadtest.mock_server import LatencyModel, MockCompletionServer, tool_call
+from game.serve import AgentApp
+from game.session import LruSessionStore
+from game.template import AgentTemplate
+
+AGENT_NAME = "load_test_agent"
+
+
+@tool()
+def lookup(query: str) -> str:
+    """Looks up the query in the knowledge base"""
+    return f"Answer to '{query}'"
+
+
+async def run_sessions(
+    app: AgentApp,
+    sessions: int,
+    turns: int,
+    clients: int,
+    stream: bool = False,
+    max_retries: int = 100,
+) -> dict:
+    """
+    Runs `sessions` chat sessions of `turns` requests with at most `clients` sessions in flight
+
+    Returns:
+        The request counts by status code, the latencies of the successful requests and the duration
+    """
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(clients)
+    transport = httpx.ASGITransport(app=app)
+
+    async def session(client: httpx.AsyncClient, index: int) -> None:
+        session_id = None
+        async with semaphore:
+            for turn in range(turns):
+                body = {"input": f"Question {index}.{turn}", "stream": stream}
+                if session_id:
+                    body["session_id"] = session_id
+                tic = time.perf_counter()
+                for _ in range(max_retries):
+                    response = await client.post(
+                        f"/agents/{AGENT_NAME}/runs", json=body
+                    )
+                    statuses[response.status_code] += 1
+                    if response.status_code != 503:
+                        break
+                    await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+                if response.status_code != 200:
+                    return
+                latencies.append(time.perf_counter() - tic)
+                if stream:
+                    # the data of the last event
+                    outcome = json.loads(response.text.strip().rsplit("data: ", 1)[1])
+                else:
+                    outcome = response.json()
+                session_id = outcome["session_id"]
+
+    tic = time.perf_counter()
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://load-test", timeout=None
+    ) as client:
+        await asyncio.gather(*(session(client, i) for i in range(sessions)))
+    return {
+        "duration_secs": time.perf_counter() - tic,
+        "statuses": dict(statuses),
+        "latencies": sorted(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument(
+        "--clients", type=int, default=20, help="Concurrent client sessions"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="Streams the runs (SSE)")
+    parser.add_argument(
+        "--session-dir",
+        help="Keeps the sessions in a `LruSessionStore` spilling to this directory",
+    )
+    parser.add_argument(
+        "--max-resident-mb",
+        type=float,
+        default=64,
+        help="The resident memory of the `LruSessionStore` sessions",
+    )
+    parser.add_argument("--model", default="openai/gpt-4o-mini")
+    parser.add_argument("--latency-median", type=float, default=0.1)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--log", action="store_true", help="Keeps the agent logging")
+    args = parser.parse_args()
+
+    if not args.log:
+        structlog.configure(
+            wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL)
+        )
+
+    server = MockCompletionServer(
+        script=[
+            tool_call("lookup", query="question"),
+            tool_call("terminate", message="done"),
+        ],
+        latency=LatencyModel(
+            distribution="lognormal",
+            median=args.latency_median,
+            sigma=args.latency_sigma,
+        ),
+        seed=args.seed,
+    )
+    server.start()
+    template = AgentTemplate(
+        name=AGENT_NAME,
+        goals=[Goal(priority=1, name="Answer", description="Answer the user")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=LiteLlm(model=args.model, base_url=server.base_url, api_key="mock"),
+        tools=[lookup],
+        max_iterations=5,
+        debug_log_memory=False,
+    )
+    session_store = (
+        LruSessionStore(
+            args.session_dir,
+            max_resident_bytes=int(args.max_resident_mb * 1024 * 1024),
+        )
+        if args.session_dir
+        else None
+    )
+    app = AgentApp(
+        [template],
+        session_store=session_store,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+    )
+
+    async def load() -> tuple[dict, bool]:
+        result = await run_sessions(
+            app, args.sessions, args.turns, args.clients, stream=args.stream
+        )
+        return result, await app.shutdown()
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    # the `terminate` tool prints the final message of every run
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            result, drained = asyncio.run(load())
+    finally:
+        server.stop()
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    latencies, duration = result["latencies"], result["duration_secs"]
+    report = {
+        "sessions": args.sessions,
+        "requests": len(latencies),
+        "duration_secs": duration,
+        "throughput_per_sec": len(latencies) / duration if duration else 0.0,
+        "latency_secs": {f"p{q}": percentile(latencies, q) for q in PERCENTILES},
+        "statuses": result["statuses"],
+        "agents": app.stats(),
+        "sessions": app.session_store.stats(),
+        "drained": drained,
+        "cpu_secs": (usage_after.ru_utime - usage_before.ru_utime)
+        + (usage_after.ru_stime - usage_before.ru_stime),
+        # kilobytes on Linux
+        "max_rss_mb": usage_after.ru_maxrss / 1024,
+        "server": server.stats.to_dict(),
+    }
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+    latency = "  ".join(
+        f"{name}={value * 1e3:.1f}ms" for name, value in report["latency_secs"].items()
+    )
+    print(
+        "\n".join(
+            [
+                f"requests:    {report['requests']} of {args.sessions} sessions x {args.turns} turns, "
+                f"statuses {report['statuses']}",
+                f"throughput:  {report['throughput_per_sec']:.2f} requests/s over {duration:.2f}s",
+                f"latency:     {latency}",
+                f"cpu:         {report['cpu_secs']:.2f}s, max RSS {report['max_rss_mb']:.1f} MB",
+                f"agents:      {report['agents']}",
+                f"sessions:    {report['sessions']}",
+                f"drained:     {drained}",
+            ]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,43 @@ https://www.coursera.org/learn/ai-agents-python/ungradedWidget/3d8su/modular-ai-
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from typing import Iterable, Optional, Union
+
+from game.memory.item import MemoryItem
 
 
 class Memory(ABC):
     @abstractmethod
-    def add_memory(self, memory: dict):
-        """Add memory to working memory"""
+    def add_memory(self, memory: Union[dict, MemoryItem]):
+        """Add memory (a dictionary or a `MemoryItem`) to working memory"""
 
     @abstractmethod
-    def get_memories(self, limit: int = None) -> list[dict]:
+    def get_memories(self, limit: int = None) -> list[Union[dict, MemoryItem]]:
         """Get formatted conversation history for prompt"""
+
+    def get_shared_memories(self) -> Sequence[Union[dict, MemoryItem]]:
+        """
+        Returns the memories without copying them when possible, eg to share them with the views forked from this
+        memory. The returned sequence must not be modified.
+        """
+        return self.get_memories()
+
+    def fork(
+        self,
+        types: Optional[Iterable[str]] = None,
+        exclude_types: Optional[Iterable[str]] = None,
+        agents: Optional[Iterable[str]] = None,
+    ) -> "Memory":
+        """
+        Returns a copy-on-write `MemoryView` that shares the current memories without copying them. Memories added
+        to the view are not visible in this memory until they are merged back with `MemoryView.merge`.
+
+        Args:
+            types: If set, only the memories of these types are visible in the view
+            exclude_types: The types of the memories to hide from the view
+            agents: If set, only the memories added by these agents are visible in the view
+        """
+        from game.memory.view import MemoryView
+
+        return MemoryView(self, types=types, exclude_types=exclude_types, agents=agents)
@@ -1,18 +1,24 @@
+from typing import Union
+
 from game.memory.base import Memory
+from game.memory.item import MemoryItem
 
 
 class DictMemory(Memory):
     def __init__(self):
         self.items = []  # Basic conversation history
 
-    def add_memory(self, memory: dict):
+    def add_memory(self, memory: Union[dict, MemoryItem]):
         """Add memory to working memory"""
         self.items.append(memory)
 
-    def get_memories(self, limit: int = None) -> list[dict]:
+    def get_memories(self, limit: int = None) -> list[Union[dict, MemoryItem]]:
         """Get formatted conversation history for prompt"""
         return self.items[:limit]
 
+    def get_shared_memories(self) -> list[Union[dict, MemoryItem]]:
+        return self.items
+
     def copy_without_system_memories(self):
         """Return a copy of the memory without system memories"""
         filtered_items = [m for m in self.items if m["type"] != "system"]
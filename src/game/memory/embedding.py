@@ -0,0 +1,86 @@
+"""Text embedders used by the long-term `VectorMemory`
+
+An `Embedder` turns a batch of texts into a `(n, dim)` float32 matrix of L2-normalised vectors, so the cosine
+similarity between two texts is a plain dot product. The default `HashingEmbedder` needs no model download or
+network access which makes it a sensible offline default, any other embedding model can be plugged in by
+implementing the `Embedder` interface.
+"""
+
+import re
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class Embedder(ABC):
+    """Abstracts the conversion of texts to vectors"""
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """The dimension of the returned vectors"""
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds a batch of texts
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            A `(len(texts), dim)` float32 matrix of L2-normalised vectors
+        """
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local embedder based on the hashing trick: every token (and optionally every token bigram) is hashed into one of
+    `dim` buckets with a random sign, weighted by its sub-linear term frequency `1 + log(tf)`.
+
+    The inverse document frequency part of TF-IDF depends on the stored corpus, so it is applied at query time by
+    the `VectorIndex` that keeps the per-bucket document frequencies.
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: tuple[int, int] = (1, 2)):
+        """
+        Args:
+            dim: The number of hash buckets, ie the dimension of the vectors
+            ngram_range: The min and max size of the token n-grams to hash
+        """
+        self._dim = dim
+        self.ngram_range = ngram_range
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(dim={self.dim}, ngram_range={self.ngram_range})"
+        )
+
+    def _tokenize(self, text: str) -> list[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        min_n, max_n = self.ngram_range
+        ngrams = []
+        for n in range(min_n, max_n + 1):
+            ngrams.extend(
+                " ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1)
+            )
+        return ngrams
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, count in Counter(self._tokenize(text)).items():
+                # crc32 is stable across processes, unlike the builtin `hash` of a string
+                h = zlib.crc32(token.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * (1.0 + np.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
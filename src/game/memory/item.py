@@ -0,0 +1,144 @@
+"""Compact memory items
+
+Every memory used to be a plain `dict` with repeated `"type"`/`"content"` keys. A `MemoryItem` stores the same
+information in `__slots__`, interns the (few distinct) type and agent strings and can hold a structured `payload`
+(eg the result dictionary of a tool) that is only serialised to JSON the first time its `content` is read.
+
+`MemoryItem` implements the read-only mapping methods used throughout the framework (`item["type"]`,
+`item.get("content")`, `{**item}`), so `Memory` implementations and languages can consume both plain dictionaries
+and `MemoryItem`s.
+"""
+
+import sys
+from typing import Any, Iterator, Optional, Union
+
+from game import codec
+
+MEMORY_ITEM_KEYS = ("type", "content", "agent")
+
+
+class MemoryItem:
+    __slots__ = ("type", "agent", "_content", "_payload", "extra")
+
+    def __init__(
+        self,
+        type: str,
+        content: Optional[str] = None,
+        agent: Optional[str] = None,
+        payload: Any = None,
+        extra: Optional[dict] = None,
+    ):
+        """
+        Args:
+            type: The type of the memory, eg `"user"`, `"assistant"` or `"environment"`
+            content: The content of the memory as a string
+            agent: The name of the agent that added the memory
+            payload: A JSON serialisable object, or UTF-8 encoded `bytes`/`memoryview`, that is lazily serialised
+                (or decoded) to the `content` when it is first read. Ignored if `content` is provided.
+            extra: Any additional keys of the memory
+        """
+        self.type = sys.intern(type)
+        self.agent = sys.intern(agent) if agent else None
+        self._content = content
+        self._payload = payload if content is None else None
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, memory: dict) -> "MemoryItem":
+        extra = {k: v for k, v in memory.items() if k not in MEMORY_ITEM_KEYS}
+        return cls(
+            type=memory["type"],
+            content=memory.get("content"),
+            agent=memory.get("agent"),
+            extra=extra,
+        )
+
+    @property
+    def content(self) -> Optional[str]:
+        if self._content is None and self._payload is not None:
+            if isinstance(self._payload, (bytes, memoryview)):
+                self._content = str(self._payload, "utf-8")
+            else:
+                self._content = codec.dumps(self._payload)
+            self._payload = None
+        return self._content
+
+    @property
+    def content_size(self) -> int:
+        """The approximate size of the content in bytes, without decoding pending `bytes`/`memoryview` payloads"""
+        if self._content is None and isinstance(self._payload, (bytes, memoryview)):
+            return (
+                self._payload.nbytes
+                if isinstance(self._payload, memoryview)
+                else len(self._payload)
+            )
+        return len(self.content or "")
+
+    @property
+    def is_serialised(self) -> bool:
+        """`False` if the `payload` hasn't been serialised to the `content` yet"""
+        return self._payload is None
+
+    def copy(self, **changes) -> "MemoryItem":
+        """Returns a copy of the item with the `changes` applied, without serialising a pending `payload`"""
+        return MemoryItem(
+            type=changes.get("type", self.type),
+            content=changes.get("content", self._content),
+            agent=changes.get("agent", self.agent),
+            payload=self._payload,
+            extra=self.extra,
+        )
+
+    def to_dict(self) -> dict:
+        memory = {"type": self.type, "content": self.content}
+        if self.agent is not None:
+            memory["agent"] = self.agent
+        if self.extra:
+            memory.update(self.extra)
+        return memory
+
+    def keys(self) -> list[str]:
+        keys = ["type", "content"]
+        if self.agent is not None:
+            keys.append("agent")
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "type":
+            return self.type
+        if key == "content":
+            return self.content
+        if key == "agent" and self.agent is not None:
+            return self.agent
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (MemoryItem, dict)):
+            return self.to_dict() == as_dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+
+def as_dict(memory: Union[dict, MemoryItem]) -> dict:
+    """Returns the `memory` as a plain dictionary"""
+    return memory.to_dict() if isinstance(memory, MemoryItem) else memory
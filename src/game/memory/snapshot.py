@@ -0,0 +1,221 @@
+"""Compact binary snapshots of agent sessions
+
+Parks a `Memory` together with its run metadata (agent name, iteration count and the serialisable `ActionContext`
+properties) in a single file and restores it later, eg when an idle chat session is resumed.
+
+File layout (little endian):
+
+    magic (8 bytes) | version (u16) | flags (u16) | header length (u32) | header (JSON) | body
+
+The JSON header holds the metadata and the tables of the distinct memory types and agent names. The body, optionally
+zlib compressed, holds a fixed-size record per memory (`type index`, `agent index`, `content offset`,
+`content length`) followed by the UTF-8 contents of all memories back to back.
+
+Uncompressed snapshots are memory-mapped when loaded: the contents are not read or decoded until a restored
+`MemoryItem`'s content is accessed, so restoring a large session is close to instant.
+"""
+
+import json
+import mmap
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Union
+
+from game.memory.base import Memory
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MEMORY_ITEM_KEYS, MemoryItem
+
+MAGIC = b"GAMESNAP"
+VERSION = 1
+FLAG_ZLIB = 0x1
+
+PREAMBLE = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<HHQI")
+NO_AGENT = 0xFFFF
+NO_CONTENT = 0xFFFFFFFF
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is malformed or has an unsupported version"""
+
+
+@dataclass
+class SessionSnapshot:
+    memory: Memory
+    agent_name: Optional[str] = None
+    iterations: int = 0
+    properties: dict = field(default_factory=dict)
+
+
+def serialisable_properties(properties: Optional[dict]) -> dict:
+    """Returns the `ActionContext` properties that can be serialised to JSON, eg skipping the memory or the LLM"""
+    serialisable = {}
+    for key, value in (properties or {}).items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        serialisable[key] = value
+    return serialisable
+
+
+def dumps_snapshot(
+    memory: Memory,
+    agent_name: Optional[str] = None,
+    iterations: int = 0,
+    properties: Optional[dict] = None,
+    compression_level: Optional[int] = None,
+) -> bytes:
+    """
+    Serialises a session to the binary snapshot format
+
+    Args:
+        memory: The memory of the session
+        agent_name: The name of the agent running the session
+        iterations: The number of agent loop iterations already run
+        properties: The `ActionContext` properties of the run. Properties that cannot be serialised to JSON are
+            skipped.
+        compression_level: If set, the body is compressed with zlib using this level (0-9)
+
+    Returns:
+        The snapshot as bytes
+    """
+    types, agents = {}, {}
+    records, contents, extras = [], [], {}
+    offset = 0
+    for i, memory_item in enumerate(memory.get_memories()):
+        type_index = types.setdefault(memory_item["type"], len(types))
+        agent = memory_item.get("agent")
+        agent_index = (
+            NO_AGENT if agent is None else agents.setdefault(agent, len(agents))
+        )
+
+        content = memory_item.get("content")
+        if content is None:
+            length = NO_CONTENT
+        else:
+            encoded = content.encode("utf-8")
+            length = len(encoded)
+            contents.append(encoded)
+        records.append(RECORD.pack(type_index, agent_index, offset, length))
+        offset += 0 if content is None else length
+
+        if extra := {
+            k: memory_item[k] for k in memory_item.keys() if k not in MEMORY_ITEM_KEYS
+        }:
+            extras[i] = extra
+
+    header = json.dumps(
+        {
+            "agent_name": agent_name,
+            "iterations": iterations,
+            "properties": serialisable_properties(properties),
+            "types": list(types),
+            "agents": list(agents),
+            "count": len(records),
+            "extras": extras,
+        }
+    ).encode("utf-8")
+
+    body = b"".join(records) + b"".join(contents)
+    flags = 0
+    if compression_level is not None:
+        body = zlib.compress(body, compression_level)
+        flags |= FLAG_ZLIB
+    return PREAMBLE.pack(MAGIC, VERSION, flags, len(header)) + header + body
+
+
+def save_snapshot(
+    path: Union[str, Path],
+    memory: Memory,
+    agent_name: Optional[str] = None,
+    iterations: int = 0,
+    properties: Optional[dict] = None,
+    compression_level: Optional[int] = None,
+) -> int:
+    """
+    Saves a session snapshot to `path`, see `dumps_snapshot`
+
+    Returns:
+        The number of bytes written
+    """
+    data = dumps_snapshot(
+        memory,
+        agent_name=agent_name,
+        iterations=iterations,
+        properties=properties,
+        compression_level=compression_level,
+    )
+    Path(path).write_bytes(data)
+    return len(data)
+
+
+def loads_snapshot(data: Union[bytes, memoryview, mmap.mmap]) -> SessionSnapshot:
+    """
+    Restores a session from a binary snapshot. The contents of the memories are decoded lazily.
+
+    Args:
+        data: The snapshot bytes (or a memory-mapped snapshot file)
+
+    Returns:
+        A `SessionSnapshot` whose memory is a `DictMemory` of `MemoryItem`s
+
+    Raises:
+        SnapshotError: If `data` is not a valid snapshot
+    """
+    view = memoryview(data)
+    if len(view) < PREAMBLE.size:
+        raise SnapshotError("Snapshot is too short")
+    magic, version, flags, header_length = PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("Not a session snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    header_end = PREAMBLE.size + header_length
+    header = json.loads(bytes(view[PREAMBLE.size : header_end]))
+    body = view[header_end:]
+    if flags & FLAG_ZLIB:
+        body = memoryview(zlib.decompress(body))
+
+    count = header["count"]
+    types, agents = header["types"], header["agents"]
+    extras = header["extras"]
+    blob = body[count * RECORD.size :]
+
+    memory = DictMemory()
+    memory.items = [
+        MemoryItem(
+            types[type_index],
+            agent=None if agent_index == NO_AGENT else agents[agent_index],
+            payload=None if length == NO_CONTENT else blob[offset : offset + length],
+            extra=extras.get(str(i)) if extras else None,
+        )
+        for i, (type_index, agent_index, offset, length) in enumerate(
+            RECORD.iter_unpack(body[: count * RECORD.size])
+        )
+    ]
+
+    return SessionSnapshot(
+        memory=memory,
+        agent_name=header["agent_name"],
+        iterations=header["iterations"],
+        properties=header["properties"],
+    )
+
+
+def load_snapshot(path: Union[str, Path], use_mmap: bool = True) -> SessionSnapshot:
+    """
+    Restores a session snapshot from `path`, see `loads_snapshot`
+
+    Args:
+        path: The snapshot file
+        use_mmap: If `True` the file is memory-mapped instead of read, so the contents are only paged in when the
+            restored memories are accessed
+    """
+    with Path(path).open("rb") as f:
+        if not use_mmap:
+            return loads_snapshot(f.read())
+        return loads_snapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
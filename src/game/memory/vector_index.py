@@ -0,0 +1,141 @@
+"""A contiguous NumPy matrix of vectors with batched cosine top-k search"""
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from game.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class VectorIndex:
+    """
+    Stores L2-normalised vectors in a single contiguous float32 matrix that grows geometrically, so adding a vector
+    is amortised O(1) and a query is a single matrix-vector product followed by an `argpartition`.
+
+    When a `path` is given the matrix is a `numpy.memmap` backed by that file (raw float32, row major), so the
+    vectors survive restarts and the OS pages them in on demand.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: Optional[Union[str, Path]] = None,
+        size: int = 0,
+        initial_capacity: int = 1024,
+        use_idf: bool = True,
+    ):
+        """
+        Args:
+            dim: The dimension of the stored vectors
+            path: An optional file to memory-map the vectors to. If the file already exists, the first `size`
+                rows are loaded from it.
+            size: The number of valid rows already stored in the `path` file
+            initial_capacity: The initial number of rows allocated
+            use_idf: If `True` the query is weighted by the inverse document frequency of each dimension
+        """
+        self.dim = dim
+        self.path = Path(path) if path else None
+        self.use_idf = use_idf
+        self._size = 0
+        self._vectors = self._allocate(max(initial_capacity, size, 1))
+        self._doc_freq = np.zeros(dim, dtype=np.int64)
+        if size:
+            self._size = size
+            self._doc_freq += np.count_nonzero(self._vectors[:size], axis=0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(dim={self.dim}, size={self._size}, path={self.path})"
+
+    @property
+    def capacity(self) -> int:
+        return self._vectors.shape[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """A read-only view of the stored vectors"""
+        view = self._vectors[: self._size]
+        view.flags.writeable = False
+        return view
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if self.path is None:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as f:
+            if f.tell() < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+        return np.memmap(
+            self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(min_capacity, 2 * self.capacity)
+        logger.debug(f"Growing {self} to capacity={capacity}")
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[: self._size] = self._vectors[: self._size]
+            self._vectors = vectors
+        else:
+            self._vectors.flush()
+            del self._vectors
+            self._vectors = self._allocate(capacity)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Appends a `(n, dim)` batch of L2-normalised vectors to the index"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}"
+            )
+        new_size = self._size + vectors.shape[0]
+        if new_size > self.capacity:
+            self._grow(new_size)
+        self._vectors[self._size : new_size] = vectors
+        self._doc_freq += np.count_nonzero(vectors, axis=0)
+        self._size = new_size
+
+    def search(
+        self, query: np.ndarray, top_k: int = 5, limit: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the `top_k` stored vectors with the highest cosine similarity to the `query`
+
+        Args:
+            query: A `(dim,)` query vector
+            top_k: The number of results to return
+            limit: Only search the first `limit` rows of the index
+
+        Returns:
+            A tuple of the row indices and the similarity scores, sorted by descending score
+        """
+        size = self._size if limit is None else min(limit, self._size)
+        if size == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if self.use_idf:
+            idf = np.log((1.0 + self._size) / (1.0 + self._doc_freq)) + 1.0
+            query = query * idf.astype(np.float32)
+        if norm := np.linalg.norm(query):
+            query = query / norm
+
+        scores = self._vectors[:size] @ query
+        if top_k < size:
+            candidates = np.argpartition(scores, -top_k)[-top_k:]
+        else:
+            candidates = np.arange(size)
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+    def flush(self) -> None:
+        """Flushes the memory-mapped vectors to disk"""
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
@@ -0,0 +1,136 @@
+"""Long-term memory with similarity search over past interactions
+
+Instead of sending the whole conversation history to the LLM on every iteration, a `VectorMemory` can be asked for
+the items most relevant to the current context (retrieval augmented prompts), see `AgentLanguage(memory_top_k=...)`.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+from game.memory.base import Memory
+from game.memory.embedding import Embedder, HashingEmbedder
+from game.memory.item import MemoryItem, as_dict
+from game.memory.vector_index import VectorIndex
+
+VECTORS_FILE_NAME = "vectors.f32"
+ITEMS_FILE_NAME = "items.jsonl"
+
+
+class VectorMemory(Memory):
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        path: Optional[Union[str, Path]] = None,
+        recent_window: int = 4,
+    ):
+        """
+        Args:
+            embedder: The `Embedder` used to vectorise the memory contents. Defaults to a local `HashingEmbedder`.
+            path: An optional directory to persist the memory to. The vectors are memory-mapped from
+                `<path>/vectors.f32` and the items are appended to `<path>/items.jsonl`. An existing memory in that
+                directory is loaded.
+            recent_window: The number of most recent items that are always part of the relevant memories, so the
+                agent keeps seeing the outcome of its latest actions
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.path = Path(path) if path else None
+        self.recent_window = recent_window
+        self.items = []
+
+        if self.path and (self.path / ITEMS_FILE_NAME).exists():
+            with (self.path / ITEMS_FILE_NAME).open("rt", encoding="utf-8") as f:
+                self.items = [json.loads(line) for line in f if line.strip()]
+
+        self.index = VectorIndex(
+            dim=self.embedder.dim,
+            path=self.path / VECTORS_FILE_NAME if self.path else None,
+            size=len(self.items),
+        )
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(items={len(self.items)}, embedder={self.embedder}, path={self.path})"
+
+    def add_memory(self, memory: dict):
+        """Add memory to working memory"""
+        self.add_memories([memory])
+
+    def add_memories(self, memories: list[dict]) -> None:
+        """Adds a batch of memories, embedding all of them with a single call to the embedder"""
+        if not memories:
+            return
+        self.index.add(self.embedder.embed([_get_text(m) for m in memories]))
+        self.items.extend(memories)
+        if self.path:
+            with (self.path / ITEMS_FILE_NAME).open("at", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps(as_dict(m), default=str) + "\n" for m in memories
+                )
+            self.index.flush()
+
+    def get_memories(self, limit: int = None) -> list[dict]:
+        """Get formatted conversation history for prompt"""
+        return self.items[:limit]
+
+    def get_shared_memories(self) -> list[dict]:
+        return self.items
+
+    def search(
+        self, query: str, top_k: int = 5, limit: Optional[int] = None
+    ) -> list[tuple[float, dict]]:
+        """
+        Finds the stored memories most similar to the `query`
+
+        Args:
+            query: The text to search for
+            top_k: The maximum number of memories to return
+            limit: Only search the first `limit` memories
+
+        Returns:
+            A list of `(score, memory)` tuples sorted by descending cosine similarity
+        """
+        indices, scores = self.index.search(
+            self.embedder.embed([query])[0], top_k=top_k, limit=limit
+        )
+        return [(float(s), self.items[i]) for i, s in zip(indices, scores)]
+
+    def get_relevant_memories(
+        self, top_k: int = 5, query: Optional[str] = None
+    ) -> list[dict]:
+        """
+        Returns the memories to render in a prompt instead of the full history: the first memory (the initial task),
+        the `top_k` older memories most relevant to the `query` and the `recent_window` most recent memories,
+        in chronological order.
+
+        Args:
+            top_k: The number of older memories to retrieve
+            query: The text to search for. Defaults to the contents of the recent memories.
+
+        Returns:
+            A list of memories in the order they were added
+        """
+        older = max(len(self.items) - self.recent_window, 0)
+        recent = list(range(older, len(self.items)))
+        if query is None:
+            query = "\n".join(_get_text(self.items[i]) for i in recent)
+
+        selected = set(recent)
+        if older:
+            selected.add(0)
+            indices, _ = self.index.search(
+                self.embedder.embed([query])[0], top_k=top_k, limit=older
+            )
+            selected.update(int(i) for i in indices)
+        return [self.items[i] for i in sorted(selected)]
+
+
+def _get_text(memory: Union[dict, MemoryItem]) -> str:
+    content = memory.get("content")
+    return (
+        content
+        if isinstance(content, str)
+        else json.dumps(as_dict(memory), default=str)
+    )
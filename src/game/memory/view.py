@@ -0,0 +1,196 @@
+"""Copy-on-write memory views
+
+A `MemoryView` shares the items of its parent `Memory` (the immutable prefix) without copying them and keeps the
+memories added through the view in its own suffix. Forking a memory doesn't copy its items and `get_memories` returns
+a lazy `MemorySequence` chaining the prefix and the suffix, so nested forks in deep agent hierarchies share the same
+underlying items. A filtered view copies the visible items of its prefix once.
+
+The languages render the prompt messages of a view with `MemoryView.render_memories`, which renders the shared prefix
+once per view, so a sub-agent only renders the memories it added at each iteration.
+"""
+
+import itertools
+from collections.abc import Sequence
+from typing import Callable, Iterable, Iterator, Optional, TypeVar, Union
+
+from game.memory.base import Memory
+from game.memory.item import MemoryItem
+
+T = TypeVar("T")
+
+
+class MemorySequence(Sequence):
+    """
+    A read-only sequence of the first `prefix_length` items of `prefix` followed by the first `suffix_length` items
+    of `suffix`, without copying them. The sequences must only be appended to.
+    """
+
+    __slots__ = ("prefix", "prefix_length", "suffix", "suffix_length")
+
+    def __init__(
+        self, prefix: Sequence, prefix_length: int, suffix: list, suffix_length: int
+    ):
+        self.prefix = prefix
+        self.prefix_length = prefix_length
+        self.suffix = suffix
+        self.suffix_length = suffix_length
+
+    def __len__(self) -> int:
+        return self.prefix_length + self.suffix_length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("memory index out of range")
+        if index < self.prefix_length:
+            return self.prefix[index]
+        return self.suffix[index - self.prefix_length]
+
+    def __iter__(self) -> Iterator:
+        yield from itertools.islice(self.prefix, self.prefix_length)
+        yield from itertools.islice(self.suffix, self.suffix_length)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)})"
+
+
+class MemoryView(Memory):
+    def __init__(
+        self,
+        parent: Memory,
+        types: Optional[Iterable[str]] = None,
+        exclude_types: Optional[Iterable[str]] = None,
+        agents: Optional[Iterable[str]] = None,
+    ):
+        """
+        Args:
+            parent: The memory to share the items of. Only the items present at the time of the fork are visible.
+            types: If set, only the parent's memories of these types are visible
+            exclude_types: The types of the parent's memories to hide
+            agents: If set, only the parent's memories added by these agents (`"agent"` key) are visible
+        """
+        self.parent = parent
+        self.prefix_length = len(parent.get_shared_memories())
+        self.types = frozenset(types) if types is not None else None
+        self.exclude_types = frozenset(exclude_types or ())
+        self.agents = frozenset(agents) if agents is not None else None
+        self.suffix = []
+        self._merged = 0
+        self._filtered_prefix = None
+        # the rendered prefix per render function, see `render_memories`
+        self._rendered_prefixes: dict[Callable, list] = {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(prefix_length={self.prefix_length}, suffix={self.suffix})"
+
+    @property
+    def is_filtered(self) -> bool:
+        return (
+            self.types is not None
+            or bool(self.exclude_types)
+            or self.agents is not None
+        )
+
+    @property
+    def items(self) -> Sequence:
+        return self.get_memories()
+
+    def _is_visible(self, memory: dict) -> bool:
+        memory_type = memory.get("type")
+        if self.types is not None and memory_type not in self.types:
+            return False
+        if memory_type in self.exclude_types:
+            return False
+        return self.agents is None or memory.get("agent") in self.agents
+
+    def _get_prefix(self) -> Sequence:
+        if not self.is_filtered:
+            return MemorySequence(
+                self.parent.get_shared_memories(), self.prefix_length, [], 0
+            )
+        # The prefix never changes, so it is only filtered once
+        if self._filtered_prefix is None:
+            self._filtered_prefix = [
+                m
+                for m in itertools.islice(
+                    self.parent.get_shared_memories(), self.prefix_length
+                )
+                if self._is_visible(m)
+            ]
+        return self._filtered_prefix
+
+    def add_memory(self, memory: dict):
+        """Add memory to the view without modifying the parent memory"""
+        self.suffix.append(memory)
+
+    def get_memories(self, limit: int = None) -> MemorySequence:
+        """
+        Get the visible memories of the parent followed by the memories added to the view, as a lazy sequence that
+        doesn't see the memories added afterwards
+        """
+        prefix = self._get_prefix()
+        length = len(range(len(prefix) + len(self.suffix))[:limit])
+        prefix_length = min(len(prefix), length)
+        return MemorySequence(
+            prefix, prefix_length, self.suffix, length - prefix_length
+        )
+
+    def render_memories(
+        self, render: Callable[[Union[dict, MemoryItem]], T]
+    ) -> list[T]:
+        """
+        Renders the visible memories, eg into the messages of a prompt. The prefix is rendered once per `render`
+        function and reused at every call, only the memories added to the view are rendered again.
+
+        Args:
+            render: A function of the memory only, eg the bound method of a language
+
+        Returns:
+            The rendered memories, a new list at each call
+        """
+        prefix = self._rendered_prefixes.get(render)
+        if prefix is None:
+            if isinstance(self.parent, MemoryView) and not self.is_filtered:
+                prefix = self.parent.render_memories(render)[: self.prefix_length]
+            else:
+                prefix = [render(m) for m in self._get_prefix()]
+            self._rendered_prefixes[render] = prefix
+        return prefix + [render(m) for m in self.suffix]
+
+    def get_new_memories(self) -> list[dict]:
+        """Returns the memories added through this view"""
+        return list(self.suffix)
+
+    def merge(
+        self, target: Optional[Memory] = None, memory_type: Optional[str] = None
+    ) -> int:
+        """
+        Adds the memories that were added through this view and haven't been merged yet to the `target` memory.
+
+        Args:
+            target: The memory to merge into. Defaults to the parent memory.
+            memory_type: If set, the merged memories are relabelled with this type
+
+        Returns:
+            The number of memories merged
+        """
+        target = self.parent if target is None else target
+        new_memories = self.suffix[self._merged :]
+        for memory in new_memories:
+            if memory_type is not None:
+                memory = (
+                    memory.copy(type=memory_type)
+                    if isinstance(memory, MemoryItem)
+                    else {**memory, "type": memory_type}
+                )
+            target.add_memory(memory)
+        self._merged = len(self.suffix)
+        return len(new_memories)
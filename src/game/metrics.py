@@ -0,0 +1,400 @@
+"""Prometheus-style metrics of agents, LLMs and tools
+
+A small thread-safe metrics registry (counters, gauges and histograms with fixed buckets) exposed in the Prometheus
+text format, without depending on `prometheus_client`:
+
+    from game.metrics import exposition, start_http_server
+
+    start_http_server(9464)  # serves http://127.0.0.1:9464/metrics
+    print(exposition())
+
+The agent loop, `LiteLlm`, `Environment.execute_action` and the multi-agent tools record the metrics defined at the
+bottom of this module, labelled by agent name, tool and model. Agents without a name share the `anonymous` label and
+the agents spawned by an `AgentTemplate` the label of the template, so their generated names don't grow the registry.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional, Sequence
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ITERATION_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ANONYMOUS_AGENT = "anonymous"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name: The name of the metric, eg `game_agent_runs_total`
+            documentation: The help text of the metric
+            labelnames: The names of the labels, passed as keyword arguments when recording values
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name='{self.name}', labelnames={self.labelnames})"
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames) or not all(
+            n in labels for n in self.labelnames
+        ):
+            raise ValueError(
+                f"Metric '{self.name}' expects the labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        """Returns the `(name, labels, value)` samples of the metric"""
+        with self._lock:
+            return [
+                (self.name, _format_labels(self.labelnames, k), v)
+                for k, v in self._values.items()
+            ]
+
+    def exposition(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """
+        Args:
+            name: The name of the metric, eg `game_llm_request_duration_seconds`
+            documentation: The help text of the metric
+            labelnames: The names of the labels, passed as keyword arguments when recording values
+            buckets: The sorted upper bounds of the buckets, `+Inf` is added
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.buckets or not math.isinf(self.buckets[-1]):
+            self.buckets += (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if (histogram := self._values.get(key)) is None:
+                histogram = self._values[key] = _HistogramValue(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def get(self, **labels) -> Optional[_HistogramValue]:
+        return self._values.get(self._key(labels))
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        samples = []
+        with self._lock:
+            for key, histogram in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    labels = _format_labels(
+                        self.labelnames + ("le",), key + (_format_value(bound),)
+                    )
+                    samples.append((f"{self.name}_bucket", labels, cumulative))
+                labels = _format_labels(self.labelnames, key)
+                samples.append((f"{self.name}_sum", labels, histogram.sum))
+                samples.append((f"{self.name}_count", labels, histogram.count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self) -> None:
+        """Resets the values of all metrics"""
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def exposition(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        return "\n".join(m.exposition() for m in self.metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def exposition(registry: MetricsRegistry = REGISTRY) -> str:
+    """Returns the metrics of `registry` in the Prometheus text exposition format"""
+    return registry.exposition()
+
+
+class Timing:
+    """Yielded by `timed`, set `status` to record another status than `"ok"`"""
+
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = "ok"
+
+
+@contextmanager
+def timed(
+    histogram: Histogram,
+    counter: Counter,
+    in_flight: Optional[Gauge] = None,
+    **labels,
+) -> Iterator[Timing]:
+    """
+    Observes the duration of the block in `histogram` and counts it in `counter` with an additional `status` label,
+    `"error"` if the block raised
+
+    Args:
+        histogram: The histogram of the durations in seconds
+        counter: The counter of the calls, it must have the `status` label
+        in_flight: An optional gauge of the blocks in progress
+        labels: The labels of the metrics
+
+    Returns:
+        A context manager yielding a `Timing`
+    """
+    timing = Timing()
+    if in_flight is not None:
+        in_flight.inc(**labels)
+    tic = time.perf_counter()
+    try:
+        yield timing
+    except BaseException:
+        # keeps a status set by the block, eg `"suspended"`
+        if timing.status == "ok":
+            timing.status = "error"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - tic, **labels)
+        counter.inc(status=timing.status, **labels)
+        if in_flight is not None:
+            in_flight.dec(**labels)
+
+
+def start_http_server(
+    port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY
+) -> ThreadingHTTPServer:
+    """
+    Serves the metrics of `registry` at `http://<host>:<port>/metrics` on a daemon thread
+
+    Returns:
+        The server, call `shutdown()` to stop it
+    """
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
+
+
+AGENT_RUNS = REGISTRY.counter(
+    "game_agent_runs_total", "Finished agent runs", ("agent", "status")
+)
+AGENT_RUNS_IN_FLIGHT = REGISTRY.gauge(
+    "game_agent_runs_in_flight", "Agent runs in progress", ("agent",)
+)
+AGENT_RUN_DURATION = REGISTRY.histogram(
+    "game_agent_run_duration_seconds", "Duration of the agent runs", ("agent",)
+)
+AGENT_ITERATIONS = REGISTRY.histogram(
+    "game_agent_iterations",
+    "Iterations per agent run",
+    ("agent",),
+    buckets=ITERATION_BUCKETS,
+)
+PARSE_FAILURES = REGISTRY.counter(
+    "game_parse_failures_total",
+    "LLM responses that couldn't be parsed into an action",
+    ("agent", "error"),
+)
+PARSE_REPAIRS = REGISTRY.counter(
+    "game_parse_repairs_total",
+    "Repairs of malformed LLM responses applied locally instead of failing",
+    ("agent", "repair"),
+)
+PARSE_REPAIR_SAVED_ITERATIONS = REGISTRY.counter(
+    "game_parse_repair_saved_iterations_total",
+    "LLM iterations saved by repairing malformed responses locally",
+    ("agent",),
+)
+STRUCTURED_OUTPUT_RESPONSES = REGISTRY.counter(
+    "game_structured_output_responses_total",
+    "Responses of the structured output mode, parsed as JSON (structured) or from markdown blocks (fallback)",
+    ("agent", "mode"),
+)
+STRUCTURED_OUTPUT_RETRIES_AVOIDED = REGISTRY.counter(
+    "game_structured_output_retries_avoided_total",
+    "Structured output responses that would have failed to parse as text, without a markdown block nor the repairs",
+    ("agent",),
+)
+TOOL_OUTPUT_COMPRESSED_CHARS = REGISTRY.counter(
+    "game_tool_output_compressed_chars_total",
+    "Characters of the tool results removed by the extractive compression",
+    ("agent", "tool"),
+)
+PROMPT_DEDUP_SAVED_CHARS = REGISTRY.counter(
+    "game_prompt_dedup_saved_chars_total",
+    "Prompt characters saved by replacing repeated blocks with back-references",
+    ("agent",),
+)
+BUDGET_EXCEEDED = REGISTRY.counter(
+    "game_budget_exceeded_total",
+    "Agent runs stopped because their budget (or the budget of a caller) ran out or was cancelled",
+    ("agent", "limit"),
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "game_llm_requests_total", "LLM completion requests", ("model", "status")
+)
+LLM_REQUEST_DURATION = REGISTRY.histogram(
+    "game_llm_request_duration_seconds", "Latency of the LLM completions", ("model",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "game_llm_tokens_total", "Tokens used by the LLM completions", ("model", "type")
+)
+TOOL_CALLS = REGISTRY.counter(
+    "game_tool_calls_total", "Tool executions", ("tool", "status")
+)
+TOOL_DURATION = REGISTRY.histogram(
+    "game_tool_duration_seconds", "Latency of the tool executions", ("tool",)
+)
+AGENT_CALLS = REGISTRY.counter(
+    "game_agent_calls_total",
+    "Sub-agent invocations of the multi-agent tools",
+    ("agent", "pattern", "status"),
+)
+AGENT_CALL_DURATION = REGISTRY.histogram(
+    "game_agent_call_duration_seconds",
+    "Duration of the sub-agent invocations of the multi-agent tools",
+    ("agent", "pattern"),
+)
@@ -0,0 +1,386 @@
+"""Plans: DAGs of tool calls emitted by a single LLM response
+
+In plan-and-execute mode (`AgentPlanLanguage`) the LLM answers with a plan instead of a single tool call:
+
+    {
+        "steps": [
+            {"id": "paris", "tool": "get_weather", "args": {"city": "Paris"}},
+            {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+            {"id": "answer", "tool": "terminate", "args": {"message": "Paris: ${paris}, Rome: ${rome.temperature}"}}
+        ]
+    }
+
+The args of a step reference the results of earlier steps with `${step_id}` or `${step_id.key.0}`. A string that
+is a single reference is replaced by the referenced value itself, otherwise the references are interpolated as text.
+A step runs when all the steps it references (and those in its optional `depends_on`) succeeded, so independent
+steps run in parallel. A terminal step (eg `terminate`) runs last, once all the other steps succeeded, and ends the
+run without another LLM call. When a step fails its dependents are skipped and the LLM gets the results to replan.
+"""
+
+import contextvars
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from game import codec, tracing
+from game.action import Action
+from game.action.context import ActionContext
+from game.action.registry import ActionRegistry
+from game.environment import Environment
+from game.logger import get_logger
+from game.suspension import SuspendRun
+
+logger = get_logger(__name__)
+
+STEP_ID_PATTERN = re.compile(r"^[A-Za-z_][\w-]*$")
+REFERENCE_PATTERN = re.compile(r"\$\{([A-Za-z_][\w-]*)((?:\.[\w-]+)*)\}")
+
+
+class PlanValidationError(ValueError):
+    """Raised when a plan is malformed or doesn't match the available tools"""
+
+
+class StepStatus:
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
+@dataclass
+class PlanStep:
+    id: str
+    tool: str
+    args: dict = field(default_factory=dict)
+    depends_on: list[str] = field(default_factory=list)
+
+    @property
+    def dependencies(self) -> set[str]:
+        """The explicit dependencies and the steps referenced by the args"""
+        return set(self.depends_on) | {
+            match.group(1)
+            for match in REFERENCE_PATTERN.finditer(codec.dumps(self.args))
+        }
+
+
+@dataclass
+class Plan:
+    steps: list[PlanStep]
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Plan":
+        """
+        Builds a plan from `{"steps": [...]}` or a list of steps
+
+        Raises:
+            PlanValidationError: If the steps are malformed
+        """
+        steps = data.get("steps") if isinstance(data, dict) else data
+        if not isinstance(steps, list) or not steps:
+            raise PlanValidationError("A plan must have a non-empty list of 'steps'")
+        plan_steps = []
+        for i, step in enumerate(steps):
+            if not isinstance(step, dict):
+                raise PlanValidationError(f"Step {i} must be an object")
+            step_id, tool_name = step.get("id", f"step_{i}"), step.get("tool")
+            args, depends_on = step.get("args") or {}, step.get("depends_on") or []
+            if not isinstance(step_id, str) or not STEP_ID_PATTERN.match(step_id):
+                raise PlanValidationError(
+                    f"Step {i} has an invalid id {step_id!r}, use letters, digits, '_' and '-'"
+                )
+            if not isinstance(tool_name, str):
+                raise PlanValidationError(f"Step '{step_id}' must have a 'tool'")
+            if not isinstance(args, dict):
+                raise PlanValidationError(
+                    f"The 'args' of step '{step_id}' must be an object"
+                )
+            if not isinstance(depends_on, list):
+                raise PlanValidationError(
+                    f"The 'depends_on' of step '{step_id}' must be a list"
+                )
+            plan_steps.append(PlanStep(step_id, tool_name, args, depends_on))
+        return cls(plan_steps)
+
+    def validate(self, actions: ActionRegistry) -> list[PlanStep]:
+        """
+        Checks the plan against the tools of `actions`
+
+        Returns:
+            The steps in a topological order
+
+        Raises:
+            PlanValidationError: If a step id is repeated, a tool is unknown, a required argument is missing, a
+                step depends on an unknown or terminal step, there is more than one terminal step or the steps have
+                a cycle
+        """
+        steps = {}
+        for step in self.steps:
+            if step.id in steps:
+                raise PlanValidationError(f"Duplicate step id '{step.id}'")
+            steps[step.id] = step
+
+        terminal_steps = []
+        for step in self.steps:
+            action = actions.get_action(step.tool)
+            if action is None:
+                raise PlanValidationError(
+                    f"Step '{step.id}' uses the unknown tool '{step.tool}', use one of "
+                    f"{[a.name for a in actions.get_actions()]}"
+                )
+            if action.terminal:
+                terminal_steps.append(step.id)
+            missing = [
+                arg
+                for arg in action.parameters.get("required", [])
+                if arg not in step.args
+            ]
+            if missing:
+                raise PlanValidationError(
+                    f"Step '{step.id}' misses the required args {missing} of '{step.tool}'"
+                )
+            for dependency in step.dependencies:
+                if dependency not in steps:
+                    raise PlanValidationError(
+                        f"Step '{step.id}' depends on the unknown step '{dependency}'"
+                    )
+        if len(terminal_steps) > 1:
+            raise PlanValidationError(
+                f"A plan can have one terminal step, got {terminal_steps}"
+            )
+        for step in self.steps:
+            if terminal_steps and terminal_steps[0] in step.dependencies:
+                raise PlanValidationError(
+                    f"Step '{step.id}' depends on the terminal step '{terminal_steps[0]}'"
+                )
+
+        # Kahn's algorithm
+        dependencies = {step.id: step.dependencies for step in self.steps}
+        order = []
+        ready = [step.id for step in self.steps if not dependencies[step.id]]
+        while ready:
+            step_id = ready.pop(0)
+            order.append(steps[step_id])
+            for other, other_dependencies in dependencies.items():
+                if step_id in other_dependencies:
+                    other_dependencies.discard(step_id)
+                    if not other_dependencies:
+                        ready.append(other)
+        if len(order) != len(self.steps):
+            cycle = [step.id for step in self.steps if step not in order]
+            raise PlanValidationError(f"The steps {cycle} have a cyclic dependency")
+        return order
+
+
+def _lookup(value: Any, path: str, reference: str) -> Any:
+    for key in filter(None, path.split(".")):
+        try:
+            value = value[int(key)] if isinstance(value, list) else value[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise KeyError(f"Cannot resolve '{reference}': no '{key}' in {value!r}")
+    return value
+
+
+def resolve_references(value: Any, results: dict[str, Any]) -> Any:
+    """
+    Replaces the `${step_id.path}` references in `value` (recursively in lists and dictionaries) by the results
+
+    Raises:
+        KeyError: If a path doesn't exist in the referenced result
+    """
+    if isinstance(value, dict):
+        return {k: resolve_references(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(v, results) for v in value]
+    if not isinstance(value, str) or "${" not in value:
+        return value
+    if match := REFERENCE_PATTERN.fullmatch(value):
+        return _lookup(results[match.group(1)], match.group(2), value)
+
+    def interpolate(match: re.Match) -> str:
+        resolved = _lookup(results[match.group(1)], match.group(2), match.group(0))
+        return resolved if isinstance(resolved, str) else codec.dumps(resolved)
+
+    return REFERENCE_PATTERN.sub(interpolate, value)
+
+
+@dataclass
+class PlanResult:
+    steps: dict[str, dict] = field(default_factory=dict)
+    terminated: bool = False
+    final: Any = None
+
+    @property
+    def failed(self) -> list[str]:
+        return [k for k, s in self.steps.items() if s["status"] == StepStatus.FAILED]
+
+    @property
+    def skipped(self) -> list[str]:
+        return [k for k, s in self.steps.items() if s["status"] == StepStatus.SKIPPED]
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.failed and not self.skipped
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
+
+
+class PlanExecutor:
+    def __init__(self, environment: Environment, max_parallel_steps: int = 8):
+        """
+        Args:
+            environment: Executes the tools of the steps
+            max_parallel_steps: The maximum number of steps running concurrently
+        """
+        self.environment = environment
+        self.max_parallel_steps = max_parallel_steps
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_parallel_steps={self.max_parallel_steps})"
+        )
+
+    def _run_step(
+        self,
+        action_context: ActionContext,
+        action: Action,
+        step: PlanStep,
+        results: dict[str, Any],
+    ) -> dict:
+        try:
+            args = resolve_references(step.args, results)
+        except KeyError as e:
+            return {"tool_executed": False, "action": None, "error": str(e)}
+        # like the agent, don't dispatch more tools once the budget of the run ran out (see `game.budget`)
+        budget = action_context.get("budget")
+        if budget is not None and not action.terminal:
+            if (exceeded := budget.exceeded()) is not None:
+                return {
+                    "tool_executed": False,
+                    "action": None,
+                    "error": f"{exceeded.__class__.__name__}('{exceeded}')",
+                }
+        try:
+            return self.environment.execute_action(action_context, action, args)
+        except SuspendRun as e:
+            # resuming would replace the result of the whole plan with the reply, losing the other steps
+            return {
+                "tool_executed": False,
+                "action": None,
+                "error": f"'{action.name}' suspends the run to ask '{e.message}', call it outside of a plan",
+            }
+
+    def execute(
+        self, plan: Plan, actions: ActionRegistry, action_context: ActionContext
+    ) -> PlanResult:
+        """
+        Validates and runs a plan, the ready steps in parallel. A step whose tool suspends the run (see
+        `game.suspension`), eg `user_input`, fails instead, so the other steps keep their results.
+
+        Returns:
+            The `PlanResult` with the status and the result (or error) of every step
+
+        Raises:
+            PlanValidationError: If the plan is invalid, see `Plan.validate`
+        """
+        order = plan.validate(actions)
+        with tracing.start_span("plan.execute", {"plan.steps": len(order)}) as span:
+            plan_result = self._execute(order, actions, action_context)
+            span.set_attributes(
+                {
+                    "plan.failed": len(plan_result.failed),
+                    "plan.terminated": plan_result.terminated,
+                }
+            )
+        return plan_result
+
+    def _execute(
+        self,
+        order: list[PlanStep],
+        actions: ActionRegistry,
+        action_context: ActionContext,
+    ) -> PlanResult:
+        plan_result = PlanResult()
+        results: dict[str, Any] = {}
+        statuses: dict[str, str] = {}
+        terminal = [s for s in order if actions.get_action(s.tool).terminal]
+        pending = [s for s in order if s not in terminal]
+
+        def record(step: PlanStep, result: dict) -> None:
+            succeeded = result["tool_executed"]
+            statuses[step.id] = StepStatus.SUCCEEDED if succeeded else StepStatus.FAILED
+            plan_result.steps[step.id] = {
+                "tool": step.tool,
+                "status": statuses[step.id],
+                **(
+                    {"result": result["result"]}
+                    if succeeded
+                    else {"error": result["error"]}
+                ),
+            }
+            if succeeded:
+                results[step.id] = result["result"]
+            else:
+                logger.debug(f"Plan step '{step.id}' failed: {result['error']}")
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_parallel_steps, thread_name_prefix="plan_step"
+        )
+        try:
+            running = {}
+            while pending or running:
+                # the steps are in a topological order, so skipping propagates in one pass
+                for step in list(pending):
+                    dependencies = step.dependencies
+                    if any(
+                        statuses.get(d) in (StepStatus.FAILED, StepStatus.SKIPPED)
+                        for d in dependencies
+                    ):
+                        pending.remove(step)
+                        statuses[step.id] = StepStatus.SKIPPED
+                        plan_result.steps[step.id] = {
+                            "tool": step.tool,
+                            "status": StepStatus.SKIPPED,
+                        }
+                    elif all(
+                        statuses.get(d) == StepStatus.SUCCEEDED for d in dependencies
+                    ):
+                        pending.remove(step)
+                        # each step runs in a copy of the caller's context, so its spans nest under the plan span
+                        context = contextvars.copy_context()
+                        future = executor.submit(
+                            context.run,
+                            self._run_step,
+                            action_context,
+                            actions.get_action(step.tool),
+                            step,
+                            dict(results),
+                        )
+                        running[future] = step
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(running.pop(future), future.result())
+        finally:
+            executor.shutdown(wait=True)
+
+        if terminal and plan_result.succeeded:
+            step = terminal[0]
+            result = self._run_step(
+                action_context, actions.get_action(step.tool), step, results
+            )
+            record(step, result)
+            plan_result.terminated = result["tool_executed"]
+            plan_result.final = result.get("result")
+        elif terminal:
+            plan_result.steps[terminal[0].id] = {
+                "tool": terminal[0].tool,
+                "status": StepStatus.SKIPPED,
+            }
+        return plan_result
@@ -7,4 +7,6 @@ class Prompt:
     messages: list[dict] = field(default_factory=list)
     tools: Optional[list[dict]] = field(default=None)
     managed_agent_descriptions: Optional[list[str]] = field(default=None)
+    # a `response_format` for structured output, eg `{"type": "json_schema", "json_schema": {...}}`
+    response_format: Optional[dict] = field(default=None)
     metadata: dict = field(default_factory=dict)  # Fixing mutable default issue
@@ -0,0 +1,245 @@
+"""Large tool results: size caps, spilling to a blob store and paged reads
+
+Every tool result is kept in the memory and sent again to the LLM at each later iteration, so a single tool returning
+500KB of markdown makes every following prompt huge. With an `OutputPolicy`, the agent moves the results larger than
+`max_result_chars` to a `BlobStore` and only keeps a preview and a handle in the memory:
+
+    agent = Agent(..., output_policy=OutputPolicy(FileBlobStore("results", max_age_secs=3_600), max_result_chars=8_000))
+
+The agent then registers the `read_result(handle, offset, length)` tool (see `game.action.library.results`) so the
+LLM pages through the rest of the result when it needs it, and the prompts stay bounded whatever the tools return.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from game import codec
+from game.logger import get_logger
+
+logger = get_logger(__name__)
+
+HANDLE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BlobNotFoundError(KeyError):
+    """Raised when reading an unknown result handle"""
+
+
+def _handle(text: str) -> str:
+    # content addressed, so the same result spilled twice is stored once
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class BlobStore(ABC):
+    """Stores the large tool results as text, addressed by a handle"""
+
+    @abstractmethod
+    def put(self, text: str) -> str:
+        """Stores `text` and returns its handle"""
+
+    @abstractmethod
+    def get(self, handle: str) -> str:
+        """
+        Returns the text of `handle`
+
+        Raises:
+            BlobNotFoundError: If there isn't any text with `handle`
+        """
+
+    @abstractmethod
+    def delete(self, handle: str) -> bool:
+        """Deletes the text of `handle`, returns `False` if it didn't exist"""
+
+
+class InMemoryBlobStore(BlobStore):
+    def __init__(self):
+        self._blobs: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(<{len(self._blobs)} blobs>)"
+
+    def put(self, text: str) -> str:
+        handle = _handle(text)
+        with self._lock:
+            self._blobs[handle] = text
+        return handle
+
+    def get(self, handle: str) -> str:
+        try:
+            return self._blobs[handle]
+        except KeyError:
+            raise BlobNotFoundError(handle)
+
+    def delete(self, handle: str) -> bool:
+        with self._lock:
+            return self._blobs.pop(handle, None) is not None
+
+
+class FileBlobStore(BlobStore):
+    """Stores each text in a UTF-8 file of a local directory, shared by the processes using the same directory"""
+
+    def __init__(
+        self, directory: Union[str, Path], max_age_secs: Optional[float] = None
+    ):
+        """
+        Args:
+            directory: The directory of the files, created if it doesn't exist
+            max_age_secs: If set, the files older than this are deleted when results are stored, so the directory
+                doesn't grow without bound. The handles of the deleted results can't be read anymore.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_age_secs = max_age_secs
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(directory='{self.directory}', max_age_secs={self.max_age_secs})"
+
+    def cleanup(self, max_age_secs: float) -> int:
+        """Deletes the results stored more than `max_age_secs` ago, returns the number of deleted results"""
+        deadline = time.time() - max_age_secs
+        deleted = 0
+        for path in self.directory.glob("*.txt"):
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                # deleted by another process sharing the directory
+                continue
+        if deleted:
+            logger.debug(f"Deleted {deleted} results older than {max_age_secs}s")
+        return deleted
+
+    def _path(self, handle: str) -> Path:
+        # the handle is used as a file name
+        if not HANDLE_PATTERN.match(handle):
+            raise BlobNotFoundError(handle)
+        return self.directory / f"{handle}.txt"
+
+    def put(self, text: str) -> str:
+        if self.max_age_secs is not None:
+            self.cleanup(self.max_age_secs)
+        handle = _handle(text)
+        path = self._path(handle)
+        if path.exists():
+            # stored again, so it doesn't expire before the new copy would
+            path.touch()
+        else:
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            tmp_path.replace(path)
+        return handle
+
+    def get(self, handle: str) -> str:
+        try:
+            return self._path(handle).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            raise BlobNotFoundError(handle)
+
+    def delete(self, handle: str) -> bool:
+        try:
+            self._path(handle).unlink()
+            return True
+        except (FileNotFoundError, BlobNotFoundError):
+            return False
+
+
+class OutputPolicy:
+    def __init__(
+        self,
+        blob_store: BlobStore,
+        max_result_chars: int = 8_000,
+        preview_chars: Optional[int] = None,
+        max_page_chars: Optional[int] = None,
+    ):
+        """
+        Args:
+            blob_store: Where the large results are spilled, eg a `FileBlobStore` with a `max_age_secs`
+            max_result_chars: The results with more characters (once serialised to JSON if they aren't strings) are
+                spilled to the `blob_store`
+            preview_chars: The number of characters of a spilled result kept in the memory. Defaults to an eighth of
+                `max_result_chars`.
+            max_page_chars: The maximum number of characters returned by a `read_result` call. Defaults to half of
+                `max_result_chars`.
+        """
+        preview_chars = (
+            max_result_chars // 8 if preview_chars is None else preview_chars
+        )
+        max_page_chars = (
+            max_result_chars // 2 if max_page_chars is None else max_page_chars
+        )
+        if preview_chars > max_result_chars or max_page_chars > max_result_chars:
+            raise ValueError(
+                "The preview and the pages must be smaller than max_result_chars"
+            )
+        self.blob_store = blob_store
+        self.max_result_chars = max_result_chars
+        self.preview_chars = preview_chars
+        self.max_page_chars = max_page_chars
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(blob_store={self.blob_store}, max_result_chars={self.max_result_chars}, "
+            f"preview_chars={self.preview_chars})"
+        )
+
+    @staticmethod
+    def _as_text(result: Any) -> str:
+        # the pages of indented JSON are easier to read than a single line
+        return result if isinstance(result, str) else codec.dumps(result, indent=True)
+
+    def apply(self, result: dict) -> dict:
+        """
+        Spills the result of a tool execution (see `Environment.format_result`) to the blob store if it is too large
+
+        Returns:
+            `result`, or a copy whose `result` is replaced by its handle, size and preview
+        """
+        if not result.get("tool_executed") or result.get("result") is None:
+            return result
+        value = result["result"]
+        text = self._as_text(value)
+        if len(text) <= self.max_result_chars:
+            return result
+        handle = self.blob_store.put(text)
+        logger.debug(
+            f"Spilled the {len(text)} characters result of '{result.get('action')}' to {handle}"
+        )
+        return {
+            **result,
+            "result": {
+                "handle": handle,
+                "size": len(text),
+                "preview": text[: self.preview_chars],
+                "note": (
+                    f"The result has {len(text)} characters, only the first {self.preview_chars} are shown. "
+                    f"Read the rest with the `read_result` tool, eg handle='{handle}' offset={self.preview_chars}."
+                ),
+            },
+        }
+
+    def read(self, handle: str, offset: int = 0, length: Optional[int] = None) -> dict:
+        """
+        Reads a page of a spilled result, at most `max_page_chars` characters
+
+        Raises:
+            BlobNotFoundError: If there isn't any result with `handle`
+        """
+        length = min(length or self.max_page_chars, self.max_page_chars)
+        text = self.blob_store.get(handle)
+        offset = max(0, offset)
+        content = text[offset : offset + length]
+        end = offset + len(content)
+        return {
+            "handle": handle,
+            "offset": offset,
+            "size": len(text),
+            "content": content,
+            "next_offset": end if end < len(text) else None,
+        }
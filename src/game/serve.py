@@ -0,0 +1,600 @@
+"""ASGI serving of agents
+
+`AgentApp` is an ASGI application exposing agents as HTTP endpoints, served by any ASGI server (eg `uvicorn`)
+without a web framework:
+
+    app = AgentApp([AgentTemplate(name="assistant", goals=goals, agent_language=language, tools=tools)])
+
+    # uvicorn my_module:app --port 8000
+
+Endpoints:
+    - `POST /agents/{name}/runs` with `{"input": "...", "session_id": "...", "stream": false}` runs the agent. Without
+      a `session_id` a new session is created, otherwise the run continues the memory of the session. With
+      `"stream": true` (or an `Accept: text/event-stream` header) the run is streamed as server-sent events:
+      `started`, a `tool` event per executed tool, an `iteration` event per loop iteration with the durations of
+      its stages, then `completed`, `suspended` or `error`.
+    - `POST /agents/{name}/resume` with `{"session_id": "...", "token": "...", "reply": "..."}` resumes a run
+      suspended by `user_input` (see `game.suspension`), streamed like `runs`
+    - `GET /agents`, `GET /sessions/{id}`, `DELETE /sessions/{id}`, `GET /health` and `GET /metrics`
+
+`Agent.run` blocks, so the runs execute on a thread pool with at most `max_concurrency` runs per agent. Up to
+`max_queue` more requests of an agent wait for a slot, further requests are rejected with `503` and a `Retry-After`
+header. A session runs one request at a time, a request for a busy session gets `409`. On shutdown (the ASGI
+lifespan protocol, or `AgentApp.shutdown`) new runs get `503` while the accepted ones are drained.
+"""
+
+import asyncio
+import copy
+import json
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from game import metrics
+from game.action import Action
+from game.action.context import ActionContext
+from game.agent import Agent
+from game.environment import UNKNOWN_TOOL, Environment
+from game.hooks import Hook, Stage
+from game.logger import get_logger
+from game.memory.base import Memory
+from game.memory.dict_memory import DictMemory
+from game.memory.item import as_dict
+from game.session import InMemorySessionStore, SessionStore
+from game.suspension import RunSuspended, SuspendedRunNotFoundError, SuspendedRunStore
+from game.template import AgentTemplate
+
+logger = get_logger(__name__)
+
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+Emit = Callable[[Optional[str], Optional[dict]], None]
+
+RETRY_AFTER_SECS = 1
+
+
+class HttpError(Exception):
+    """Answered with `status` and `{"error": message}`"""
+
+    def __init__(self, status: int, message: str, headers: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+@dataclass
+class AgentStats:
+    max_concurrency: int
+    running: int = 0
+    queued: int = 0
+    completed: int = 0
+    suspended: int = 0
+    failed: int = 0
+    rejected: int = 0
+
+
+class _AgentSlots:
+    """Bounds the concurrent runs of an agent and the requests waiting for a run slot"""
+
+    def __init__(
+        self, agent: Union[Agent, AgentTemplate], max_concurrency: int, max_queue: int
+    ):
+        self.agent = agent
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = AgentStats(max_concurrency=max_concurrency)
+
+    async def acquire(self, timeout: Optional[float]) -> None:
+        """
+        Raises:
+            HttpError: `503` if the queue is full or the request waited longer than `timeout` seconds
+        """
+        if self.semaphore.locked() and self.stats.queued >= self.max_queue:
+            self.stats.rejected += 1
+            raise HttpError(
+                503,
+                f"Agent '{self.agent.name}' is at capacity",
+                {"Retry-After": str(RETRY_AFTER_SECS)},
+            )
+        self.stats.queued += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.stats.rejected += 1
+            raise HttpError(
+                503,
+                f"Timed out waiting for agent '{self.agent.name}'",
+                {"Retry-After": str(RETRY_AFTER_SECS)},
+            )
+        finally:
+            self.stats.queued -= 1
+        self.stats.running += 1
+
+    def release(self) -> None:
+        self.stats.running -= 1
+        self.semaphore.release()
+
+
+class _IterationEventHook(Hook):
+    """Emits an `iteration` event with the durations of the stages at the end of each loop iteration"""
+
+    def __init__(self, emit: Emit):
+        self.emit = emit
+        self.iteration = 0
+        self.durations_ns = defaultdict(int)
+
+    def after(self, stage: str, agent: Agent, duration_ns: int) -> None:
+        if stage == Stage.RUN:
+            return
+        self.durations_ns[stage] += duration_ns
+        if stage == Stage.TERMINATION:
+            self.emit(
+                "iteration",
+                {
+                    "iteration": self.iteration,
+                    "durations_ms": {
+                        name: duration / 1e6
+                        for name, duration in self.durations_ns.items()
+                    },
+                },
+            )
+            self.iteration += 1
+            self.durations_ns.clear()
+
+
+class _EventEnvironment(Environment):
+    """Emits a `tool` event with the result of each tool executed by the wrapped environment"""
+
+    def __init__(self, environment: Environment, emit: Emit):
+        self.environment = environment
+        self.emit = emit
+
+    def execute_action(
+        self, action_context: ActionContext, action: Action, args: dict
+    ) -> dict:
+        result = self.environment.execute_action(action_context, action, args)
+        tool_name = action.name if action is not None else UNKNOWN_TOOL
+        self.emit("tool", {"tool": tool_name, "args": args, **result})
+        return result
+
+
+def _final_result(memory: Memory) -> Any:
+    """The result of the last tool, eg the final message of `terminate`"""
+    memories = memory.get_memories()
+    if not memories or memories[-1]["type"] != "environment":
+        return None
+    return json.loads(memories[-1]["content"]).get("result")
+
+
+def _field(body: dict, name: str, type_: type, required: bool = True) -> Any:
+    value = body.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, type_):
+        raise HttpError(
+            400, f"The field '{name}' must be a {type_.__name__}, got {value!r}"
+        )
+    return value
+
+
+async def _send_response(
+    send: Send,
+    status: int,
+    body: bytes,
+    content_type: str,
+    headers: Optional[dict] = None,
+) -> None:
+    raw_headers = [
+        (b"content-type", content_type.encode("latin-1")),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    ]
+    raw_headers += [
+        (k.lower().encode("latin-1"), v.encode("latin-1"))
+        for k, v in (headers or {}).items()
+    ]
+    await send(
+        {"type": "http.response.start", "status": status, "headers": raw_headers}
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(
+    send: Send, status: int, data: Any, headers: Optional[dict] = None
+) -> None:
+    body = json.dumps(data, default=str).encode("utf-8")
+    await _send_response(send, status, body, "application/json", headers)
+
+
+def _sse(event: str, data: dict) -> bytes:
+    # `json.dumps` escapes the newlines, so the data fits on one line
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+class AgentApp:
+    def __init__(
+        self,
+        agents: list[Union[Agent, AgentTemplate]],
+        session_store: Optional[SessionStore] = None,
+        suspended_run_store: Optional[SuspendedRunStore] = None,
+        max_concurrency: int = 4,
+        max_queue: int = 64,
+        queue_timeout_secs: Optional[float] = None,
+        shutdown_timeout_secs: float = 30.0,
+        max_body_bytes: int = 1024 * 1024,
+    ):
+        """
+        Args:
+            agents: The agents to serve by name. `AgentTemplate`s spawn an agent per request, `Agent`s are copied
+                per request the same way.
+            session_store: Where the memories of the sessions are kept. Defaults to an `InMemorySessionStore`.
+            suspended_run_store: If set, the served agents suspend their runs on `user_input` instead of blocking
+                a thread, and the runs are continued with `POST /agents/{name}/resume`
+            max_concurrency: The maximum number of concurrent runs per agent
+            max_queue: The maximum number of requests per agent waiting for a run slot, further requests are
+                rejected with `503`
+            queue_timeout_secs: If set, requests waiting longer for a run slot are rejected with `503`
+            shutdown_timeout_secs: How long `shutdown` waits for the accepted runs to finish
+            max_body_bytes: Larger request bodies are rejected with `413`
+        """
+        self._slots: dict[str, _AgentSlots] = {}
+        for agent in agents:
+            if agent.name in self._slots:
+                raise ValueError(f"Duplicate agent name '{agent.name}'")
+            self._slots[agent.name] = _AgentSlots(agent, max_concurrency, max_queue)
+        self.session_store = (
+            session_store if session_store is not None else InMemorySessionStore()
+        )
+        self.suspended_run_store = suspended_run_store
+        self.queue_timeout_secs = queue_timeout_secs
+        self.shutdown_timeout_secs = shutdown_timeout_secs
+        self.max_body_bytes = max_body_bytes
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency * len(self._slots)),
+            thread_name_prefix="agent-run",
+        )
+        self._runs: set[asyncio.Future] = set()
+        self._busy_sessions: set[str] = set()
+        self._closing = False
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(agents={list(self._slots)})"
+
+    @property
+    def closing(self) -> bool:
+        return self._closing
+
+    def stats(self) -> dict[str, dict]:
+        """The run counters of each agent"""
+        return {name: asdict(slots.stats) for name, slots in self._slots.items()}
+
+    async def __call__(self, scope: dict, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+        try:
+            await self._route(scope, receive, send)
+        except HttpError as e:
+            await _send_json(send, e.status, {"error": e.message}, e.headers)
+
+    async def shutdown(self, timeout_secs: Optional[float] = None) -> bool:
+        """
+        Rejects new runs and waits for the accepted ones (running or queued) to finish
+
+        Args:
+            timeout_secs: How long to wait. Defaults to `shutdown_timeout_secs`.
+
+        Returns:
+            `True` if all the runs finished in time
+        """
+        self._closing = True
+        timeout_secs = (
+            self.shutdown_timeout_secs if timeout_secs is None else timeout_secs
+        )
+        deadline = time.monotonic() + timeout_secs
+        logger.info(f"Draining {len(self._runs)} runs before shutting down")
+        while self._runs or any(s.stats.queued for s in self._slots.values()):
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    f"Shutting down with {len(self._runs)} runs still in progress"
+                )
+                break
+            await asyncio.sleep(0.01)
+        drained = not self._runs
+        # the threads of unfinished runs can't be interrupted, they end with the process
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return drained
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _route(self, scope: dict, receive: Receive, send: Send) -> None:
+        method = scope["method"]
+        parts = [p for p in scope["path"].split("/") if p]
+
+        def allow(*methods: str) -> None:
+            if method not in methods:
+                raise HttpError(405, f"Method {method} not allowed")
+
+        if parts == ["health"]:
+            allow("GET")
+            status = "draining" if self._closing else "ok"
+            await _send_json(
+                send,
+                200,
+                {
+                    "status": status,
+                    "agents": self.stats(),
+                    "sessions": self.session_store.stats(),
+                },
+            )
+        elif parts == ["metrics"]:
+            allow("GET")
+            body = metrics.exposition().encode("utf-8")
+            await _send_response(send, 200, body, "text/plain; version=0.0.4")
+        elif parts == ["agents"]:
+            allow("GET")
+            await _send_json(
+                send,
+                200,
+                [
+                    {"name": name, "description": slots.agent.description}
+                    for name, slots in self._slots.items()
+                ],
+            )
+        elif (
+            len(parts) == 3 and parts[0] == "agents" and parts[2] in ("runs", "resume")
+        ):
+            allow("POST")
+            await self._handle_run(scope, receive, send, parts[1], parts[2] == "resume")
+        elif len(parts) == 2 and parts[0] == "sessions":
+            allow("GET", "DELETE")
+            await self._handle_session(send, method, parts[1])
+        else:
+            raise HttpError(404, f"Unknown path {scope['path']}")
+
+    async def _read_json(self, receive: Receive) -> dict:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HttpError(400, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HttpError(413, f"Body larger than {self.max_body_bytes} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        try:
+            body = json.loads(b"".join(chunks) or b"{}")
+        except json.JSONDecodeError as e:
+            raise HttpError(400, f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise HttpError(400, "The body must be a JSON object")
+        return body
+
+    async def _handle_session(self, send: Send, method: str, session_id: str) -> None:
+        if method == "DELETE":
+            if session_id in self._busy_sessions:
+                raise HttpError(409, f"Session '{session_id}' is running")
+            if not await asyncio.to_thread(self.session_store.delete, session_id):
+                raise HttpError(404, f"Unknown session '{session_id}'")
+            await _send_json(send, 200, {"session_id": session_id, "deleted": True})
+            return
+        memory = await asyncio.to_thread(self.session_store.get, session_id)
+        if memory is None:
+            raise HttpError(404, f"Unknown session '{session_id}'")
+        await _send_json(
+            send,
+            200,
+            {
+                "session_id": session_id,
+                "memories": [as_dict(m) for m in memory.get_memories()],
+            },
+        )
+
+    async def _handle_run(
+        self, scope: dict, receive: Receive, send: Send, agent_name: str, resume: bool
+    ) -> None:
+        if self._closing:
+            raise HttpError(
+                503, "Shutting down", {"Retry-After": str(RETRY_AFTER_SECS)}
+            )
+        if (slots := self._slots.get(agent_name)) is None:
+            raise HttpError(404, f"Unknown agent '{agent_name}'")
+        body = await self._read_json(receive)
+        if resume:
+            session_id = _field(body, "session_id", str)
+            run_args = {"token": _field(body, "token", str), "reply": body.get("reply")}
+        else:
+            session_id = _field(body, "session_id", str, required=False)
+            run_args = {"user_input": _field(body, "input", str)}
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+            run_args["new_session"] = True
+        elif session_id not in self.session_store:
+            raise HttpError(404, f"Unknown session '{session_id}'")
+        headers = dict(scope.get("headers") or [])
+        stream = bool(body.get("stream")) or b"text/event-stream" in headers.get(
+            b"accept", b""
+        )
+
+        if session_id in self._busy_sessions:
+            raise HttpError(409, f"Session '{session_id}' is already running")
+        self._busy_sessions.add(session_id)
+        try:
+            await slots.acquire(self.queue_timeout_secs)
+        except BaseException:
+            self._busy_sessions.discard(session_id)
+            raise
+
+        loop = asyncio.get_running_loop()
+        events: Optional[asyncio.Queue] = asyncio.Queue() if stream else None
+
+        def emit(event: Optional[str], data: Optional[dict]) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+        agent = self._spawn(slots.agent, emit if stream else None)
+        # the run owns its slot and session until its thread finishes, even if the client goes away
+        run = asyncio.ensure_future(
+            self._execute(slots, agent, session_id, run_args, emit if stream else None)
+        )
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+
+        if stream:
+            await self._stream(send, session_id, events, run)
+            return
+        try:
+            outcome = await asyncio.shield(run)
+        except SuspendedRunNotFoundError:
+            raise HttpError(404, f"Unknown suspended run '{run_args['token']}'")
+        except Exception as e:
+            raise HttpError(500, f"{e.__class__.__name__}('{e}')")
+        await _send_json(send, 200, outcome)
+
+    def _spawn(self, agent: Union[Agent, AgentTemplate], emit: Optional[Emit]) -> Agent:
+        agent = agent.spawn() if isinstance(agent, AgentTemplate) else copy.copy(agent)
+        if self.suspended_run_store is not None:
+            agent.suspended_run_store = self.suspended_run_store
+        if emit is not None:
+            agent.hooks = [*agent.hooks, _IterationEventHook(emit)]
+            agent.environment = _EventEnvironment(agent.environment, emit)
+        return agent
+
+    def _run(
+        self, agent: Agent, session_id: str, run_args: dict, emit: Optional[Emit]
+    ) -> dict:
+        """Runs (or resumes) the agent on a worker thread and saves the memory of the session"""
+        memory = None
+        try:
+            if "token" in run_args:
+                # the token must be the one of a run of this agent and session, see `Agent.resume`
+                memory = agent.resume(
+                    run_args["token"],
+                    run_args["reply"],
+                    action_context_props={"session_id": session_id},
+                    expected_properties={"session_id": session_id},
+                )
+            else:
+                if run_args.get("new_session"):
+                    memory = DictMemory()
+                else:
+                    memory = self.session_store.get(session_id) or DictMemory()
+                agent.run(
+                    run_args["user_input"],
+                    memory=memory,
+                    action_context_props={"session_id": session_id},
+                )
+            return {
+                "status": "completed",
+                "session_id": session_id,
+                "result": _final_result(memory),
+            }
+        except RunSuspended as suspended:
+            memory = suspended.memory
+            return {
+                "status": "suspended",
+                "session_id": session_id,
+                "token": suspended.token,
+                "message": suspended.message,
+            }
+        finally:
+            # failed runs keep what happened so far in their session
+            if memory is not None:
+                self.session_store.put(session_id, memory)
+            if emit is not None:
+                emit(None, None)
+
+    async def _execute(
+        self,
+        slots: _AgentSlots,
+        agent: Agent,
+        session_id: str,
+        run_args: dict,
+        emit: Optional[Emit],
+    ) -> dict:
+        """Runs `_run` on the thread pool, then releases the slot and the session before the response is sent"""
+        loop = asyncio.get_running_loop()
+        try:
+            outcome = await loop.run_in_executor(
+                self._executor, self._run, agent, session_id, run_args, emit
+            )
+        except Exception as e:
+            slots.stats.failed += 1
+            logger.error(
+                f"Run of agent '{slots.agent.name}' for session '{session_id}' failed with error: "
+                f"{e.__class__.__name__}('{e}')"
+            )
+            raise
+        finally:
+            self._busy_sessions.discard(session_id)
+            slots.release()
+        if outcome["status"] == "suspended":
+            slots.stats.suspended += 1
+        else:
+            slots.stats.completed += 1
+        return outcome
+
+    async def _stream(
+        self,
+        send: Send,
+        session_id: str,
+        events: asyncio.Queue,
+        run: asyncio.Future,
+    ) -> None:
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache"),
+                    ],
+                }
+            )
+
+            async def send_event(event: str, data: dict) -> None:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": _sse(event, data),
+                        "more_body": True,
+                    }
+                )
+
+            await send_event("started", {"session_id": session_id})
+            # the run emits `(None, None)` when it ends
+            while (event := await events.get())[0] is not None:
+                await send_event(*event)
+            try:
+                outcome = await asyncio.shield(run)
+            except Exception as e:
+                await send_event(
+                    "error",
+                    {
+                        "session_id": session_id,
+                        "error": f"{e.__class__.__name__}('{e}')",
+                    },
+                )
+            else:
+                await send_event(outcome["status"], outcome)
+            await send({"type": "http.response.body", "body": b""})
+        except OSError as e:
+            # the client went away, the run goes on and saves its session
+            logger.debug(f"Stream of session '{session_id}' closed: {e}")
@@ -0,0 +1,244 @@
+"""Chat sessions of served agents
+
+A session maps an id to the `Memory` of a conversation, so consecutive requests of the same chat continue the same
+history. `game.serve` reads the memory of a session before a run and writes it back afterwards.
+
+`InMemorySessionStore` keeps every session in RAM forever. `LruSessionStore` keeps the recently used sessions in RAM
+up to a total size and spills the least recently used ones to binary session snapshots on disk, reloading them
+transparently on their next request, so the resident memory stays flat as the number of sessions grows:
+
+    store = LruSessionStore("sessions", max_resident_bytes=512 * 1024 * 1024)
+    app = AgentApp(agents, session_store=store)
+"""
+
+import re
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from game.logger import get_logger
+from game.memory.base import Memory
+from game.memory.item import MemoryItem
+from game.memory.snapshot import load_snapshot, save_snapshot
+
+logger = get_logger(__name__)
+
+# the session ids are used as file names
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+# the approximate size of a `MemoryItem` and of its content string, without the characters
+MEMORY_ITEM_OVERHEAD = sys.getsizeof(MemoryItem("assistant")) + sys.getsizeof("")
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Memory]:
+        """Returns the memory of a session, `None` if it doesn't exist"""
+
+    @abstractmethod
+    def put(self, session_id: str, memory: Memory) -> None:
+        """Creates or replaces the memory of a session"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Deletes a session, returns `False` if it didn't exist"""
+
+    @abstractmethod
+    def __contains__(self, session_id: str) -> bool:
+        """Checks if a session exists, without loading its memory"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """The number of sessions"""
+
+    def stats(self) -> dict:
+        """The statistics of the store"""
+        return {"sessions": len(self)}
+
+
+class InMemorySessionStore(SessionStore):
+    """Keeps the memories of all the sessions in a dictionary"""
+
+    def __init__(self):
+        self.sessions: dict[str, Memory] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Memory]:
+        return self.sessions.get(session_id)
+
+    def put(self, session_id: str, memory: Memory) -> None:
+        with self._lock:
+            self.sessions[session_id] = memory
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+def memory_size(memory: Memory) -> int:
+    """The approximate number of bytes held by the memories of `memory`"""
+    size = 0
+    for item in memory.get_memories():
+        if isinstance(item, MemoryItem):
+            size += item.content_size
+        else:
+            size += len(str(item.get("content") or ""))
+        size += MEMORY_ITEM_OVERHEAD
+    return size
+
+
+@dataclass
+class LruSessionStoreStats:
+    hits: int = 0
+    reloads: int = 0
+    misses: int = 0
+    evictions: int = 0
+    reload_secs_total: float = 0.0
+    reload_secs_max: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of the requested sessions that were resident"""
+        found = self.hits + self.reloads
+        return self.hits / found if found else 0.0
+
+    @property
+    def reload_secs_mean(self) -> float:
+        return self.reload_secs_total / self.reloads if self.reloads else 0.0
+
+
+class LruSessionStore(SessionStore):
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_resident_bytes: int = 256 * 1024 * 1024,
+        compression_level: Optional[int] = None,
+    ):
+        """
+        Args:
+            directory: Where the evicted sessions are spilled, created if it doesn't exist. The sessions already
+                spilled there are available, eg after a restart.
+            max_resident_bytes: The maximum approximate size of the memories kept in RAM, see `memory_size`. The
+                most recently used session is always resident.
+            compression_level: If set, the spilled snapshots are compressed with zlib using this level (0-9)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_resident_bytes = max_resident_bytes
+        self.compression_level = compression_level
+        self.resident_bytes = 0
+        self.counters = LruSessionStoreStats()
+
+        self._resident: OrderedDict[str, tuple[Memory, int]] = OrderedDict()
+        self._spilled: dict[str, int] = {
+            path.stem: path.stat().st_size for path in self.directory.glob("*.snap")
+        }
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(directory='{self.directory}', max_resident_bytes={self.max_resident_bytes})"
+
+    def _path(self, session_id: str) -> Path:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(
+                f"Invalid session id '{session_id}', use letters, digits, '_' and '-'"
+            )
+        return self.directory / f"{session_id}.snap"
+
+    def get(self, session_id: str) -> Optional[Memory]:
+        with self._lock:
+            if (resident := self._resident.get(session_id)) is not None:
+                self._resident.move_to_end(session_id)
+                self.counters.hits += 1
+                return resident[0]
+            if session_id not in self._spilled:
+                self.counters.misses += 1
+                return None
+
+            tic = time.perf_counter()
+            path = self._path(session_id)
+            memory = load_snapshot(path, use_mmap=False).memory
+            path.unlink()
+            del self._spilled[session_id]
+            self._add(session_id, memory)
+            elapsed = time.perf_counter() - tic
+            self.counters.reloads += 1
+            self.counters.reload_secs_total += elapsed
+            self.counters.reload_secs_max = max(self.counters.reload_secs_max, elapsed)
+            return memory
+
+    def put(self, session_id: str, memory: Memory) -> None:
+        path = self._path(session_id)
+        with self._lock:
+            if session_id in self._spilled:
+                del self._spilled[session_id]
+                path.unlink(missing_ok=True)
+            self._add(session_id, memory)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if (resident := self._resident.pop(session_id, None)) is not None:
+                self.resident_bytes -= resident[1]
+                return True
+            if self._spilled.pop(session_id, None) is not None:
+                self._path(session_id).unlink(missing_ok=True)
+                return True
+            return False
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._resident or session_id in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._resident) + len(self._spilled)
+
+    def _add(self, session_id: str, memory: Memory) -> None:
+        size = memory_size(memory)
+        if (previous := self._resident.pop(session_id, None)) is not None:
+            self.resident_bytes -= previous[1]
+        self._resident[session_id] = (memory, size)
+        self.resident_bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        """Spills the least recently used sessions until the resident ones fit in `max_resident_bytes`"""
+        while self.resident_bytes > self.max_resident_bytes and len(self._resident) > 1:
+            session_id, (memory, size) = self._resident.popitem(last=False)
+            path = self._path(session_id)
+            tmp_path = path.with_suffix(".tmp")
+            spilled_bytes = save_snapshot(
+                tmp_path, memory, compression_level=self.compression_level
+            )
+            tmp_path.replace(path)
+            self._spilled[session_id] = spilled_bytes
+            self.resident_bytes -= size
+            self.counters.evictions += 1
+            logger.debug(
+                f"Spilled session '{session_id}' ({size} bytes resident, {spilled_bytes} bytes on disk)"
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self),
+                "resident_sessions": len(self._resident),
+                "resident_bytes": self.resident_bytes,
+                "spilled_sessions": len(self._spilled),
+                "spilled_bytes": sum(self._spilled.values()),
+                "hits": self.counters.hits,
+                "reloads": self.counters.reloads,
+                "misses": self.counters.misses,
+                "evictions": self.counters.evictions,
+                "hit_rate": self.counters.hit_rate,
+                "reload_secs_mean": self.counters.reload_secs_mean,
+                "reload_secs_max": self.counters.reload_secs_max,
+            }
@@ -23,6 +23,12 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "DEBUG"
     LOG_FILE: Optional[str] = None
 
+    TRACING_FILE: Optional[str] = None
+    TRACING_FORMAT: str = "json"
+
+    # `json`, `orjson` or `msgspec`, by default the fastest one installed (see `game.codec`)
+    JSON_CODEC: Optional[str] = None
+
 
 def get_settings() -> Settings:
     return Settings()
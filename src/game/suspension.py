@@ -0,0 +1,226 @@
+"""Suspending agent runs while they wait for a human
+
+A tool (eg `user_input`) raises `SuspendRun` instead of blocking. If the agent has a `SuspendedRunStore`, the run is
+parked in the store and `Agent.run` raises `RunSuspended` with a continuation token. Later, possibly in another
+process when the store is persistent, `Agent.resume(token, reply)` continues the run exactly where it stopped, with
+`reply` as the result of the suspended tool:
+
+    agent = Agent(..., tools=[user_input], suspended_run_store=SnapshotSuspendedRunStore("sessions"))
+    try:
+        memory = agent.run(user_input="Plan my trip")
+    except RunSuspended as suspended:
+        ask_the_user(suspended.message)  # returns immediately, no thread waits for the reply
+    ...
+    memory = agent.resume(token, reply="To Lisbon")
+
+Waiting runs hold no thread: only their memory is kept, in memory or on disk.
+"""
+
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Union
+
+from game.memory.base import Memory
+from game.memory.snapshot import load_snapshot, save_snapshot, serialisable_properties
+
+SUSPENDED_PROPERTY = "__suspended_run__"
+
+
+class SuspendRun(Exception):
+    """Raised by a tool to suspend the run until it's resumed with the reply to `message`"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class RunSuspended(Exception):
+    """Raised by `Agent.run` and `Agent.resume` when the run was suspended, resume it with `token`"""
+
+    def __init__(self, token: str, message: str, memory: Memory):
+        super().__init__(f"Run suspended with token '{token}': {message}")
+        self.token = token
+        self.message = message
+        self.memory = memory
+
+
+class SuspendedRunNotFoundError(KeyError):
+    """Raised when resuming an unknown (or already resumed) run"""
+
+
+@dataclass
+class SuspendedRun:
+    agent_name: str
+    memory: Memory
+    iteration: int
+    tool_name: str
+    message: str
+    properties: dict = field(default_factory=dict)
+    token: str = field(default_factory=lambda: uuid.uuid4().hex)
+    suspended_at: float = field(default_factory=time.time)
+
+    def matches(
+        self, agent_name: Optional[str] = None, properties: Optional[dict] = None
+    ) -> bool:
+        """Whether the run was suspended by `agent_name` with these `properties` values, `None` matching any"""
+        if agent_name is not None and agent_name != self.agent_name:
+            return False
+        return all(
+            key in self.properties and self.properties[key] == value
+            for key, value in (properties or {}).items()
+        )
+
+
+class SuspendedRunStore(ABC):
+    @abstractmethod
+    def save(self, run: SuspendedRun) -> str:
+        """Parks a suspended run, returns its token"""
+
+    @abstractmethod
+    def pop(
+        self,
+        token: str,
+        agent_name: Optional[str] = None,
+        properties: Optional[dict] = None,
+    ) -> SuspendedRun:
+        """
+        Removes and returns a suspended run, so it can be resumed once
+
+        Args:
+            token: The token of the run
+            agent_name: If set, the run must have been suspended by this agent
+            properties: If set, the run must have these `ActionContext` properties, eg the session of the caller
+
+        Raises:
+            SuspendedRunNotFoundError: If there isn't any run with `token`, or if it doesn't match `agent_name` and
+                `properties`. A run that doesn't match stays in the store.
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """The number of suspended runs"""
+
+
+class InMemorySuspendedRunStore(SuspendedRunStore):
+    """Keeps the suspended runs (and all their `ActionContext` properties) in a dictionary"""
+
+    def __init__(self):
+        self.runs: dict[str, SuspendedRun] = {}
+        self._lock = threading.Lock()
+
+    def save(self, run: SuspendedRun) -> str:
+        with self._lock:
+            self.runs[run.token] = run
+        return run.token
+
+    def pop(
+        self,
+        token: str,
+        agent_name: Optional[str] = None,
+        properties: Optional[dict] = None,
+    ) -> SuspendedRun:
+        with self._lock:
+            run = self.runs.get(token)
+            if run is None or not run.matches(agent_name, properties):
+                raise SuspendedRunNotFoundError(token)
+            return self.runs.pop(token)
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+
+class SnapshotSuspendedRunStore(SuspendedRunStore):
+    """
+    Parks each suspended run in a binary session snapshot file, so runs survive restarts and can be resumed by
+    another process sharing the directory. Only the `ActionContext` properties that can be serialised to JSON are
+    kept, pass the others again to `Agent.resume`.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], compression_level: Optional[int] = None
+    ):
+        """
+        Args:
+            directory: The directory of the snapshot files, created if it doesn't exist
+            compression_level: If set, the snapshots are compressed with zlib using this level (0-9)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression_level = compression_level
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(directory='{self.directory}')"
+
+    def _path(self, token: str) -> Path:
+        # the token is used as a file name
+        if not token.isalnum():
+            raise SuspendedRunNotFoundError(token)
+        return self.directory / f"{token}.snap"
+
+    def save(self, run: SuspendedRun) -> str:
+        properties = serialisable_properties(run.properties)
+        properties[SUSPENDED_PROPERTY] = {
+            "tool_name": run.tool_name,
+            "message": run.message,
+            "suspended_at": run.suspended_at,
+        }
+        path = self._path(run.token)
+        tmp_path = path.with_suffix(".tmp")
+        save_snapshot(
+            tmp_path,
+            run.memory,
+            agent_name=run.agent_name,
+            iterations=run.iteration,
+            properties=properties,
+            compression_level=self.compression_level,
+        )
+        tmp_path.replace(path)
+        return run.token
+
+    def pop(
+        self,
+        token: str,
+        agent_name: Optional[str] = None,
+        properties: Optional[dict] = None,
+    ) -> SuspendedRun:
+        path = self._path(token)
+        claimed = path.with_suffix(f".{uuid.uuid4().hex}.resuming")
+        try:
+            # renaming is atomic, so concurrent resumes of the same token can't both succeed
+            path.rename(claimed)
+        except FileNotFoundError:
+            raise SuspendedRunNotFoundError(token)
+        try:
+            run = self._load(claimed, token)
+        except BaseException:
+            claimed.unlink()
+            raise
+        if not run.matches(agent_name, properties):
+            # give the run back to its owner
+            claimed.rename(path)
+            raise SuspendedRunNotFoundError(token)
+        claimed.unlink()
+        return run
+
+    @staticmethod
+    def _load(path: Path, token: str) -> SuspendedRun:
+        snapshot = load_snapshot(path, use_mmap=False)
+        properties = dict(snapshot.properties)
+        suspended = properties.pop(SUSPENDED_PROPERTY)
+        return SuspendedRun(
+            agent_name=snapshot.agent_name,
+            memory=snapshot.memory,
+            iteration=snapshot.iterations,
+            tool_name=suspended["tool_name"],
+            message=suspended["message"],
+            properties=properties,
+            token=token,
+            suspended_at=suspended["suspended_at"],
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.directory.glob("*.snap"))
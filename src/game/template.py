@@ -0,0 +1,72 @@
+"""Agent templates for cheap per-request agent construction
+
+Building an `Agent` resolves the LLM from the settings (dotenv and pydantic parsing), wraps every tool in a new
+`Action` and builds the `AgentRegistry`. An `AgentTemplate` does this once and `spawn`s agents that share these
+immutable parts, so an agent per request or session costs a few microseconds:
+
+    template = AgentTemplate(goals=goals, agent_language=AgentFunctionCallingActionLanguage(), tools=tools)
+
+    def handle_request(user_input: str) -> Memory:
+        return template.spawn().run(user_input=user_input)
+
+The spawned agents hold no per-run state (the memory and the `ActionContext` are created per `run`), so they can
+run concurrently. Each one counts its own `repair_stats` and `structured_output_stats`.
+"""
+
+import copy
+from typing import Optional
+
+from game.agent import Agent
+
+
+class AgentTemplate:
+    def __init__(self, *args, **kwargs):
+        """
+        Takes the same arguments as `Agent`. The goals, tools, actions, agent registry, language, environment and
+        LLM client are built once and shared by all the spawned agents, so they must not be mutated afterwards.
+        """
+        if tools := kwargs.get("tools"):
+            # `Agent` appends the default tools to the list, keep the caller's list untouched
+            kwargs["tools"] = list(tools)
+        self._prototype = Agent(*args, **kwargs)
+
+    @property
+    def name(self) -> str:
+        return self._prototype.name
+
+    @property
+    def description(self) -> str:
+        return self._prototype.description
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name='{self.name}')"
+
+    def spawn(
+        self,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        max_iterations: Optional[int] = None,
+        debug_log_memory: Optional[bool] = None,
+    ) -> Agent:
+        """
+        Creates an agent sharing the immutable parts of the template without re-running `Agent.__init__`
+
+        Args:
+            name: The name of the agent. Defaults to the name of the template.
+            description: The description of the agent. Defaults to the description of the template.
+            max_iterations: Maximum number of action loops. Defaults to the one of the template.
+            debug_log_memory: Overrides `debug_log_memory` of the template
+
+        Returns:
+            The new `Agent`
+        """
+        agent = copy.copy(self._prototype)
+        if name is not None:
+            agent._name = name
+        if description is not None:
+            agent._description = description
+        if max_iterations is not None:
+            agent.max_iterations = max_iterations
+        if debug_log_memory is not None:
+            agent.debug_log_memory = debug_log_memory
+        return agent
@@ -0,0 +1,284 @@
+"""Hierarchical tracing of agent runs
+
+Spans follow the OpenTelemetry data model (trace and span ids, parent span id, start/end time in nanoseconds,
+attributes and status) and are written to local files, so no collector is required:
+
+    from game.tracing import JsonFileExporter, set_exporter
+
+    set_exporter(JsonFileExporter("traces.jsonl"))
+
+or with the `TRACING_FILE` (and optionally `TRACING_FORMAT=otlp`) env variables. `OtlpJsonFileExporter` writes the
+OTLP/JSON encoding, one `ExportTraceServiceRequest` per line, which can be replayed to any OTLP collector.
+
+The agent emits the spans:
+
+    agent.run                        agent.name, agent.iterations
+    └── agent.iteration              agent.iteration
+        ├── agent.construct_prompt   prompt.messages, prompt.chars, prompt.tools
+        ├── llm.call                 llm.name, gen_ai.usage.input_tokens, gen_ai.usage.output_tokens
+        ├── agent.parse_response     tool.name
+        └── environment.execute_action
+            └── agent.call           agent.name, agent.call.pattern
+                └── agent.run        (the run of the invoked agent)
+
+The current span is kept in a `contextvars.ContextVar`, so the spans of sub-agents nest under the tool that invoked
+them, also when the tool runs them on other threads with `contextvars.copy_context()`. Tracing is disabled unless an
+exporter is set and then `start_span` costs a function call.
+"""
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from game.settings import get_settings
+
+
+class SpanStatus:
+    UNSET = "UNSET"
+    OK = "OK"
+    ERROR = "ERROR"
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    start_time_ns: int = field(default_factory=time.time_ns)
+    end_time_ns: Optional[int] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = SpanStatus.UNSET
+    status_message: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time_ns is None:
+            return None
+        return (self.end_time_ns - self.start_time_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def set_status(self, status: str, message: Optional[str] = None) -> None:
+        self.status = status
+        self.status_message = message
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class _NoOpSpan:
+    """The span returned when tracing is disabled, it ignores everything"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        pass
+
+    def set_status(self, status: str, message: Optional[str] = None) -> None:
+        pass
+
+
+NO_OP_SPAN = _NoOpSpan()
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """Exports a finished span"""
+
+    def shutdown(self) -> None:
+        """Flushes and releases the resources of the exporter"""
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps the finished spans in a list, eg for tests"""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+class JsonFileExporter(SpanExporter):
+    """Appends the finished spans to a file, one JSON object per line"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(path='{self.path}')"
+
+    def _encode(self, span: Span) -> dict:
+        return span.to_dict()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(self._encode(span), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+class OtlpJsonFileExporter(JsonFileExporter):
+    """Appends the finished spans to a file in the OTLP/JSON encoding, one `ExportTraceServiceRequest` per line"""
+
+    OTLP_STATUS_CODES = {SpanStatus.UNSET: 0, SpanStatus.OK: 1, SpanStatus.ERROR: 2}
+
+    def __init__(self, path: Union[str, Path], service_name: str = "game"):
+        super().__init__(path)
+        self.service_name = service_name
+
+    def _encode(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_time_ns),
+            "endTimeUnixNano": str(span.end_time_ns),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()
+            ],
+            "status": {"code": self.OTLP_STATUS_CODES[span.status]},
+        }
+        if span.parent_span_id:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        if span.status_message:
+            otlp_span["status"]["message"] = span.status_message
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": [otlp_span]}],
+                }
+            ]
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> Optional[SpanExporter]:
+    """
+    Enables tracing with `exporter`, or disables it if `None`
+
+    Returns:
+        The previous exporter, which isn't shut down
+    """
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    return previous
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    return _exporter
+
+
+def is_enabled() -> bool:
+    return _exporter is not None
+
+
+def get_current_span() -> Union[Span, _NoOpSpan]:
+    """Returns the active span of the current context or a no-op span, so attributes can always be set"""
+    return _current_span.get() or NO_OP_SPAN
+
+
+@contextmanager
+def start_span(
+    name: str, attributes: Optional[dict[str, Any]] = None
+) -> Iterator[Union[Span, _NoOpSpan]]:
+    """
+    Starts a span as a child of the current span (or as the root of a new trace) and exports it when it ends. Spans
+    ending with an exception get the `ERROR` status.
+
+    Args:
+        name: The name of the span, eg `"agent.run"`
+        attributes: The initial attributes of the span
+
+    Returns:
+        A context manager yielding the span
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NO_OP_SPAN
+        return
+
+    parent = _current_span.get()
+    span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else _new_id(16),
+        span_id=_new_id(8),
+        parent_span_id=parent.span_id if parent else None,
+        attributes=dict(attributes) if attributes else {},
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_status(SpanStatus.ERROR, f"{e.__class__.__name__}('{e}')")
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end_time_ns = time.time_ns()
+        exporter.export(span)
+
+
+def _configure_from_settings() -> None:
+    settings = get_settings()
+    if settings.TRACING_FILE:
+        exporter_class = (
+            OtlpJsonFileExporter
+            if settings.TRACING_FORMAT.lower() == "otlp"
+            else JsonFileExporter
+        )
+        set_exporter(exporter_class(settings.TRACING_FILE))
+
+
+_configure_from_settings()
@@ -0,0 +1,45 @@
+"""The record of one iteration of the agent loop
+
+Each iteration of `Agent.run` is a `Turn` going through a pipeline of stages, every stage filling its slots of the
+record once: the prompt, the raw LLM response, the parsed invocation and its action, the result of the tool and
+whether the run terminates. The later stages read the slots instead of computing them again, eg the termination
+check uses the parsed action instead of parsing the response a second time.
+
+The stages of an agent are functions of the turn (`TurnStage`), more can be inserted with `Agent.add_turn_stage`.
+A built-in stage skips its work when its slot is already filled, so a stage inserted before it can replace it, eg a
+cache setting `turn.response` skips the LLM call, a guardrail setting `turn.result` skips the tool execution:
+
+    def guardrail(turn: Turn) -> None:
+        if turn.invocation and turn.invocation["tool"] == "delete_file":
+            turn.result = {"tool_executed": False, "error": "Deleting files isn't allowed"}
+
+    agent.add_turn_stage("guardrail", guardrail, before=Stage.TOOL)
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from game.action import Action
+from game.action.context import ActionContext
+from game.memory.base import Memory
+from game.prompt import Prompt
+
+
+@dataclass(slots=True)
+class Turn:
+    iteration: int
+    memory: Memory
+    action_context: ActionContext
+    prompt: Optional[Prompt] = None
+    response: Optional[str] = None
+    # the deserialized response, eg `{"tool": "search", "args": {...}}`
+    invocation: Optional[dict] = None
+    action: Optional[Action] = None
+    # the result of the tool, or of the failure to parse the response
+    result: Optional[dict] = None
+    terminate: bool = False
+    # the monotonic duration of each stage in nanoseconds
+    timings: dict[str, int] = field(default_factory=dict)
+
+
+TurnStage = Callable[[Turn], None]
@@ -0,0 +1,4 @@
+from game.work_queue.broker import Broker, InMemoryBroker, Job, JobStatus
+from game.work_queue.remote import BrokerServer, RemoteBroker
+from game.work_queue.sqlite_broker import SQLiteBroker
+from game.work_queue.worker import QueueWorker
@@ -0,0 +1,226 @@
+"""Broker abstraction of the agent work queue
+
+Producers `submit` jobs, ie an agent spec (`"package.module:factory"`, a function returning an `Agent`) and a user
+input, and workers `lease` them. A lease expires unless the worker `extend_lease`s it, so the jobs of dead workers
+are handed to other workers. Failed jobs are retried until `max_attempts`, and the results of the finished jobs are
+stored in the broker.
+
+When leasing, the agent specs with available jobs are served round robin (the least recently served spec first),
+so a burst of jobs for one agent type doesn't starve the others.
+"""
+
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+LEASE_EXPIRED_ERROR = "Lease expired"
+
+
+class JobStatus:
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    agent_spec: str
+    user_input: str
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = JobStatus.PENDING
+    attempts: int = 0
+    max_attempts: int = 3
+    worker_id: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    def is_available(self, now: float) -> bool:
+        """`True` if the job is pending or its lease expired"""
+        return self.status == JobStatus.PENDING or (
+            self.status == JobStatus.LEASED and self.lease_expires_at < now
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, job: dict) -> "Job":
+        return cls(**job)
+
+
+class Broker(ABC):
+    """Stores the jobs of the agent work queue"""
+
+    @abstractmethod
+    def submit(self, agent_spec: str, user_input: str, max_attempts: int = 3) -> str:
+        """
+        Submits a job
+
+        Args:
+            agent_spec: The agent to run as `"package.module:factory"`, where `factory` returns an `Agent`
+            user_input: The initial user message of the run
+            max_attempts: The number of times the job is tried before it's marked as failed
+
+        Returns:
+            The id of the job
+        """
+
+    @abstractmethod
+    def lease(
+        self,
+        worker_id: str,
+        lease_secs: float = 60.0,
+        agent_specs: Optional[list[str]] = None,
+    ) -> Optional[Job]:
+        """
+        Leases the next available job to `worker_id`
+
+        Args:
+            worker_id: The id of the worker leasing the job
+            lease_secs: The number of seconds until the lease expires
+            agent_specs: If set, only jobs of these agent specs are leased
+
+        Returns:
+            The leased `Job` or `None` if there aren't any available jobs
+        """
+
+    @abstractmethod
+    def extend_lease(self, job_id: str, worker_id: str, lease_secs: float) -> bool:
+        """Extends the lease of a job, returns `False` if `worker_id` doesn't hold the lease anymore"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        """Stores the result of a job, returns `False` if `worker_id` doesn't hold the lease anymore"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """
+        Marks a job attempt as failed. The job is retried unless it reached its `max_attempts`.
+        Returns `False` if `worker_id` doesn't hold the lease anymore.
+        """
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """Returns the job with `job_id` or `None` if it doesn't exist"""
+
+    def wait(
+        self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.1
+    ) -> Job:
+        """
+        Waits until a job is finished
+
+        Raises:
+            TimeoutError: If the job isn't finished within `timeout` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job is None:
+                raise KeyError(f"Job '{job_id}' not found")
+            if job.is_finished:
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Job '{job_id}' not finished after {timeout} seconds"
+                )
+            time.sleep(poll_interval)
+
+
+class InMemoryBroker(Broker):
+    """A thread-safe broker for workers running in the same process"""
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+        self._last_served: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, agent_spec: str, user_input: str, max_attempts: int = 3) -> str:
+        job = Job(
+            agent_spec=agent_spec, user_input=user_input, max_attempts=max_attempts
+        )
+        with self._lock:
+            self.jobs[job.id] = job
+        return job.id
+
+    def lease(
+        self,
+        worker_id: str,
+        lease_secs: float = 60.0,
+        agent_specs: Optional[list[str]] = None,
+    ) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            for job in self.jobs.values():
+                if job.is_available(now) and job.attempts >= job.max_attempts:
+                    # the lease of the last attempt expired
+                    job.status = JobStatus.FAILED
+                    job.error = job.error or LEASE_EXPIRED_ERROR
+            available = [
+                job
+                for job in self.jobs.values()
+                if job.is_available(now)
+                and (agent_specs is None or job.agent_spec in agent_specs)
+            ]
+            if not available:
+                return None
+            # round robin over the agent specs, then first in first out
+            job = min(
+                available,
+                key=lambda j: (self._last_served.get(j.agent_spec, 0.0), j.created_at),
+            )
+            self._last_served[job.agent_spec] = now
+            job.status = JobStatus.LEASED
+            job.worker_id = worker_id
+            job.lease_expires_at = now + lease_secs
+            job.attempts += 1
+            return Job.from_dict(job.to_dict())
+
+    def _get_leased(self, job_id: str, worker_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job and job.status == JobStatus.LEASED and job.worker_id == worker_id:
+            return job
+        return None
+
+    def extend_lease(self, job_id: str, worker_id: str, lease_secs: float) -> bool:
+        with self._lock:
+            if job := self._get_leased(job_id, worker_id):
+                job.lease_expires_at = time.time() + lease_secs
+                return True
+            return False
+
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        with self._lock:
+            if job := self._get_leased(job_id, worker_id):
+                job.status = JobStatus.DONE
+                job.result = result
+                job.error = None
+                return True
+            return False
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        with self._lock:
+            if job := self._get_leased(job_id, worker_id):
+                job.error = error
+                job.worker_id = None
+                job.status = (
+                    JobStatus.FAILED
+                    if job.attempts >= job.max_attempts
+                    else JobStatus.PENDING
+                )
+                return True
+            return False
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return Job.from_dict(job.to_dict()) if job else None
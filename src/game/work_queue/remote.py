@@ -0,0 +1,198 @@
+"""Exposes a broker over TCP, so workers on other nodes can pull jobs from it
+
+The protocol is one JSON object per line: the client sends `{"method": ..., "kwargs": {...}, "request_id": ...}` and
+the server answers `{"result": ...}` or `{"error": ...}`. Jobs are sent as dictionaries.
+
+A client retries a request on a new connection when the connection fails, with the same `request_id`. The server
+answers a request id it already served with the same response instead of applying the request again, so a lost
+reply doesn't duplicate a submitted job or strand a lease.
+"""
+
+import json
+import socket
+import socketserver
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from game.logger import get_logger
+from game.work_queue.broker import Broker, Job
+
+logger = get_logger(__name__)
+
+BROKER_METHODS = ("submit", "lease", "extend_lease", "complete", "fail", "get_job")
+
+
+class _ResponseCache:
+    """The responses of the last requests by request id, so the retries of a request are only applied once"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._responses: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def respond(self, request_id: str, serve: Callable[[], dict]) -> dict:
+        with self._lock:
+            future = self._responses.get(request_id)
+            first = future is None
+            if first:
+                future = self._responses[request_id] = Future()
+                if len(self._responses) > self.max_size:
+                    self._responses.popitem(last=False)
+            else:
+                self._responses.move_to_end(request_id)
+        if first:
+            future.set_result(serve())
+        # a retry arriving while the request is still served waits for its response
+        return future.result()
+
+
+class BrokerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        broker: Broker,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_cached_responses: int = 10_000,
+    ):
+        """
+        Args:
+            broker: The broker to expose, eg a `SQLiteBroker`
+            host: The interface to listen on
+            port: The port to listen on, `0` picks a free port
+            max_cached_responses: The number of responses kept to answer the retried requests
+        """
+        self.broker = broker
+        self.responses = _ResponseCache(max_cached_responses)
+        super().__init__((host, port), _BrokerRequestHandler)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server_address[:2]
+
+    def start(self) -> threading.Thread:
+        """Serves requests on a daemon thread"""
+        thread = threading.Thread(
+            target=self.serve_forever, name="broker-server", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+class _BrokerRequestHandler(socketserver.StreamRequestHandler):
+    def _serve(self, request: dict) -> dict:
+        try:
+            method = request["method"]
+            if method not in BROKER_METHODS:
+                raise ValueError(f"Unknown method '{method}'")
+            result = getattr(self.server.broker, method)(**request.get("kwargs", {}))
+            return {"result": result.to_dict() if isinstance(result, Job) else result}
+        except Exception as e:
+            logger.error(f"Broker request failed: {e.__class__.__name__}('{e}')")
+            return {"error": f"{e.__class__.__name__}('{e}')"}
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"error": f"{e.__class__.__name__}('{e}')"}
+            else:
+                if request_id := request.get("request_id"):
+                    response = self.server.responses.respond(
+                        str(request_id), lambda: self._serve(request)
+                    )
+                else:
+                    response = self._serve(request)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class RemoteBrokerError(Exception):
+    """Raised when the broker server fails to serve a request"""
+
+
+class RemoteBroker(Broker):
+    """A client of a `BrokerServer`"""
+
+    def __init__(self, host: str, port: int, timeout: Optional[float] = 30.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(address={self.address})"
+
+    def _disconnect(self) -> None:
+        file, self._local.file = getattr(self._local, "file", None), None
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+
+    def _call(self, method: str, **kwargs) -> Any:
+        # the retry has the same request id, so the server doesn't apply the request twice
+        request = json.dumps(
+            {"method": method, "kwargs": kwargs, "request_id": uuid.uuid4().hex}
+        )
+        # one connection per thread, reconnecting once if the connection failed or the server closed it
+        for attempt in range(2):
+            try:
+                if getattr(self._local, "file", None) is None:
+                    sock = socket.create_connection(self.address, timeout=self.timeout)
+                    self._local.file = sock.makefile("rwb")
+                    # the connection is closed with the file
+                    sock.close()
+                self._local.file.write((request + "\n").encode("utf-8"))
+                self._local.file.flush()
+                line = self._local.file.readline()
+                if not line:
+                    raise ConnectionError("Broker server closed the connection")
+                break
+            except OSError:
+                self._disconnect()
+                if attempt:
+                    raise
+        response = json.loads(line)
+        if "error" in response:
+            raise RemoteBrokerError(response["error"])
+        return response["result"]
+
+    def submit(self, agent_spec: str, user_input: str, max_attempts: int = 3) -> str:
+        return self._call(
+            "submit",
+            agent_spec=agent_spec,
+            user_input=user_input,
+            max_attempts=max_attempts,
+        )
+
+    def lease(
+        self,
+        worker_id: str,
+        lease_secs: float = 60.0,
+        agent_specs: Optional[list[str]] = None,
+    ) -> Optional[Job]:
+        job = self._call(
+            "lease", worker_id=worker_id, lease_secs=lease_secs, agent_specs=agent_specs
+        )
+        return Job.from_dict(job) if job else None
+
+    def extend_lease(self, job_id: str, worker_id: str, lease_secs: float) -> bool:
+        return self._call(
+            "extend_lease", job_id=job_id, worker_id=worker_id, lease_secs=lease_secs
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        return self._call("complete", job_id=job_id, worker_id=worker_id, result=result)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._call("fail", job_id=job_id, worker_id=worker_id, error=error)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        job = self._call("get_job", job_id=job_id)
+        return Job.from_dict(job) if job else None
@@ -0,0 +1,198 @@
+"""A broker backed by a SQLite database file, shared by workers running in several local processes"""
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from game.work_queue.broker import LEASE_EXPIRED_ERROR, Broker, Job, JobStatus
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    agent_spec TEXT NOT NULL,
+    user_input TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    max_attempts INTEGER NOT NULL,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, agent_spec, created_at);
+CREATE TABLE IF NOT EXISTS agent_specs (
+    agent_spec TEXT PRIMARY KEY,
+    last_served REAL NOT NULL
+);
+"""
+
+JOB_FIELDS = (
+    "id",
+    "agent_spec",
+    "user_input",
+    "status",
+    "attempts",
+    "max_attempts",
+    "worker_id",
+    "lease_expires_at",
+    "result",
+    "error",
+    "created_at",
+)
+JOB_COLUMNS = ", ".join(JOB_FIELDS)
+
+
+class SQLiteBroker(Broker):
+    def __init__(self, path: Union[str, Path], timeout: float = 30.0):
+        """
+        Args:
+            path: The SQLite database file, created if it doesn't exist
+            timeout: Seconds to wait for a database lock held by another process
+        """
+        self.path = str(path)
+        self.timeout = timeout
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(path='{self.path}')"
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # a connection per operation keeps the broker safe to share across threads and forked processes
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            # take the write lock upfront, so two workers can't lease the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _to_job(row: tuple) -> Job:
+        job = Job(**dict(zip(JOB_FIELDS, row)))
+        job.result = json.loads(job.result) if job.result is not None else None
+        return job
+
+    def submit(self, agent_spec: str, user_input: str, max_attempts: int = 3) -> str:
+        job = Job(
+            agent_spec=agent_spec, user_input=user_input, max_attempts=max_attempts
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, agent_spec, user_input, status, attempts, max_attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.agent_spec,
+                    job.user_input,
+                    job.status,
+                    job.attempts,
+                    job.max_attempts,
+                    job.created_at,
+                ),
+            )
+        return job.id
+
+    def lease(
+        self,
+        worker_id: str,
+        lease_secs: float = 60.0,
+        agent_specs: Optional[list[str]] = None,
+    ) -> Optional[Job]:
+        now = time.time()
+        available = f"(status = '{JobStatus.PENDING}' OR (status = '{JobStatus.LEASED}' AND lease_expires_at < :now))"
+        spec_filter, params = "", {"now": now}
+        if agent_specs is not None:
+            params.update({f"spec{i}": spec for i, spec in enumerate(agent_specs)})
+            spec_filter = f"AND jobs.agent_spec IN ({', '.join(f':spec{i}' for i in range(len(agent_specs)))})"
+
+        with self._transaction() as conn:
+            # the lease of the last attempt expired
+            conn.execute(
+                f"UPDATE jobs SET status = '{JobStatus.FAILED}', error = COALESCE(error, :error) "
+                f"WHERE {available} AND attempts >= max_attempts",
+                {**params, "error": LEASE_EXPIRED_ERROR},
+            )
+            # round robin over the agent specs, then first in first out
+            row = conn.execute(
+                f"SELECT {', '.join('jobs.' + c for c in JOB_FIELDS)} FROM jobs "
+                f"LEFT JOIN agent_specs ON agent_specs.agent_spec = jobs.agent_spec "
+                f"WHERE {available} {spec_filter} "
+                f"ORDER BY COALESCE(agent_specs.last_served, 0), jobs.created_at LIMIT 1",
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+
+            job = self._to_job(row)
+            job.status = JobStatus.LEASED
+            job.worker_id = worker_id
+            job.lease_expires_at = now + lease_secs
+            job.attempts += 1
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_expires_at = ?, attempts = ? WHERE id = ?",
+                (job.status, worker_id, job.lease_expires_at, job.attempts, job.id),
+            )
+            conn.execute(
+                "INSERT INTO agent_specs (agent_spec, last_served) VALUES (?, ?) "
+                "ON CONFLICT (agent_spec) DO UPDATE SET last_served = excluded.last_served",
+                (job.agent_spec, now),
+            )
+            return job
+
+    def _update_leased(
+        self, job_id: str, worker_id: str, assignments: str, *params
+    ) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND worker_id = ? AND status = ?",
+                (*params, job_id, worker_id, JobStatus.LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def extend_lease(self, job_id: str, worker_id: str, lease_secs: float) -> bool:
+        return self._update_leased(
+            job_id, worker_id, "lease_expires_at = ?", time.time() + lease_secs
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        return self._update_leased(
+            job_id,
+            worker_id,
+            "status = ?, result = ?, error = NULL",
+            JobStatus.DONE,
+            json.dumps(result),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._update_leased(
+            job_id,
+            worker_id,
+            "status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, error = ?, worker_id = NULL",
+            JobStatus.FAILED,
+            JobStatus.PENDING,
+            error,
+        )
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row else None
@@ -0,0 +1,228 @@
+"""Workers that pull jobs from a broker and run the agents
+
+Run workers from the command line, eg 4 worker processes on a local SQLite queue or a worker on another node
+pulling jobs from a `BrokerServer`:
+
+    python -m game.work_queue.worker --sqlite jobs.db --processes 4 --agent-spec my_agents:build_researcher
+    python -m game.work_queue.worker --broker 10.0.0.1:7700 --agent-spec my_agents:build_researcher
+
+The agent spec of a job names the module imported by the worker, and anyone reaching the broker can submit jobs, so
+a worker only runs the agent specs it's explicitly given.
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from game.agent import Agent
+from game.logger import get_logger
+from game.memory.item import as_dict
+from game.work_queue.broker import Broker, Job
+from game.work_queue.remote import RemoteBroker
+from game.work_queue.sqlite_broker import SQLiteBroker
+
+logger = get_logger(__name__)
+
+
+def load_agent_factory(agent_spec: str) -> Callable[[], Agent]:
+    """
+    Imports the agent factory of an agent spec
+
+    Args:
+        agent_spec: `"package.module:factory"`, where `factory` is a function that returns an `Agent`
+
+    Returns:
+        The factory function
+    """
+    module_name, _, attribute = agent_spec.partition(":")
+    if not attribute:
+        raise ValueError(
+            f"Invalid agent spec '{agent_spec}', expected 'package.module:factory'"
+        )
+    factory = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        factory = getattr(factory, name)
+    return factory
+
+
+class QueueWorker:
+    def __init__(
+        self,
+        broker: Broker,
+        agent_specs: list[str],
+        worker_id: Optional[str] = None,
+        lease_secs: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        """
+        Args:
+            broker: The broker to pull jobs from
+            agent_specs: The agent specs the worker runs, only the jobs of these specs are leased. The agent spec of
+                a job leased anyway, eg by a broker ignoring the filter, is never imported and the job is failed.
+            worker_id: The id of the worker. Defaults to `<hostname>-<pid>-<object id>`.
+            lease_secs: The lease duration of a job. The lease is extended every `lease_secs / 3` while the agent
+                is running.
+            poll_interval: Seconds to sleep when there are no jobs available
+        """
+        self.broker = broker
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+        )
+        if not agent_specs:
+            raise ValueError("A worker needs the list of the agent specs it runs")
+        self.agent_specs = list(agent_specs)
+        self.lease_secs = lease_secs
+        self.poll_interval = poll_interval
+        # agents are built once per spec and reused across jobs
+        self._agents: dict[str, Agent] = {}
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(worker_id='{self.worker_id}', broker={self.broker})"
+
+    def _get_agent(self, agent_spec: str) -> Agent:
+        if agent_spec not in self.agent_specs:
+            raise ValueError(
+                f"Agent spec '{agent_spec}' isn't allowed on worker '{self.worker_id}'"
+            )
+        if agent_spec not in self._agents:
+            self._agents[agent_spec] = load_agent_factory(agent_spec)()
+        return self._agents[agent_spec]
+
+    def _keep_lease(self, job: Job, done: threading.Event) -> None:
+        while not done.wait(self.lease_secs / 3):
+            if not self.broker.extend_lease(job.id, self.worker_id, self.lease_secs):
+                logger.error(
+                    f"Worker '{self.worker_id}' lost the lease of job '{job.id}'"
+                )
+                return
+
+    def run_once(self) -> Optional[Job]:
+        """
+        Leases and runs a single job
+
+        Returns:
+            The job that was run or `None` if there weren't any available jobs
+        """
+        job = self.broker.lease(self.worker_id, self.lease_secs, self.agent_specs)
+        if job is None:
+            return None
+
+        logger.debug(
+            f"Worker '{self.worker_id}' running job '{job.id}' ({job.agent_spec})"
+        )
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._keep_lease, args=(job, done), daemon=True
+        )
+        heartbeat.start()
+        try:
+            memory = self._get_agent(job.agent_spec).run(user_input=job.user_input)
+            memories = [as_dict(m) for m in memory.get_memories()]
+            result = {
+                "result": memories[-1].get("content") if memories else None,
+                "memories": memories,
+            }
+            self.broker.complete(job.id, self.worker_id, result)
+        except Exception as e:
+            error = f"{e.__class__.__name__}('{e}')"
+            logger.error(f"Worker '{self.worker_id}' failed job '{job.id}': {error}")
+            self.broker.fail(job.id, self.worker_id, error)
+        finally:
+            done.set()
+            heartbeat.join()
+        return job
+
+    def run(
+        self,
+        stop_event: Optional[threading.Event] = None,
+        max_jobs: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> int:
+        """
+        Runs jobs until stopped
+
+        Args:
+            stop_event: Stops the worker when set
+            max_jobs: Stops the worker after running this many jobs
+            idle_timeout: Stops the worker when there weren't any jobs for this many seconds
+
+        Returns:
+            The number of jobs run
+        """
+        jobs, idle_since = 0, time.monotonic()
+        while not (stop_event and stop_event.is_set()):
+            if max_jobs is not None and jobs >= max_jobs:
+                break
+            if self.run_once():
+                jobs, idle_since = jobs + 1, time.monotonic()
+                continue
+            if (
+                idle_timeout is not None
+                and time.monotonic() - idle_since > idle_timeout
+            ):
+                break
+            time.sleep(self.poll_interval)
+        return jobs
+
+
+def _create_broker(sqlite: Optional[str], broker: Optional[str]) -> Broker:
+    if sqlite:
+        return SQLiteBroker(sqlite)
+    host, _, port = broker.rpartition(":")
+    return RemoteBroker(host, int(port))
+
+
+def _run_worker(
+    sqlite: Optional[str],
+    broker: Optional[str],
+    agent_specs: list[str],
+    lease_secs: float,
+    idle_timeout: Optional[float],
+) -> None:
+    worker = QueueWorker(
+        _create_broker(sqlite, broker), agent_specs=agent_specs, lease_secs=lease_secs
+    )
+    worker.run(idle_timeout=idle_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs agent work queue workers")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--sqlite", help="Path of a SQLite broker database")
+    source.add_argument("--broker", help="host:port of a BrokerServer")
+    parser.add_argument(
+        "--agent-spec",
+        action="append",
+        dest="agent_specs",
+        required=True,
+        help="An agent spec the worker runs, 'package.module:factory', repeat it for several specs",
+    )
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--lease-secs", type=float, default=60.0)
+    parser.add_argument("--idle-timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    worker_args = (
+        args.sqlite,
+        args.broker,
+        args.agent_specs,
+        args.lease_secs,
+        args.idle_timeout,
+    )
+    processes = [
+        multiprocessing.Process(target=_run_worker, args=worker_args)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
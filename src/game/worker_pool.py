@@ -0,0 +1,381 @@
+"""Out-of-process managed agents
+
+A `ProcessAgentRegistry` is an `AgentRegistry` that can also host agents in a pool of worker processes. Each worker
+builds its own `Agent` from a (picklable) factory function, so a heavy sub-agent neither shares the GIL nor the crash
+domain with the manager agent. The registry returns a `RemoteAgent` proxy with the same `name`, `description` and
+`run` interface as an `Agent`, so the multi-agent tools (eg `call_agent_memory_handoff`) keep working unchanged.
+
+The manager and the workers talk over `multiprocessing` pipes with a small message protocol of tuples:
+
+    ("ping",)                          -> ("pong", agent_name, agent_description)
+    ("run", user_input, memories)      -> ("ok", new_memories) | ("error", error_message)
+    ("stop",)
+
+where memories are `(type, content, agent)` tuples. Dead or unresponsive workers are restarted, and the number of
+requests waiting for a free worker is bounded (backpressure).
+
+Only the deadline of a run budget (see `game.budget`) applies to a `RemoteAgent`: the worker is restarted when the
+budget runs out of time. The tokens and LLM calls of the worker aren't charged to the budget.
+"""
+
+import multiprocessing
+import queue
+import threading
+from multiprocessing.connection import Connection
+from typing import Callable, Optional
+
+from game.agent import Agent, AgentRegistry
+from game.budget import Budget, current_budget
+from game.logger import get_logger
+from game.memory.base import Memory
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+
+logger = get_logger(__name__)
+
+AgentFactory = Callable[[], Agent]
+
+
+class WorkerPoolError(Exception):
+    """Raised when a request to a worker process fails"""
+
+
+class WorkerPoolBusyError(WorkerPoolError):
+    """Raised when too many requests are already waiting for a free worker process"""
+
+
+def _to_tuples(memories: list) -> list[tuple]:
+    return [(m["type"], m.get("content"), m.get("agent")) for m in memories]
+
+
+def _to_items(memories: list[tuple]) -> list[MemoryItem]:
+    return [MemoryItem(t, content=c, agent=a) for t, c, a in memories]
+
+
+def _worker_main(conn: Connection, agent_factory: AgentFactory) -> None:
+    """The loop of a worker process: builds the agent once and serves requests until it's stopped"""
+    agent = agent_factory()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+
+        command = message[0]
+        if command == "stop":
+            return
+        if command == "ping":
+            conn.send(("pong", agent.name, agent.description))
+        elif command == "run":
+            _, user_input, memories = message
+            memory = DictMemory()
+            memory.items = _to_items(memories)
+            try:
+                agent.run(user_input=user_input, memory=memory)
+                conn.send(("ok", _to_tuples(memory.items[len(memories) :])))
+            except Exception as e:
+                conn.send(("error", f"{e.__class__.__name__}('{e}')"))
+        else:
+            conn.send(("error", f"Unknown command '{command}'"))
+
+
+class _Worker:
+    def __init__(self, mp_context, agent_factory: AgentFactory, name: str):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+            target=_worker_main,
+            args=(child_conn, agent_factory),
+            name=name,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def request(self, message: tuple, timeout: Optional[float]) -> tuple:
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"No response from worker within {timeout} seconds")
+        return self.conn.recv()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        try:
+            self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class AgentWorkerPool:
+    """A pool of worker processes hosting instances of the same agent"""
+
+    def __init__(
+        self,
+        agent_factory: AgentFactory,
+        workers: int = 1,
+        max_pending: Optional[int] = None,
+        acquire_timeout: Optional[float] = None,
+        run_timeout: Optional[float] = None,
+        ping_timeout: float = 30.0,
+        mp_context: Optional[str] = None,
+    ):
+        """
+        Args:
+            agent_factory: A picklable function (eg defined at module level) that builds the agent in each worker
+            workers: The number of worker processes
+            max_pending: The maximum number of requests waiting for a free worker. Defaults to `workers`.
+            acquire_timeout: Seconds to wait for a free worker before failing. `None` waits forever.
+            run_timeout: Seconds to wait for an agent run before the worker is restarted. `None` waits forever.
+            ping_timeout: Seconds to wait for a worker to answer a health check
+            mp_context: The `multiprocessing` start method, eg `"spawn"`. Defaults to the platform default.
+        """
+        self.agent_factory = agent_factory
+        self.acquire_timeout = acquire_timeout
+        self.run_timeout = run_timeout
+        self.ping_timeout = ping_timeout
+        self.restarts = 0
+        self._mp_context = multiprocessing.get_context(mp_context)
+        max_pending = workers if max_pending is None else max_pending
+        self._pending = threading.BoundedSemaphore(workers + max_pending)
+        self._idle = queue.Queue()
+        self._workers = []
+        self._closed = False
+        for i in range(workers):
+            worker = self._start_worker(i)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+        _, self.agent_name, self.agent_description = self._request(
+            ("ping",), self.ping_timeout
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(agent='{self.agent_name}', workers={len(self._workers)})"
+
+    def _start_worker(self, index: int) -> _Worker:
+        return _Worker(
+            self._mp_context,
+            self.agent_factory,
+            name=f"agent-worker-{getattr(self.agent_factory, '__name__', 'agent')}-{index}",
+        )
+
+    def _restart_worker(self, worker: _Worker) -> _Worker:
+        logger.error(f"Restarting worker process '{worker.process.name}'")
+        worker.stop(timeout=0)
+        index = self._workers.index(worker)
+        self._workers[index] = self._start_worker(index)
+        self.restarts += 1
+        return self._workers[index]
+
+    def _request(self, message: tuple, timeout: Optional[float]) -> tuple:
+        if self._closed:
+            raise WorkerPoolError("Worker pool is shut down")
+        if not self._pending.acquire(blocking=False):
+            raise WorkerPoolBusyError(f"Too many pending requests for {self}")
+        try:
+            try:
+                worker = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                raise WorkerPoolBusyError(
+                    f"No free worker within {self.acquire_timeout} seconds"
+                )
+            try:
+                return worker.request(message, timeout)
+            except (EOFError, OSError, TimeoutError) as e:
+                # the worker crashed or hangs, replace it so the pool keeps its capacity
+                worker = self._restart_worker(worker)
+                raise WorkerPoolError(
+                    f"Worker failed with error: {e.__class__.__name__}('{e}')"
+                ) from e
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._pending.release()
+
+    def run(
+        self, user_input: str, memories: list, timeout: Optional[float] = None
+    ) -> list[MemoryItem]:
+        """
+        Runs the agent in a worker process
+
+        Args:
+            user_input: The task of the agent
+            memories: The memories the agent starts with
+            timeout: Seconds to wait for the run before the worker is restarted. Defaults to `run_timeout`.
+
+        Returns:
+            The memories added by the agent
+
+        Raises:
+            WorkerPoolBusyError: When there are too many pending requests
+            WorkerPoolError: When the agent run fails or the worker crashes
+        """
+        status, payload = self._request(
+            ("run", user_input, _to_tuples(memories)),
+            self.run_timeout if timeout is None else timeout,
+        )
+        if status != "ok":
+            raise WorkerPoolError(payload)
+        return _to_items(payload)
+
+    def health_check(self) -> int:
+        """
+        Pings all idle workers and restarts the ones that are dead or unresponsive
+
+        Returns:
+            The number of restarted workers
+        """
+        restarted = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not worker.process.is_alive():
+                    raise EOFError("Worker process is dead")
+                worker.request(("ping",), self.ping_timeout)
+            except (EOFError, OSError, TimeoutError):
+                worker = self._restart_worker(worker)
+                restarted += 1
+            finally:
+                self._idle.put(worker)
+        return restarted
+
+    def shutdown(self) -> None:
+        """Stops all worker processes"""
+        self._closed = True
+        for worker in self._workers:
+            worker.stop()
+
+
+class RemoteAgent:
+    """A proxy of an agent hosted in an `AgentWorkerPool` with the same interface as `Agent`"""
+
+    def __init__(self, pool: AgentWorkerPool, description: Optional[str] = None):
+        self.pool = pool
+        self._description = description
+
+    @property
+    def name(self) -> str:
+        return self.pool.agent_name
+
+    @property
+    def metrics_label(self) -> str:
+        # a pool hosts a single agent for its whole life, so its name doesn't grow the metrics
+        return self.pool.agent_name
+
+    @property
+    def description(self) -> str:
+        return self._description or self.pool.agent_description
+
+    def __repr__(self):
+        return f"RemoteAgent(name='{self.name}', description='{self.description}')"
+
+    def run(
+        self,
+        user_input: str,
+        memory: Optional[Memory] = None,
+        action_context_props: Optional[dict] = None,
+        budget: Optional[Budget] = None,
+    ) -> Memory:
+        """
+        Runs the agent in a worker process. The memories added by the agent are appended to `memory`.
+
+        Args:
+            user_input: The initial user message request
+            memory: An optional `Memory` object. If `None` an in-memory dictionary based memory will be used
+            action_context_props: Not supported, the properties can't be sent to the worker process. They are
+                ignored with a warning.
+            budget: Only its deadline applies, the worker is restarted when it runs out of time. Defaults to the
+                current budget (see `game.budget`).
+
+        Returns:
+            The `Memory` object of the agent with all messages when the agent terminates
+
+        Raises:
+            BudgetExceeded: If the budget ran out before the run
+            WorkerPoolError: When the agent run fails, the worker crashes or the budget runs out of time
+        """
+        if action_context_props:
+            logger.warning(
+                f"{self} ignores the action context properties {sorted(action_context_props)}, "
+                f"they can't be sent to the worker process"
+            )
+        budget = budget if budget is not None else current_budget()
+        timeout = None
+        if budget is not None:
+            budget.check()
+            timeout = budget.remaining()["seconds"]
+            if self.pool.run_timeout is not None and timeout is not None:
+                timeout = min(timeout, self.pool.run_timeout)
+        memory = memory if memory is not None else DictMemory()
+        for item in self.pool.run(user_input, memory.get_memories(), timeout=timeout):
+            memory.add_memory(item)
+        return memory
+
+
+class ProcessAgentRegistry(AgentRegistry):
+    """An `AgentRegistry` that can host agents in pools of worker processes as well as in-process agents"""
+
+    def __init__(
+        self,
+        managed_agents: Optional[list[Agent]] = None,
+        mp_context: Optional[str] = None,
+    ):
+        super().__init__(managed_agents)
+        self.mp_context = mp_context
+        self.pools: dict[str, AgentWorkerPool] = {}
+        self._health_check_stop = threading.Event()
+
+    def register_process_agent(
+        self,
+        agent_factory: AgentFactory,
+        workers: int = 1,
+        description: Optional[str] = None,
+        **pool_kwargs,
+    ) -> RemoteAgent:
+        """
+        Starts a pool of worker processes hosting the agent built by `agent_factory` and registers it
+
+        Args:
+            agent_factory: A picklable function (eg defined at module level) that builds the agent
+            workers: The number of worker processes
+            description: The description of the agent. Defaults to the description of the hosted agent.
+            pool_kwargs: Additional keyword arguments of `AgentWorkerPool`
+
+        Returns:
+            The `RemoteAgent` proxy of the hosted agent
+        """
+        pool = AgentWorkerPool(
+            agent_factory, workers=workers, mp_context=self.mp_context, **pool_kwargs
+        )
+        agent = RemoteAgent(pool, description=description)
+        self.pools[agent.name] = pool
+        self.register_agent(agent)
+        return agent
+
+    def health_check(self) -> int:
+        """Health checks all worker pools, returns the number of restarted workers"""
+        return sum(pool.health_check() for pool in self.pools.values())
+
+    def start_health_checks(self, interval_secs: float = 30.0) -> threading.Thread:
+        """Starts a daemon thread that health checks the worker pools every `interval_secs`"""
+
+        def _loop():
+            while not self._health_check_stop.wait(interval_secs):
+                if restarted := self.health_check():
+                    logger.error(f"Health check restarted {restarted} worker(s)")
+
+        thread = threading.Thread(target=_loop, name="agent-health-check", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self) -> None:
+        """Stops the health checks and all worker processes"""
+        self._health_check_stop.set()
+        for pool in self.pools.values():
+            pool.shutdown()
@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from game.action import tool
+from game.action.context import ActionContext
+from game.action.library.multi_agent import (
+    call_agent_memory_handoff,
+    call_agent_with_reflection,
+    call_agents_parallel,
+)
+from game.memory import Memory
+from game.memory.dict_memory import DictMemory
+from game.prompt import Prompt
+from tests.unit.helpers import ScriptedLlm, make_agent
+
+
+class DummyAgent:
+    description = "Does the work"
+
+    def __init__(self, name: str = "worker", sleep_secs: float = 0.0):
+        self.name = name
+        self.sleep_secs = sleep_secs
+        self.seen_memories = None
+
+    def run(self, user_input: str, memory: Memory = None) -> Memory:
+        memory = memory or DictMemory()
+        self.seen_memories = len(memory.get_memories())
+        time.sleep(self.sleep_secs)
+        memory.add_memory({"type": "user", "content": user_input})
+        memory.add_memory({"type": "environment", "content": "done"})
+        return memory
+
+
+class DummyAgentRegistry:
+    def __init__(self, *agents):
+        self.agents = {agent.name: agent for agent in agents}
+
+    def get_agent(self, name: str):
+        return self.agents.get(name)
+
+    def get_agent_descriptions(self):
+        return [{name: agent.description} for name, agent in self.agents.items()]
+
+
+@pytest.fixture
+def agent():
+    return DummyAgent()
+
+
+@pytest.fixture
+def action_context(agent):
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "hi"})
+    return ActionContext(
+        {"memory": memory, "agent_registry": DummyAgentRegistry(agent)}
+    )
+
+
+def test_call_agent_memory_handoff(agent, action_context):
+    result = call_agent_memory_handoff(action_context, "worker", "do it")
+    assert result["success"] and result["result"] == "done"
+    assert agent.seen_memories == 1
+    assert [m["content"] for m in action_context.get_memory().items] == [
+        "hi",
+        "do it",
+        "done",
+    ]
+
+
+def test_call_agent_with_reflection(agent, action_context):
+    result = call_agent_with_reflection(action_context, "worker", "do it")
+    assert result["success"] and result["memories_added"] == 2
+    assert agent.seen_memories == 0
+    assert [m["type"] for m in action_context.get_memory().items] == [
+        "user",
+        "worker_thought",
+        "worker_thought",
+    ]
+
+
+def test_call_agents_parallel_runs_agents_concurrently():
+    agents = [DummyAgent(f"worker_{i}", sleep_secs=0.2) for i in range(3)]
+    action_context = ActionContext({"agent_registry": DummyAgentRegistry(*agents)})
+
+    tic = time.perf_counter()
+    result = call_agents_parallel(
+        action_context,
+        [{"agent_name": a.name, "task": f"task {a.name}"} for a in agents]
+        + [{"agent_name": "missing", "task": "task"}],
+    )
+    assert time.perf_counter() - tic < 0.5
+
+    assert not result["success"]
+    assert [r["success"] for r in result["results"]] == [True, True, True, False]
+    assert [r["agent"] for r in result["results"]][:3] == [a.name for a in agents]
+    # every agent got its own memory
+    assert all(a.seen_memories == 0 for a in agents)
+
+
+def test_call_agents_parallel_timeout():
+    agents = [DummyAgent("fast"), DummyAgent("slow", sleep_secs=1.0)]
+    action_context = ActionContext(
+        {"agent_registry": DummyAgentRegistry(*agents), "agent_timeout_secs": 0.1}
+    )
+    result = call_agents_parallel(
+        action_context,
+        [
+            {"agent_name": "fast", "task": "task"},
+            {"agent_name": "slow", "task": "task"},
+        ],
+    )
+    fast, slow = result["results"]
+    assert fast["success"] and fast["result"] == "done"
+    assert not slow["success"] and "timed out" in slow["error"]
+
+
+class SlowLlm(ScriptedLlm):
+    def __call__(self, prompt: Prompt) -> str:
+        time.sleep(0.05)
+        return super().__call__(prompt)
+
+
+@tool()
+def work() -> str:
+    """Works a bit more"""
+    return "worked"
+
+
+def test_call_agents_parallel_cancels_the_agents_that_timed_out():
+    worker = make_agent(
+        SlowLlm({"tool": "work", "args": {}}),
+        name="worker",
+        tools=[work],
+        max_iterations=100,
+    )
+    action_context = ActionContext(
+        {"agent_registry": DummyAgentRegistry(worker), "agent_timeout_secs": 0.2}
+    )
+
+    result = call_agents_parallel(
+        action_context, [{"agent_name": "worker", "task": "work forever"}]
+    )
+
+    assert "timed out" in result["results"][0]["error"]
+    time.sleep(0.2)
+    calls = worker.llm.calls
+    time.sleep(0.3)
+    # the agent stopped instead of running until `max_iterations`
+    assert worker.llm.calls == calls < 10
+
+
+class FailingAgent(DummyAgent):
+    def run(self, user_input: str, memory: Memory = None) -> Memory:
+        memory.add_memory({"type": "user", "content": user_input})
+        memory.add_memory({"type": "environment", "content": "half done"})
+        raise RuntimeError("crashed")
+
+
+def test_call_agent_memory_handoff_keeps_the_partial_work():
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "hi"})
+    action_context = ActionContext(
+        {"memory": memory, "agent_registry": DummyAgentRegistry(FailingAgent())}
+    )
+
+    result = call_agent_memory_handoff(action_context, "worker", "do it")
+
+    assert not result["success"] and result["error"] == "crashed"
+    assert [m["content"] for m in memory.items] == ["hi", "do it", "half done"]
@@ -0,0 +1,58 @@
+"""Test doubles and factories shared by the unit tests"""
+
+import json
+import threading
+from typing import Union
+
+from game import budget
+from game.agent import Agent
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.prompt import Prompt
+
+
+class ScriptedLlm(Llm):
+    """Returns the scripted responses in order then repeats the last one, the dicts being serialised to JSON"""
+
+    def __init__(self, *responses: Union[str, dict], tokens: int = 0) -> None:
+        self.responses = [r if isinstance(r, str) else json.dumps(r) for r in responses]
+        # charged to the current budget at every call, like `LiteLlm` reporting its usage
+        self.tokens = tokens
+        self.calls = 0
+        self.prompts: list[Prompt] = []
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return "ScriptedLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        with self._lock:
+            response = self.responses[min(self.calls, len(self.responses) - 1)]
+            self.calls += 1
+            self.prompts.append(prompt)
+        if self.tokens:
+            budget.charge(tokens=self.tokens)
+        return response
+
+
+TERMINATE = {"tool": "terminate", "args": {"message": "done"}}
+
+
+def json_action(tool_name: str, args: dict) -> str:
+    """A response of `AgentJsonActionLanguage` calling `tool_name`"""
+    return f"```action\n{json.dumps({'tool': tool_name, 'args': args})}\n```"
+
+
+def make_agent(llm: Llm, **kwargs) -> Agent:
+    """An agent with a single goal and the function calling language, unless overridden by the `kwargs`"""
+    return Agent(
+        **{
+            "goals": [Goal(priority=1, name="Work", description="Do the work")],
+            "agent_language": AgentFunctionCallingActionLanguage(),
+            "debug_log_memory": False,
+            **kwargs,
+        },
+        llm=llm,
+    )
@@ -1,12 +1,17 @@
 import json
+from unittest.mock import Mock
 
 import pytest
 
 from game.action import tool
 from game.action.python_registry import PythonActionRegistry
 from game.action.registry import ActionRegistry
+from game.agent import Agent
 from game.goal import Goal
 from game.language import AgentJsonActionLanguage
+from game.language.json_action_language import STRUCTURED_OUTPUT_KEY
+from game.llm.base import Llm
+from game.llm.litellm_completion import LiteLlm
 from game.memory.dict_memory import DictMemory
 from game.prompt import Prompt
 
@@ -73,3 +78,94 @@ def test_agent_json_action_language_construct_prompt(sample_action, sample_goal)
     assert isinstance(prompt, Prompt)
     assert prompt.messages[0]["role"] == "system"
     assert prompt.messages[-1]["content"] == memory.get_memories()[-1]["content"]
+
+
+def test_structured_output_prompt_has_the_action_schema(sample_action, sample_goal):
+    language = AgentJsonActionLanguage(structured_output=True)
+
+    prompt = language.construct_prompt(
+        actions=[sample_action], goals=[sample_goal], memory=DictMemory()
+    )
+
+    schema = prompt.response_format["json_schema"]["schema"]
+    (branch,) = schema["properties"]["action"]["anyOf"]
+    assert branch["properties"]["tool"] == {"type": "string", "enum": ["my_tool"]}
+    assert branch["properties"]["args"] == sample_action.parameters
+    assert '"thought"' in prompt.messages[0]["content"]
+    assert language.get_response_format([sample_action]) is prompt.response_format
+    assert (
+        AgentJsonActionLanguage()
+        .construct_prompt(
+            actions=[sample_action], goals=[sample_goal], memory=DictMemory()
+        )
+        .response_format
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "response, mode",
+    [
+        (
+            json.dumps({"thought": "Easy", "action": EXPECTED_EXTRACTED_TOOL}),
+            "structured",
+        ),
+        (
+            f"Easy\n```action\n{json.dumps(EXPECTED_EXTRACTED_TOOL)}\n```",
+            "fallback",
+        ),
+        (
+            f"```json\n{json.dumps({'thought': 'Easy', 'action': EXPECTED_EXTRACTED_TOOL})}\n```",
+            "fallback",
+        ),
+    ],
+)
+def test_structured_output_parse_response(response, mode):
+    language = AgentJsonActionLanguage(structured_output=True)
+
+    assert language.parse_response(response) == {
+        **EXPECTED_EXTRACTED_TOOL,
+        STRUCTURED_OUTPUT_KEY: mode,
+    }
+
+
+def test_litellm_drops_unsupported_response_formats(sample_action):
+    response_format = AgentJsonActionLanguage().get_response_format([sample_action])
+    prompt = Prompt(messages=[], response_format=response_format)
+
+    assert LiteLlm("gpt-4o-mini")._response_format(prompt) is response_format
+    assert LiteLlm("openai/unknown-model")._response_format(prompt) is None
+    assert LiteLlm("gpt-4o-mini")._response_format(Prompt(messages=[])) is None
+
+
+@pytest.mark.parametrize("repair, retries_avoided", [(False, 1), (True, 0)])
+def test_agent_counts_the_retries_avoided_by_structured_output(repair, retries_avoided):
+    @tool()
+    def search(query: str) -> str:
+        """Searches the web"""
+        return query
+
+    responses = [
+        json.dumps(
+            {"thought": "Search", "action": {"tool": "search", "args": {"query": "x"}}}
+        ),
+        '```action\n{"tool": "terminate", "args": {"message": "Done"}}\n```',
+    ]
+    llm = Mock(spec=Llm, side_effect=responses)
+    llm.name = "mock"
+    agent = Agent(
+        goals=[Goal(priority=1, name="Search", description="Search the web")],
+        agent_language=AgentJsonActionLanguage(structured_output=True, repair=repair),
+        llm=llm,
+        tools=[search],
+        debug_log_memory=False,
+    )
+
+    agent.run("Search x")
+
+    assert agent.structured_output_stats.to_dict() == {
+        "responses": 2,
+        "structured": 1,
+        "fallback": 1,
+        "retries_avoided": retries_avoided,
+    }
@@ -0,0 +1,155 @@
+import json
+from json import JSONDecodeError
+
+import pytest
+
+from game import metrics
+from game.action import tool
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.language.exceptions import ActionNotPresentInResponseError
+from game.language.repair import REPAIRS_KEY, match_tool_name, repair_json
+from tests.unit.helpers import ScriptedLlm, make_agent
+
+ACTION = {"tool": "search", "args": {"query": "it's", "exact": True, "page": None}}
+
+
+@pytest.mark.parametrize(
+    "text, repairs",
+    [
+        (json.dumps(ACTION), []),
+        (
+            """{"tool": "search", "args": {"query": "it's", "exact": True, "page": None}}""",
+            ["python_literals"],
+        ),
+        (
+            """{'tool': 'search', 'args': {'query': 'it\\'s', 'exact': true, 'page': null}}""",
+            ["single_quotes"],
+        ),
+        (
+            """{"tool": "search", "args": {"query": "it's", "exact": true, "page": null,},}""",
+            ["trailing_comma"],
+        ),
+        (
+            """{tool: "search", args: {query: "it's", exact: true, page: null}}""",
+            ["unquoted_keys"],
+        ),
+        (
+            """{"tool": "search", "args": {"query": "it's", "exact": true, "page": null""",
+            ["missing_brackets"],
+        ),
+        (
+            """Here you go: {"tool": "search", "args": {"query": "it's", "exact": true, "page": null}} Done.""",
+            ["extracted_json"],
+        ),
+    ],
+)
+def test_repair_json(text, repairs):
+    assert repair_json(text) == (ACTION, repairs)
+
+
+def test_repair_json_escapes_strings():
+    assert repair_json("""{'a': 'say "hi"\nbye'""") == (
+        {"a": 'say "hi"\nbye'},
+        ["single_quotes", "control_characters", "missing_brackets"],
+    )
+
+
+@pytest.mark.parametrize("text", ["Hi", "{'a': }", ""])
+def test_repair_json_raises_when_it_cannot_repair(text):
+    with pytest.raises(JSONDecodeError):
+        repair_json(text)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("search", "search"),
+        ("Search", "search"),
+        ("get-weather", "get_weather"),
+        ("getWeather", "get_weather"),
+        ("seach", "search"),
+        ("weather", None),
+        ("delete", None),
+    ],
+)
+def test_match_tool_name(name, expected):
+    assert match_tool_name(name, ["search", "get_weather", "terminate"]) == expected
+
+
+def test_json_language_repairs_the_action_block():
+    language = AgentJsonActionLanguage()
+
+    invocation = language.parse_response(
+        "Let me search.\n```action\n{'tool': 'search', 'args': {'query': 'x',}}\n"
+    )
+
+    assert invocation == {
+        "tool": "search",
+        "args": {"query": "x"},
+        REPAIRS_KEY: ["single_quotes", "trailing_comma"],
+    }
+    assert AgentJsonActionLanguage().parse_response(
+        '```action\n{"tool": "search", "args": {}}\n```'
+    ) == {"tool": "search", "args": {}}
+
+
+def test_json_language_without_repair_raises():
+    with pytest.raises(ActionNotPresentInResponseError):
+        AgentJsonActionLanguage(repair=False).parse_response(
+            "```action\n{'tool': 'search', 'args': {}}\n```"
+        )
+
+
+def test_function_calling_language_repairs_the_arguments():
+    response = json.dumps({"tool": "search", "args": "{'query': 'x', 'exact': True"})
+
+    invocation = AgentFunctionCallingActionLanguage().parse_response(response)
+
+    assert invocation["args"] == {"query": "x", "exact": True}
+    assert invocation[REPAIRS_KEY] == [
+        "single_quotes",
+        "python_literals",
+        "missing_brackets",
+    ]
+
+
+@pytest.mark.parametrize(
+    "response, repair", [("[1, 2,", True), ("[1, 2]", True), ("[1, 2]", False)]
+)
+def test_function_calling_language_rejects_tool_calls_that_are_not_objects(
+    response, repair
+):
+    with pytest.raises(ActionNotPresentInResponseError):
+        AgentFunctionCallingActionLanguage(repair=repair).parse_response(response)
+
+
+@tool()
+def search(query: str) -> str:
+    """Searches the web"""
+    return f"Results for {query}"
+
+
+def test_agent_repairs_responses_instead_of_spending_iterations():
+    metrics.REGISTRY.clear()
+    llm = ScriptedLlm(
+        "```action\n{'tool': 'Search', 'args': {'query': 'python',}}\n```",
+        '```action\n{"tool": "terminate", "args": {"message": "Done"}',
+    )
+    agent = make_agent(
+        llm,
+        name="repairing",
+        agent_language=AgentJsonActionLanguage(),
+        tools=[search],
+    )
+
+    memory = agent.run("Search python")
+
+    assert llm.calls == 2
+    assert "Results for python" in memory.get_memories()[2]["content"]
+    stats = agent.repair_stats.to_dict()
+    assert (stats["responses"], stats["repaired"], stats["failed"]) == (2, 2, 0)
+    assert stats["iterations_saved"] == 2
+    assert stats["repairs"]["tool_name"] == 1
+    assert stats["repairs"]["missing_brackets"] == 1
+    assert metrics.PARSE_REPAIR_SAVED_ITERATIONS.get(agent="repairing") == 2
+    assert metrics.PARSE_REPAIRS.get(agent="repairing", repair="tool_name") == 1
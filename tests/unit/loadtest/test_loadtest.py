@@ -0,0 +1,147 @@
+import json
+import random
+import urllib.error
+import urllib.request
+
+import pytest
+
+from game.action import tool
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.llm.litellm_completion import LiteLlm
+from game.loadtest.harness import percentile, run_load
+from game.loadtest.mock_server import (
+    LatencyModel,
+    MockCompletionServer,
+    text,
+    tool_call,
+)
+from game.template import AgentTemplate
+
+
+@tool()
+def lookup(query: str) -> str:
+    """Looks up the query"""
+    return query
+
+
+@pytest.fixture
+def server():
+    server = MockCompletionServer(
+        script=[tool_call("lookup", query="q"), tool_call("terminate", message="done")],
+        latency=LatencyModel(median=0.01),
+        seed=0,
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+def _post(server: MockCompletionServer, request: dict) -> tuple[int, dict, dict]:
+    http_request = urllib.request.Request(
+        f"{server.base_url}/chat/completions",
+        data=json.dumps(request).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return response.status, dict(response.headers), json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), json.load(e)
+
+
+def _template(
+    server: MockCompletionServer, language=AgentFunctionCallingActionLanguage
+):
+    return AgentTemplate(
+        name="load_test_agent",
+        goals=[Goal(priority=1, name="Answer", description="Answer the user")],
+        agent_language=language(),
+        llm=LiteLlm(
+            model="openai/gpt-4o-mini",
+            base_url=server.base_url,
+            api_key="mock",
+            max_reties=0,
+        ),
+        tools=[lookup],
+        max_iterations=4,
+        debug_log_memory=False,
+    )
+
+
+def test_scripted_responses(server):
+    tools = [{"type": "function", "function": {"name": "lookup"}}]
+    _, _, first = _post(server, {"messages": [{"role": "user"}], "tools": tools})
+    _, _, second = _post(
+        server,
+        {"messages": [{"role": "user"}, {"role": "assistant"}], "tools": tools},
+    )
+    _, _, without_tools = _post(server, {"messages": [{"role": "user"}]})
+
+    assert first["choices"][0]["message"]["tool_calls"][0]["function"] == {
+        "name": "lookup",
+        "arguments": '{"query": "q"}',
+    }
+    assert second["choices"][0]["message"]["tool_calls"][0]["function"]["name"] == (
+        "terminate"
+    )
+    assert without_tools["choices"][0]["message"]["content"].startswith("```action")
+    assert first["usage"]["completion_tokens"] > 0
+    assert server.stats.completions == 3
+
+
+def test_error_injection():
+    server = MockCompletionServer(
+        script=[text("hi")], rate_limit_rate=0.5, error_rate=0.5, seed=0
+    )
+    server.start()
+    try:
+        statuses = [_post(server, {"messages": []})[0] for _ in range(20)]
+        assert set(statuses) == {429, 500}
+        assert server.stats.rate_limited == statuses.count(429)
+        assert server.stats.completions == 0
+    finally:
+        server.stop()
+
+
+def test_latency_model():
+    rng = random.Random(0)
+    assert LatencyModel(median=0.1, tokens_per_sec=10).sample(5, rng) == 0.6
+    samples = [
+        LatencyModel("lognormal", median=0.1, sigma=0.5).sample(0, rng)
+        for _ in range(1_000)
+    ]
+    assert 0.08 < sorted(samples)[500] < 0.12
+    with pytest.raises(ValueError):
+        LatencyModel("pareto").sample(0, rng)
+
+
+@pytest.mark.parametrize(
+    "language", [AgentFunctionCallingActionLanguage, AgentJsonActionLanguage]
+)
+def test_run_load(server, language):
+    report = run_load(
+        _template(server, language).spawn,
+        sessions=6,
+        concurrency=3,
+        server_stats=server.stats.to_dict,
+    )
+    assert (report.succeeded, report.failed) == (6, 0)
+    assert report.server["completions"] == 12
+    assert report.latency_secs["p50"] >= 0.02
+    assert report.throughput_per_sec > 0 and report.max_rss_mb > 0
+
+
+def test_run_load_failures():
+    server = MockCompletionServer(error_rate=1.0)
+    server.start()
+    try:
+        report = run_load(_template(server).spawn, sessions=2, concurrency=2)
+    finally:
+        server.stop()
+    assert report.failed == 2 and report.errors
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (50, 90, 99, 100)] == [50, 90, 99, 100]
@@ -0,0 +1,49 @@
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem, as_dict
+
+RESULT = {"tool_executed": True, "action": "my_tool", "result": "42"}
+# the canonical JSON of `game.codec`
+RESULT_JSON = '{"tool_executed":true,"action":"my_tool","result":"42"}'
+
+
+def test_memory_item_lazily_serialises_payload():
+    item = MemoryItem("environment", payload=RESULT, agent="agent")
+    assert not item.is_serialised
+    assert item["content"] == RESULT_JSON
+    assert item.is_serialised
+
+
+def test_memory_item_behaves_like_a_dict():
+    item = MemoryItem.from_dict({"type": "user", "content": "hi", "extra_key": 1})
+    assert item["type"] == "user"
+    assert item.get("agent") is None
+    assert item.get("missing", "default") == "default"
+    assert {**item} == {"type": "user", "content": "hi", "extra_key": 1}
+    assert item == as_dict(item)
+
+
+def test_memory_item_interns_types():
+    first = MemoryItem("".join(["assis", "tant"]))
+    second = MemoryItem("".join(["assis", "tant"]))
+    assert first.type is second.type
+
+
+def test_memory_item_copy_keeps_payload_pending():
+    item = MemoryItem("environment", payload=RESULT).copy(type="agent_thought")
+    assert item.type == "agent_thought"
+    assert not item.is_serialised
+
+
+def test_languages_consume_memory_items():
+    memory = DictMemory()
+    memory.add_memory(MemoryItem("user", "hi"))
+    memory.add_memory({"type": "assistant", "content": "hello"})
+    memory.add_memory(MemoryItem("environment", payload=RESULT))
+    for language in [AgentJsonActionLanguage(), AgentFunctionCallingActionLanguage()]:
+        prompt = language.construct_prompt(actions=[], goals=[], memory=memory)
+        assert [m["content"] for m in prompt.messages[1:]] == [
+            "hi",
+            "hello",
+            RESULT_JSON,
+        ]
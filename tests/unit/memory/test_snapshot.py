@@ -0,0 +1,53 @@
+import pytest
+
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+from game.memory.snapshot import (
+    SnapshotError,
+    dumps_snapshot,
+    load_snapshot,
+    loads_snapshot,
+    save_snapshot,
+)
+
+
+@pytest.fixture
+def memory() -> DictMemory:
+    memory = DictMemory()
+    memory.add_memory(MemoryItem("user", "Καλημέρα 👋", agent="chat_agent"))
+    memory.add_memory({"type": "assistant", "content": "hi", "score": 0.5})
+    memory.add_memory(MemoryItem("environment", payload={"result": 42}))
+    memory.add_memory({"type": "system", "content": None})
+    return memory
+
+
+@pytest.mark.parametrize("compression_level", [None, 6])
+def test_snapshot_round_trip(memory, compression_level):
+    data = dumps_snapshot(
+        memory,
+        agent_name="chat_agent",
+        iterations=3,
+        properties={"time_zone": "Europe/Berlin", "memory": memory},
+        compression_level=compression_level,
+    )
+    snapshot = loads_snapshot(data)
+
+    assert snapshot.agent_name == "chat_agent"
+    assert snapshot.iterations == 3
+    assert snapshot.properties == {"time_zone": "Europe/Berlin"}
+    assert snapshot.memory.get_memories() == memory.get_memories()
+
+
+def test_snapshot_memory_mapped_load_is_lazy(memory, tmp_path):
+    path = tmp_path / "session.snap"
+    assert save_snapshot(path, memory) == path.stat().st_size
+
+    restored = load_snapshot(path).memory.get_memories()
+    assert not restored[0].is_serialised
+    assert restored[0]["content"] == "Καλημέρα 👋"
+    assert restored[0].is_serialised
+
+
+def test_invalid_snapshot():
+    with pytest.raises(SnapshotError):
+        loads_snapshot(b"{}" * 20)
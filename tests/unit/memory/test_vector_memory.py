@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from game.language import AgentFunctionCallingActionLanguage, AgentJsonActionLanguage
+from game.memory.embedding import HashingEmbedder
+from game.memory.vector_index import VectorIndex
+from game.memory.vector_memory import VectorMemory
+
+PAST_MEMORIES = [
+    {"type": "user", "content": "Plan a trip to Paris"},
+    {"type": "environment", "content": "The weather in Berlin is rainy"},
+    {"type": "environment", "content": "The Eiffel tower in Paris opens at 9am"},
+    {"type": "environment", "content": "Python 3.12 was released in October"},
+    {"type": "assistant", "content": "Booking a hotel near the Louvre"},
+    {"type": "environment", "content": "Hotel booked"},
+]
+
+
+def test_hashing_embedder_is_normalised_and_deterministic():
+    embedder = HashingEmbedder(dim=64)
+    vectors = embedder.embed(["hello world", "hello world", ""])
+    assert vectors.shape == (3, 64)
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_vector_index_grows_and_returns_top_k():
+    index = VectorIndex(dim=4, initial_capacity=1, use_idf=False)
+    index.add(np.eye(4, dtype=np.float32))
+    assert len(index) == 4 and index.capacity >= 4
+
+    indices, scores = index.search(np.array([0.0, 0.0, 1.0, 0.1]), top_k=2)
+    assert list(indices) == [2, 3]
+    assert scores[0] > scores[1]
+
+
+def test_vector_index_memory_mapped_persistence(tmp_path):
+    index = VectorIndex(dim=3, path=tmp_path / "vectors.f32", initial_capacity=1)
+    index.add(np.eye(3, dtype=np.float32))
+    index.flush()
+
+    reloaded = VectorIndex(dim=3, path=tmp_path / "vectors.f32", size=3)
+    np.testing.assert_array_equal(reloaded.vectors, np.eye(3, dtype=np.float32))
+
+
+def test_vector_memory_search():
+    memory = VectorMemory()
+    memory.add_memories(PAST_MEMORIES)
+    (score, best), *_ = memory.search("when does the eiffel tower open", top_k=2)
+    assert best == PAST_MEMORIES[2]
+    assert score > 0
+
+
+def test_vector_memory_relevant_memories_are_chronological():
+    memory = VectorMemory(recent_window=1)
+    memory.add_memories(PAST_MEMORIES)
+    relevant = memory.get_relevant_memories(top_k=1, query="Eiffel tower Paris")
+    assert relevant == [PAST_MEMORIES[0], PAST_MEMORIES[2], PAST_MEMORIES[-1]]
+
+
+def test_vector_memory_reloads_from_path(tmp_path):
+    memory = VectorMemory(path=tmp_path)
+    memory.add_memories(PAST_MEMORIES)
+
+    reloaded = VectorMemory(path=tmp_path)
+    assert reloaded.get_memories() == PAST_MEMORIES
+    assert reloaded.search("python release", top_k=1)[0][1] == PAST_MEMORIES[3]
+
+
+@pytest.mark.parametrize(
+    "language",
+    [
+        AgentJsonActionLanguage(memory_top_k=1),
+        AgentFunctionCallingActionLanguage(memory_top_k=1),
+    ],
+)
+def test_language_renders_only_relevant_memories(language):
+    memory = VectorMemory(recent_window=2)
+    memory.add_memories(PAST_MEMORIES)
+    prompt = language.construct_prompt(actions=[], goals=[], memory=memory)
+    # system message + task + 1 retrieved memory + 2 recent memories
+    assert len(prompt.messages) == 5
+    assert prompt.messages[-1]["content"] == "Hotel booked"
@@ -0,0 +1,92 @@
+from game.memory.dict_memory import DictMemory
+from game.memory.view import MemorySequence, MemoryView
+
+
+def _memory() -> DictMemory:
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "task", "agent": "manager"})
+    memory.add_memory({"type": "assistant", "content": "thinking", "agent": "manager"})
+    memory.add_memory({"type": "environment", "content": "result", "agent": "worker"})
+    return memory
+
+
+def test_fork_shares_prefix_and_isolates_suffix():
+    memory = _memory()
+    view = memory.fork()
+    assert isinstance(view, MemoryView)
+
+    view.add_memory({"type": "assistant", "content": "new"})
+    memory.add_memory({"type": "user", "content": "later"})
+
+    assert [m["content"] for m in view.get_memories()] == [
+        "task",
+        "thinking",
+        "result",
+        "new",
+    ]
+    assert len(memory.get_memories()) == 4
+    # the prefix items are shared, not copied
+    assert view.items[0] is memory.items[0]
+
+
+def test_filtered_views():
+    memory = _memory()
+    assert [m["type"] for m in memory.fork(types=["user"]).items] == ["user"]
+    assert [m["type"] for m in memory.fork(exclude_types=["user"]).items] == [
+        "assistant",
+        "environment",
+    ]
+    assert [m["content"] for m in memory.fork(agents=["worker"]).items] == ["result"]
+
+
+def test_nested_forks_merge_only_new_suffix():
+    memory = _memory()
+    child = memory.fork()
+    grandchild = child.fork()
+    grandchild.add_memory({"type": "assistant", "content": "deep"})
+
+    assert grandchild.merge() == 1
+    assert grandchild.merge() == 0
+    child.add_memory({"type": "assistant", "content": "child"})
+    assert child.merge(memory_type="child_thought") == 2
+
+    assert [(m["type"], m["content"]) for m in memory.items[3:]] == [
+        ("child_thought", "deep"),
+        ("child_thought", "child"),
+    ]
+
+
+def test_nested_forks_read_without_copying():
+    memory = _memory()
+    grandchild = memory.fork().fork()
+    grandchild.add_memory({"type": "assistant", "content": "deep"})
+
+    memories = grandchild.get_memories()
+    grandchild.add_memory({"type": "assistant", "content": "later"})
+
+    assert isinstance(memories, MemorySequence)
+    assert memories[0] is memory.items[0]
+    assert [m["content"] for m in memories] == ["task", "thinking", "result", "deep"]
+    assert memories[-1]["content"] == "deep"
+    assert [m["content"] for m in memories[1:3]] == ["thinking", "result"]
+    assert [m["content"] for m in grandchild.get_memories(-1)][-1] == "deep"
+    assert memories == list(memories)
+
+
+def test_views_render_their_prefix_once():
+    rendered = []
+
+    def render(memory):
+        rendered.append(memory["content"])
+        return memory["content"]
+
+    memory = _memory()
+    child = memory.fork()
+    grandchild = child.fork()
+    for content in ("first", "second"):
+        grandchild.add_memory({"type": "assistant", "content": content})
+        messages = grandchild.render_memories(render)
+
+    assert messages == ["task", "thinking", "result", "first", "second"]
+    assert rendered == ["task", "thinking", "result", "first", "first", "second"]
+    assert memory.fork(types=["user"]).render_memories(render) == ["task"]
@@ -120,8 +120,9 @@ def test_agent_get_action(sample_agent):
 
 def test_agent_should_terminate(sample_agent, sample_action):
     # Modify the action to be terminal for this test
-    response = '{"tool": "test_tool", "args": {}}'
-    assert sample_agent._should_terminate(response)
+    action, _ = sample_agent._get_action('{"tool": "test_tool", "args": {}}')
+    assert sample_agent._should_terminate(action)
+    assert not sample_agent._should_terminate(None)
 
 
 def test_agent_run(sample_agent, sample_memory):
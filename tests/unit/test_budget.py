@@ -0,0 +1,156 @@
+import json
+import time
+
+import pytest
+
+from game import metrics
+from game.action import tool
+from game.action.context import ActionContext
+from game.action.library.multi_agent import call_agents_parallel
+from game.agent import Agent
+from game.budget import Budget, BudgetExceeded, current_budget
+from game.llm.base import Llm
+from tests.unit.helpers import ScriptedLlm, make_agent
+
+
+def test_charges_propagate_to_the_ancestors():
+    root = Budget(max_tokens=1_000, max_llm_calls=10)
+    child = root.child(share=0.5)
+
+    child.charge(tokens=300, llm_calls=1)
+
+    assert (child.max_tokens, child.max_llm_calls) == (500, 5)
+    assert (root.tokens, root.llm_calls) == (300, 1)
+    assert child.remaining()["tokens"] == 200
+    assert root.child().remaining()["tokens"] == 700
+    assert child.exceeded() is None
+
+    child.charge(tokens=200)
+
+    assert child.exceeded().limit == "tokens"
+    assert root.exceeded() is None
+
+
+def test_the_limits_of_the_ancestors_apply():
+    root = Budget(max_cost=1.0)
+    child = root.child()
+    grandchild = child.child()
+
+    root.charge(cost=1.0)
+
+    with pytest.raises(BudgetExceeded) as e:
+        grandchild.check()
+    assert e.value.limit == "cost"
+
+
+def test_cancellation_and_deadline():
+    root = Budget()
+    child = root.child()
+    root.cancel("The user cancelled the run")
+
+    assert str(child.exceeded()) == "The user cancelled the run"
+    assert Budget(max_seconds=0).exceeded().limit == "seconds"
+    with pytest.raises(ValueError):
+        root.child(share=0)
+
+
+@tool()
+def work(task: str) -> str:
+    """Works on a task"""
+    return f"Worked on {task}"
+
+
+WORK = {"tool": "work", "args": {"task": "x"}}
+
+
+def _agent(name: str, llm: Llm, **kwargs) -> Agent:
+    return make_agent(llm, name=name, tools=[work], **kwargs)
+
+
+def test_agent_stops_when_the_budget_runs_out():
+    metrics.REGISTRY.clear()
+    llm = ScriptedLlm(WORK, tokens=100)
+    budget = Budget(max_llm_calls=3)
+
+    memory = _agent("looping", llm).run("Work", budget=budget)
+
+    assert llm.calls == 3 and budget.llm_calls == 3 and budget.tokens == 300
+    last = json.loads(memory.get_memories()[-1]["content"])
+    assert last["error"].startswith("BudgetExceeded(")
+    # the tool of the last response isn't dispatched, no LLM call could read its result
+    assert len(memory.get_memories()) == 1 + 2 * 2 + 2
+    assert metrics.BUDGET_EXCEEDED.get(agent="looping", limit="llm_calls") == 1
+    assert metrics.AGENT_RUNS.get(agent="looping", status="budget_exceeded") == 1
+
+
+def test_usage_is_estimated_when_the_llm_does_not_report_it():
+    budget = Budget(max_tokens=500)
+
+    _agent("silent", ScriptedLlm(WORK)).run("Work", budget=budget)
+
+    assert budget.tokens >= 500 and budget.llm_calls > 1
+
+
+def test_sub_agents_share_the_budget_of_the_caller():
+    workers = [_agent(f"worker_{i}", ScriptedLlm(WORK, tokens=100)) for i in range(2)]
+    manager_llm = ScriptedLlm(
+        {
+            "tool": "call_agents_parallel",
+            "args": {
+                "calls": [{"agent_name": w.name, "task": "work"} for w in workers]
+            },
+        },
+        tokens=100,
+    )
+    manager = _agent(
+        "manager",
+        manager_llm,
+        managed_agents=workers,
+        multi_agents_memory_model=call_agents_parallel,
+    )
+    budget = Budget(max_tokens=2_000)
+
+    memory = manager.run("Delegate", budget=budget)
+
+    # the sub-agents stopped with the budget of the tree instead of their own `max_iterations`
+    worker_calls = sum(w.llm.calls for w in workers)
+    assert budget.tokens == (manager_llm.calls + worker_calls) * 100
+    # the checks are cooperative, each worker can have one call in flight when the budget runs out
+    assert 2_000 <= budget.tokens <= 2_000 + len(workers) * 100
+    assert "BudgetExceeded" in memory.get_memories()[-1]["content"]
+    assert current_budget() is None
+
+
+def test_sub_agents_get_a_share_of_the_remaining_budget():
+    worker = _agent("worker", ScriptedLlm(WORK, tokens=100), budget_share=0.25)
+    manager = _agent(
+        "manager",
+        ScriptedLlm(
+            {"tool": "call_agent", "args": {"agent_name": "worker", "task": "x"}},
+            tokens=100,
+        ),
+        managed_agents=[worker],
+        max_iterations=1,
+    )
+
+    manager.run("Delegate", budget=Budget(max_llm_calls=9))
+
+    # 8 calls remained after the one of the manager
+    assert worker.llm.calls == 2
+
+
+def test_cancellation_stops_the_run_at_the_next_check():
+    @tool()
+    def cancel(action_context: ActionContext) -> str:
+        """Cancels the run"""
+        action_context.get("budget").cancel("Stopped by the user")
+        return "cancelled"
+
+    llm = ScriptedLlm({"tool": "cancel", "args": {}}, tokens=100)
+    agent = make_agent(llm, tools=[cancel])
+
+    tic = time.monotonic()
+    memory = agent.run("Work", budget=Budget(max_seconds=60))
+
+    assert llm.calls == 1 and time.monotonic() - tic < 5
+    assert "Stopped by the user" in memory.get_memories()[-1]["content"]
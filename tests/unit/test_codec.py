@@ -0,0 +1,100 @@
+import dataclasses
+import datetime
+import enum
+import json
+import uuid
+
+import pytest
+
+from game import codec
+from game.codec import CODECS, JsonCodec, create_codec
+
+
+def _codecs() -> list:
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(create_codec(name))
+        except ImportError:
+            codecs.append(pytest.param(name, marks=pytest.mark.skip(f"{name} missing")))
+    return codecs
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+class Level(enum.IntEnum):
+    HIGH = 2
+
+
+OBJECTS = [
+    {"tool_executed": True, "action": "search", "result": None},
+    {"nested": {"empty": {}, "list": [], "values": [1, -2.5, 0.1, 'ünï"\n\t']}},
+    ["a", {"b": [True, False]}],
+    "plain string",
+    2**70,
+    {1: "non string key"},
+    {True: None, None: 1.5},
+    {"level": Level.HIGH, "tuple": (1, "a")},
+]
+
+
+@pytest.mark.parametrize("fast_codec", _codecs())
+@pytest.mark.parametrize("obj", OBJECTS)
+def test_codecs_write_the_same_canonical_json(fast_codec, obj):
+    reference = JsonCodec()
+
+    assert fast_codec.dumps(obj) == reference.dumps(obj)
+    assert fast_codec.dumps(obj, indent=True) == reference.dumps(obj, indent=True)
+    assert fast_codec.dumpb(obj) == reference.dumps(obj).encode("utf-8")
+    assert fast_codec.loads(reference.dumps(obj)) == json.loads(json.dumps(obj))
+
+
+def test_canonical_json_is_compact_and_unescaped():
+    assert JsonCodec().dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'
+    assert JsonCodec().dumps({"a": [1]}, indent=True) == '{\n  "a": [\n    1\n  ]\n}'
+
+
+@pytest.mark.parametrize("fast_codec", _codecs())
+@pytest.mark.parametrize(
+    "value",
+    [
+        object(),
+        Point(1),
+        {1, 2},
+        frozenset({1}),
+        datetime.date(2020, 1, 1),
+        datetime.datetime(2020, 1, 1),
+        uuid.uuid4(),
+        Color.RED,
+        b"ab",
+    ],
+)
+def test_codecs_raise_like_json(fast_codec, value):
+    with pytest.raises(json.JSONDecodeError):
+        fast_codec.loads("{'not': json}")
+    with pytest.raises(TypeError):
+        JsonCodec().dumps({"value": value})
+    with pytest.raises(TypeError):
+        fast_codec.dumps({"value": value})
+    with pytest.raises(TypeError):
+        fast_codec.dumps([[value]], indent=True)
+    assert fast_codec.loads(memoryview(b'{"a": 1}')) == {"a": 1}
+
+
+def test_set_codec():
+    previous = codec.get_codec()
+    try:
+        assert isinstance(codec.set_codec("json"), JsonCodec)
+        assert codec.dumps({"a": 1}) == '{"a":1}'
+        assert codec.loads(b"[1]") == [1]
+    finally:
+        codec.set_codec(previous)
+    with pytest.raises(ValueError):
+        create_codec("pickle")
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from game import metrics
+from game.action import tool
+from game.compression import GAP_MARKER, OutputCompressor
+from game.goal import Goal
+from game.language import AgentJsonActionLanguage
+from tests.unit.helpers import ScriptedLlm, json_action, make_agent
+
+FILLER = "The weather was mild and the market was calm that day. " * 4
+LOG = (
+    "\n".join(
+        f"{i:05d} INFO request served in {i % 7} ms. {FILLER}" for i in range(400)
+    )
+    + "\n00400 ERROR database connection refused by the replica.\n"
+    + "\n".join(f"{i:05d} INFO heartbeat ok." for i in range(401, 600))
+)
+
+
+def test_short_texts_are_not_compressed():
+    assert OutputCompressor(max_tokens=100).compress("Hello world.", "hello") is None
+
+
+def test_score_ranks_the_chunks_with_bm25():
+    scores = OutputCompressor().score(
+        [
+            "The database is down.",
+            "The weather is mild.",
+            "Database replica refused the database connection.",
+        ],
+        "database connection error",
+    )
+
+    assert scores[1] == 0
+    assert scores[2] > scores[0] > 0
+    assert not OutputCompressor().score(["a", "b"], "").any()
+
+
+def test_compress_keeps_the_relevant_chunks_under_the_budget():
+    compressor = OutputCompressor(max_tokens=200)
+
+    compression = compressor.compress(LOG, "Why was the database connection refused?")
+
+    assert len(compression.text) <= compressor.max_chars
+    assert "00400 ERROR database connection refused by the replica." in compression.text
+    assert compression.text.startswith(GAP_MARKER)
+    assert compression.original_chars == len(LOG)
+    assert 0 < compression.kept_chunks < compression.total_chunks
+    # deterministic
+    assert compressor.compress(LOG, "database connection") == compressor.compress(
+        LOG, "database connection"
+    )
+
+
+def test_compress_keeps_the_original_order_and_separators():
+    text = "Alpha beta. Gamma delta!\nEpsilon zeta? " + "Filler text here. " * 50
+
+    compression = OutputCompressor(max_tokens=15, max_chunk_chars=40).compress(
+        text, "alpha gamma epsilon"
+    )
+
+    assert compression.text == f"Alpha beta. Gamma delta!\nEpsilon zeta?\n{GAP_MARKER}"
+
+
+def test_long_lines_are_cut_in_chunks():
+    compressor = OutputCompressor(max_tokens=100, max_chunk_chars=50)
+
+    compression = compressor.compress("x" * 1_000, "y")
+
+    assert compression.total_chunks == 20
+    assert compression.text.startswith("x" * 50)
+
+
+def test_chunks_larger_than_the_budget_are_rejected():
+    with pytest.raises(ValueError):
+        OutputCompressor(max_tokens=10, max_chunk_chars=400)
+
+
+@tool()
+def read_logs(service: str) -> str:
+    """Returns the logs of a service"""
+    return LOG
+
+
+def test_agent_compresses_the_tool_results():
+    metrics.REGISTRY.clear()
+    agent = make_agent(
+        ScriptedLlm(
+            json_action("read_logs", {"service": "api"}),
+            json_action("terminate", {"message": "Done"}),
+        ),
+        name="compressing",
+        goals=[Goal(priority=1, name="Debug", description="Find the errors")],
+        agent_language=AgentJsonActionLanguage(),
+        tools=[read_logs],
+        output_compressor=OutputCompressor(max_tokens=250),
+    )
+
+    memory = agent.run("Why is the database connection refused?")
+
+    result = json.loads(memory.get_memories()[2]["content"])
+    assert "ERROR database connection refused" in result["result"]
+    assert len(result["result"]) <= 1_000
+    assert result["compression"]["original_chars"] == len(LOG)
+    assert metrics.TOOL_OUTPUT_COMPRESSED_CHARS.get(
+        agent="compressing", tool="read_logs"
+    ) == len(LOG) - len(result["result"])
+
+
+def test_agent_keeps_the_final_answer_whole():
+    agent = make_agent(
+        ScriptedLlm(json_action("terminate", {"message": LOG})),
+        agent_language=AgentJsonActionLanguage(),
+        output_compressor=OutputCompressor(max_tokens=200),
+    )
+
+    memory = agent.run("Summarise the logs")
+
+    assert json.loads(memory.get_memories()[-1]["content"])["result"] == LOG
@@ -0,0 +1,192 @@
+import json
+import re
+
+import pytest
+
+from game import metrics
+from game.action import tool
+from game.dedup import DEDUP_SAVED_CHARS_KEY, PromptDeduplicator
+from game.language import AgentJsonActionLanguage
+from tests.unit.helpers import ScriptedLlm, json_action, make_agent
+
+TOOLS = ", ".join(f"'tool_{i}: Does the thing number {i} very well'" for i in range(20))
+
+
+REFERENCE = re.compile(
+    r"\[(?P<chars>\d+) characters repeated from (?P<source>earlier in this message|the message above|"
+    r'(?P<distance>\d+) messages above), starting with "(?P<anchor>.*?)(\.\.\.)?"\]'
+)
+
+
+def _resolve(messages: list[dict]) -> list[dict]:
+    """Expands the back-references like the LLM reads them, from the deduplicated content only"""
+    resolved = []
+    for m, message in enumerate(messages):
+        content = message["content"]
+        parts = []
+        position = 0
+        for match in REFERENCE.finditer(content):
+            if match.start() < position:
+                continue
+            parts.append(content[position : match.start()])
+            if match["distance"]:
+                source = messages[m - int(match["distance"])]["content"]
+            elif match["source"] == "the message above":
+                source = messages[m - 1]["content"]
+            else:
+                source = content[: match.start()]
+            start = source.index(match["anchor"])
+            block = source[start : start + int(match["chars"])]
+            # the block is shown verbatim, not behind another reference
+            assert REFERENCE.search(block) is None
+            parts.append(block)
+            position = match.end()
+            if block.endswith("\n"):
+                assert content[position] == "\n"
+                position += 1
+        parts.append(content[position:])
+        resolved.append({**message, "content": "".join(parts)})
+    return resolved
+
+
+def _error(message: str) -> dict:
+    return {
+        "role": "user",
+        "content": json.dumps(
+            {
+                "tool_executed": False,
+                "error": f"ActionNotPresentInResponseError('{message}') Use one of the available tools: [{TOOLS}]",
+            }
+        ),
+    }
+
+
+def test_repeated_blocks_are_replaced_with_back_references():
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant"},
+        {"role": "user", "content": "Do it"},
+        {"role": "assistant", "content": "Hmm"},
+        _error("No action in 'Hmm'"),
+        {"role": "assistant", "content": "Well"},
+        _error("No action in 'Well'"),
+    ]
+
+    deduplicated, saved = PromptDeduplicator().deduplicate(messages)
+
+    assert deduplicated[:5] == messages[:5]
+    content = deduplicated[5]["content"]
+    assert "No action in 'Well'" in content
+    assert "characters repeated from 2 messages above" in content
+    assert "tool_10" not in content
+    assert saved == len(messages[5]["content"]) - len(content) > 800
+    assert _resolve(deduplicated) == messages
+
+
+def test_the_prefix_is_stable_across_iterations():
+    deduplicator = PromptDeduplicator()
+    messages = [
+        {"role": "user", "content": "Do it"},
+        _error("first"),
+        _error("second"),
+    ]
+
+    first, _ = deduplicator.deduplicate(messages)
+    second, _ = deduplicator.deduplicate(messages + [_error("third")])
+
+    assert second[:3] == first
+    assert "repeated from 2 messages above" in second[3]["content"]
+    assert _resolve(second) == messages + [_error("third")]
+
+
+def test_small_and_skipped_messages_are_kept():
+    block = "".join(f"Sentence number {i} of a long paragraph. " for i in range(10))
+    messages = [
+        {"role": "user", "content": block},
+        {"role": "assistant", "content": block},
+        {"role": "user", "content": "ok. " * 5},
+        {"role": "user", "content": None},
+    ]
+
+    deduplicated, saved = PromptDeduplicator().deduplicate(messages)
+
+    assert deduplicated == messages and saved == 0
+
+
+def test_repeats_in_the_same_message():
+    line = "ERROR the replica refused the connection after 30 seconds of waiting for the lock\n"
+    messages = [{"role": "user", "content": "Logs:\n" + line * 10}]
+
+    deduplicated, saved = PromptDeduplicator(min_block_chars=150).deduplicate(messages)
+
+    # the references only cover lines that are shown
+    reference = (
+        f"[{len(line) * 2} characters repeated from earlier in this message, "
+        'starting with "ERROR the replica refused the ..."]\n'
+    )
+    assert deduplicated[0]["content"] == "Logs:\n" + line * 2 + reference * 4
+    assert saved > 0
+    assert _resolve(deduplicated) == messages
+
+
+def test_references_never_point_at_references():
+    block = "".join(f"Line {i} of the block shared by the messages\n" for i in range(8))
+    details = "".join(
+        f"Detail {i} only found from the second message on\n" for i in range(5)
+    )
+    messages = [
+        {"role": "user", "content": block},
+        {"role": "user", "content": "Intro\n" + details + block},
+        {"role": "user", "content": "Again\n" + details + block},
+    ]
+
+    deduplicated, _ = PromptDeduplicator().deduplicate(messages)
+
+    assert deduplicated[1]["content"].startswith("Intro\n" + details + "[")
+    last = deduplicated[2]["content"]
+    # the block is referenced from the first message, where it is shown, not from the second one
+    assert 'from the message above, starting with "Detail 0' in last
+    assert 'from 2 messages above, starting with "Line 0' in last
+    assert _resolve(deduplicated) == messages
+
+
+def test_references_must_be_smaller_than_the_blocks():
+    with pytest.raises(ValueError):
+        PromptDeduplicator(min_block_chars=10)
+
+
+def _make_tool(i: int):
+    @tool(
+        tool_name=f"tool_{i}",
+        description=f"Does the thing number {i} very well, with a long enough description",
+    )
+    def _tool() -> str:
+        """Does a thing"""
+        return "done"
+
+    return _tool
+
+
+def test_agent_deduplicates_the_repeated_parse_errors():
+    metrics.REGISTRY.clear()
+    llm = ScriptedLlm(
+        "I think I should look around.",
+        "Let me think again.",
+        "Still thinking.",
+        json_action("terminate", {"message": "Done"}),
+    )
+    agent = make_agent(
+        llm,
+        name="deduplicating",
+        agent_language=AgentJsonActionLanguage(),
+        tools=[_make_tool(i) for i in range(20)],
+        prompt_deduplicator=PromptDeduplicator(),
+    )
+
+    agent.run("Do the work")
+
+    saved = [p.metadata[DEDUP_SAVED_CHARS_KEY] for p in llm.prompts]
+    assert saved[0] == saved[1] == 0
+    assert 0 < saved[2] < saved[3]
+    assert REFERENCE.search(llm.prompts[3].messages[-1]["content"])
+    assert "tool_10" in _resolve(llm.prompts[3].messages)[-1]["content"]
+    assert metrics.PROMPT_DEDUP_SAVED_CHARS.get(agent="deduplicating") == sum(saved)
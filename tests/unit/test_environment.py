@@ -1,7 +1,12 @@
+import json
+from unittest.mock import ANY
+
 from game.action import tool
 from game.action.context import ActionContext
 from game.action.python_registry import PythonActionRegistry
-from game.environment import Environment
+from game.environment import Environment, has_named_parameter
+from game.language import AgentJsonActionLanguage
+from tests.unit.helpers import ScriptedLlm, json_action, make_agent
 
 
 def test_environment_execute_action():
@@ -22,3 +27,36 @@ def test_environment_execute_action():
         args={"arg1": "test", "action_context": action_context},
     )
     assert "Action executed with test" in result["result"]
+
+
+def test_has_named_parameter():
+    class Unhashable:
+        __hash__ = None
+
+        def __call__(self, _memory, action_context):
+            pass
+
+    def injected(_memory, action_context):
+        pass
+
+    for func in (injected, Unhashable()):
+        assert has_named_parameter(func, "_memory")
+        assert has_named_parameter(func, "action_context")
+        assert not has_named_parameter(func, "_llm")
+    assert not has_named_parameter(42, "_memory")
+
+
+def test_agent_continues_after_an_unknown_tool():
+    agent = make_agent(
+        ScriptedLlm(
+            json_action("no_such_tool", {}),
+            json_action("terminate", {"message": "Done"}),
+        ),
+        agent_language=AgentJsonActionLanguage(),
+    )
+
+    memory = agent.run("Work")
+
+    result = json.loads(memory.get_memories()[2]["content"])
+    assert result == {"tool_executed": False, "action": None, "error": ANY}
+    assert "Done" in memory.get_memories()[-1]["content"]
@@ -0,0 +1,102 @@
+import pstats
+
+import pytest
+
+from game.hooks import (
+    CProfileHook,
+    Hook,
+    RunProfilerHook,
+    SamplingProfilerHook,
+    Stage,
+    StageTimer,
+    TracemallocHook,
+    register_hook,
+    unregister_hook,
+)
+from tests.unit.helpers import TERMINATE, ScriptedLlm, make_agent
+
+
+class BrokenHook(Hook):
+    def before(self, stage, agent):
+        raise RuntimeError("broken")
+
+
+@pytest.fixture
+def global_hook():
+    hooks = []
+
+    def _register(hook: Hook) -> Hook:
+        register_hook(hook)
+        hooks.append(hook)
+        return hook
+
+    yield _register
+    for hook in hooks:
+        unregister_hook(hook)
+
+
+def test_stage_timer():
+    timer = StageTimer()
+    agent = make_agent(
+        name="agent", llm=ScriptedLlm(TERMINATE), hooks=[BrokenHook(), timer]
+    )
+    agent.run(user_input="hi")
+
+    summary = timer.summary()
+    assert set(summary) == {
+        Stage.RUN,
+        Stage.PROMPT,
+        Stage.LLM,
+        Stage.PARSE,
+        Stage.TOOL,
+        Stage.MEMORY,
+        Stage.TERMINATION,
+    }
+    assert summary[Stage.RUN]["count"] == 1
+    # parsed once, the termination check uses the parsed action
+    assert summary[Stage.PARSE]["count"] == 1
+    assert summary[Stage.RUN]["total_ms"] >= summary[Stage.LLM]["total_ms"] > 0
+
+
+def test_profiler_hooks_write_a_file_per_outermost_run(tmp_path, global_hook):
+    cprofile = global_hook(CProfileHook(tmp_path / "cprofile"))
+    sampling = global_hook(
+        SamplingProfilerHook(tmp_path / "sampling", interval_secs=0.001)
+    )
+    tracemalloc_hook = global_hook(TracemallocHook(tmp_path / "tracemalloc"))
+
+    worker = make_agent(name="worker", llm=ScriptedLlm(TERMINATE))
+    manager = make_agent(
+        name="manager",
+        llm=ScriptedLlm(
+            {"tool": "call_agent", "args": {"agent_name": "worker", "task": "work"}},
+            TERMINATE,
+        ),
+        managed_agents=[worker],
+    )
+    manager.run(user_input="delegate")
+
+    assert len(cprofile.files) == len(sampling.files) == 1
+    assert cprofile.files[0].name.startswith("manager-")
+    stats = pstats.Stats(str(cprofile.files[0]))
+    assert any(name == "run" for _, _, name in stats.stats)
+
+    assert tracemalloc_hook.files[0].read_text().startswith("agent: manager")
+    for line in sampling.files[0].read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+
+
+def test_no_hooks_registered():
+    agent = make_agent(name="agent", llm=ScriptedLlm(TERMINATE))
+    assert agent.hooks == []
+    assert agent.run(user_input="hi").get_memories()[-1]["type"] == "environment"
+
+
+def test_profiler_hooks_implement_start_and_stop(tmp_path):
+    class StartOnlyHook(RunProfilerHook):
+        def start(self, agent):
+            return None
+
+    with pytest.raises(TypeError):
+        StartOnlyHook(output_dir=tmp_path)
@@ -0,0 +1,132 @@
+import urllib.request
+
+import pytest
+
+from game import metrics
+from game.action import tool
+from game.template import AgentTemplate
+from tests.unit.helpers import TERMINATE, ScriptedLlm, make_agent
+
+
+@tool()
+def broken_tool() -> str:
+    """Always fails"""
+    raise RuntimeError("broken")
+
+
+def test_exposition_format():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ("path",))
+    gauge = registry.gauge("in_flight", "In flight")
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+
+    counter.inc(path='/a"b')
+    counter.inc(2, path='/a"b')
+    gauge.inc()
+    gauge.dec(0.5)
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    assert registry.exposition().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 3',
+        "# HELP in_flight In flight",
+        "# TYPE in_flight gauge",
+        "in_flight 0.5",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+    with pytest.raises(ValueError):
+        counter.inc(-1, path="/")
+    with pytest.raises(ValueError):
+        counter.inc(method="GET")
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Duplicate")
+
+
+def test_timed():
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram("duration_seconds", "Duration", ("name",))
+    counter = registry.counter("calls_total", "Calls", ("name", "status"))
+    gauge = registry.gauge("in_flight", "In flight", ("name",))
+
+    with metrics.timed(histogram, counter, gauge, name="a"):
+        assert gauge.get(name="a") == 1
+    with pytest.raises(ValueError):
+        with metrics.timed(histogram, counter, name="a"):
+            raise ValueError()
+    with metrics.timed(histogram, counter, name="a") as timing:
+        timing.status = "rejected"
+
+    assert histogram.get(name="a").count == 3
+    assert gauge.get(name="a") == 0
+    assert [counter.get(name="a", status=s) for s in ("ok", "error", "rejected")] == [
+        1,
+        1,
+        1,
+    ]
+
+
+def test_agent_metrics():
+    agent = make_agent(
+        ScriptedLlm("not json", {"tool": "broken_tool", "args": {}}, TERMINATE),
+        name="metrics_agent",
+        tools=[broken_tool],
+    )
+    agent.run(user_input="hi")
+
+    assert metrics.AGENT_RUNS.get(agent="metrics_agent", status="ok") == 1
+    assert metrics.AGENT_RUNS_IN_FLIGHT.get(agent="metrics_agent") == 0
+    assert metrics.AGENT_ITERATIONS.get(agent="metrics_agent").sum == 3
+    assert (
+        metrics.PARSE_FAILURES.get(
+            agent="metrics_agent", error="ActionNotPresentInResponseError"
+        )
+        == 1
+    )
+    assert metrics.TOOL_CALLS.get(tool="broken_tool", status="error") == 1
+    assert 'game_tool_calls_total{tool="broken_tool",status="error"} 1' in (
+        metrics.exposition()
+    )
+
+
+def test_http_endpoint():
+    registry = metrics.MetricsRegistry()
+    registry.counter("up", "Up").inc()
+    server = metrics.start_http_server(0, registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert response.read().decode().endswith("up 1\n")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_generated_agent_names_are_not_labels():
+    runs = metrics.AGENT_RUNS.get(agent=metrics.ANONYMOUS_AGENT, status="ok")
+    anonymous = make_agent(ScriptedLlm(TERMINATE))
+    anonymous.run(user_input="hi")
+    template = AgentTemplate(
+        name="spawning",
+        goals=anonymous.goals,
+        agent_language=anonymous.agent_language,
+        llm=ScriptedLlm(TERMINATE),
+    )
+    spawned = template.spawn(name="spawning-1")
+    spawned.run(user_input="hi")
+
+    assert (
+        metrics.AGENT_RUNS.get(agent=metrics.ANONYMOUS_AGENT, status="ok") == runs + 1
+    )
+    assert metrics.AGENT_RUNS.get(agent="spawning", status="ok") == 1
+    assert anonymous.name not in metrics.exposition()
+    assert spawned.name not in metrics.exposition()
@@ -0,0 +1,197 @@
+import json
+import time
+
+import pytest
+
+from game.action import tool
+from game.action.context import ActionContext
+from game.action.library.default import terminate, user_input
+from game.action.python_registry import PythonActionRegistry
+from game.agent import Agent
+from game.environment import Environment
+from game.language import AgentPlanLanguage
+from game.llm.base import Llm
+from game.plan import Plan, PlanExecutor, PlanValidationError, resolve_references
+from game.suspension import InMemorySuspendedRunStore
+from tests.unit.helpers import ScriptedLlm, json_action, make_agent
+
+
+@tool()
+def get_weather(city: str) -> dict:
+    """Returns the weather of a city"""
+    time.sleep(0.2)
+    if city == "Atlantis":
+        raise ValueError("Unknown city")
+    return {"city": city, "temperature": len(city)}
+
+
+@tool()
+def add(a: int, b: int) -> int:
+    """Adds two numbers"""
+    return a + b
+
+
+ACTIONS = PythonActionRegistry([get_weather, add, terminate])
+
+
+def _plan(*steps: dict) -> Plan:
+    return Plan.from_dict({"steps": list(steps)})
+
+
+@pytest.mark.parametrize(
+    "steps, error",
+    [
+        ([{"id": "a", "tool": "nope", "args": {}}], "unknown tool"),
+        ([{"id": "a", "tool": "add", "args": {"a": 1}}], "required args"),
+        ([{"id": "a", "tool": "add", "args": {"a": 1, "b": "${b}"}}], "unknown step"),
+        (
+            [
+                {"id": "a", "tool": "add", "args": {"a": 1, "b": "${b}"}},
+                {"id": "b", "tool": "add", "args": {"a": 1, "b": "${a}"}},
+            ],
+            "cyclic",
+        ),
+        (
+            [
+                {"id": "a", "tool": "terminate", "args": {"message": "1"}},
+                {"id": "b", "tool": "terminate", "args": {"message": "2"}},
+            ],
+            "one terminal step",
+        ),
+        (
+            [
+                {"id": "a", "tool": "add", "args": {"a": 1, "b": 1}},
+                {"id": "a", "tool": "add", "args": {"a": 1, "b": 1}},
+            ],
+            "Duplicate",
+        ),
+    ],
+)
+def test_invalid_plans_are_rejected(steps, error):
+    with pytest.raises(PlanValidationError, match=error):
+        _plan(*steps).validate(ACTIONS)
+
+
+def test_resolve_references():
+    results = {"w": {"city": "Rome", "temperature": 4, "tags": ["sunny"]}, "n": 3}
+
+    assert resolve_references("${n}", results) == 3
+    assert resolve_references({"x": ["${w.tags.0}"]}, results) == {"x": ["sunny"]}
+    assert resolve_references("${w.city} is ${w.temperature}", results) == "Rome is 4"
+    with pytest.raises(KeyError):
+        resolve_references("${w.wind}", results)
+
+
+def test_independent_steps_run_in_parallel():
+    plan = _plan(
+        {"id": "paris", "tool": "get_weather", "args": {"city": "Paris"}},
+        {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+        {
+            "id": "sum",
+            "tool": "add",
+            "args": {"a": "${paris.temperature}", "b": "${rome.temperature}"},
+        },
+        {"id": "answer", "tool": "terminate", "args": {"message": "Sum: ${sum}"}},
+    )
+
+    tic = time.perf_counter()
+    result = PlanExecutor(Environment()).execute(plan, ACTIONS, ActionContext())
+    elapsed = time.perf_counter() - tic
+
+    assert elapsed < 0.35
+    assert result.succeeded and result.terminated
+    assert result.steps["sum"]["result"] == 9
+    assert result.final == "Sum: 9"
+
+
+def test_failed_steps_skip_their_dependents():
+    plan = _plan(
+        {"id": "lost", "tool": "get_weather", "args": {"city": "Atlantis"}},
+        {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+        {"id": "sum", "tool": "add", "args": {"a": "${lost.temperature}", "b": 1}},
+        {"id": "answer", "tool": "terminate", "args": {"message": "${rome}"}},
+    )
+
+    result = PlanExecutor(Environment()).execute(plan, ACTIONS, ActionContext())
+
+    assert not result.succeeded and not result.terminated
+    assert result.failed == ["lost"]
+    assert result.skipped == ["sum", "answer"]
+    assert result.steps["rome"]["status"] == "succeeded"
+    assert "Unknown city" in result.steps["lost"]["error"]
+
+
+def _plan_response(*steps: dict) -> str:
+    return f"Planning.\n```plan\n{json.dumps({'steps': list(steps)})}\n```"
+
+
+def _agent(llm: Llm) -> Agent:
+    return make_agent(llm, agent_language=AgentPlanLanguage(), tools=[get_weather, add])
+
+
+def test_agent_runs_a_plan_with_a_single_llm_call():
+    llm = ScriptedLlm(
+        _plan_response(
+            {"id": "paris", "tool": "get_weather", "args": {"city": "Paris"}},
+            {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+            {"id": "answer", "tool": "terminate", "args": {"message": "${rome.city}"}},
+        )
+    )
+
+    memory = _agent(llm).run("Compare Paris and Rome")
+
+    assert llm.calls == 1
+    result = json.loads(memory.get_memories()[-1]["content"])
+    assert result["action"] == "execute_plan"
+    assert result["result"]["final"] == "Rome"
+
+
+def test_agent_replans_after_a_failure():
+    llm = ScriptedLlm(
+        _plan_response(
+            {"id": "lost", "tool": "get_weather", "args": {"city": "Atlantis"}},
+            {"id": "answer", "tool": "terminate", "args": {"message": "${lost}"}},
+        ),
+        _plan_response(
+            {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+            {"id": "answer", "tool": "terminate", "args": {"message": "${rome}"}},
+        ),
+    )
+
+    memory = _agent(llm).run("What's the weather in Atlantis?")
+
+    assert llm.calls == 2
+    assert json.loads(memory.get_memories()[-1]["content"])["result"]["terminated"]
+
+
+def test_steps_cannot_suspend_the_run():
+    store = InMemorySuspendedRunStore()
+    llm = ScriptedLlm(
+        _plan_response(
+            {"id": "rome", "tool": "get_weather", "args": {"city": "Rome"}},
+            {"id": "ask", "tool": "user_input", "args": {"message": "Where to?"}},
+        ),
+        json_action("terminate", {"message": "done"}),
+    )
+    agent = make_agent(
+        llm,
+        agent_language=AgentPlanLanguage(),
+        tools=[get_weather, user_input],
+        suspended_run_store=store,
+    )
+
+    memory = agent.run("Plan my trip")
+
+    assert len(store) == 0
+    steps = json.loads(memory.get_memories()[2]["content"])["result"]["steps"]
+    assert steps["rome"]["result"] == {"city": "Rome", "temperature": 4}
+    assert "call it outside of a plan" in steps["ask"]["error"]
+
+
+def test_agent_accepts_single_actions():
+    llm = ScriptedLlm(json_action("terminate", {"message": "nothing to plan"}))
+
+    memory = _agent(llm).run("Hello")
+
+    assert llm.calls == 1
+    assert "nothing to plan" in memory.get_memories()[-1]["content"]
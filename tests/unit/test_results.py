@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+import pytest
+
+from game.action import tool
+from game.language import AgentJsonActionLanguage
+from game.prompt import Prompt
+from game.results import (
+    BlobNotFoundError,
+    FileBlobStore,
+    InMemoryBlobStore,
+    OutputPolicy,
+)
+from tests.unit.helpers import ScriptedLlm, json_action, make_agent
+
+PAGE = "".join(f"line {i}\n" for i in range(50_000))
+
+
+def _result(value) -> dict:
+    return {"tool_executed": True, "action": "visit_webpage", "result": value}
+
+
+def test_small_results_are_kept():
+    policy = OutputPolicy(InMemoryBlobStore(), max_result_chars=100)
+    result = _result({"a": "b"})
+
+    assert policy.apply(result) is result
+    assert policy.apply({"tool_executed": False, "error": "x" * 1000})["error"]
+
+
+def test_large_results_are_spilled_and_paged():
+    store = InMemoryBlobStore()
+    policy = OutputPolicy(
+        store, max_result_chars=1_000, preview_chars=100, max_page_chars=500
+    )
+
+    spilled = policy.apply(_result(PAGE))["result"]
+
+    assert spilled["size"] == len(PAGE) and spilled["preview"] == PAGE[:100]
+    assert spilled["handle"] in spilled["note"]
+    assert len(json.dumps(spilled)) < 1_000
+
+    pages, offset = [], 0
+    while offset is not None:
+        page = policy.read(spilled["handle"], offset, length=10_000)
+        assert len(page["content"]) <= 500
+        pages.append(page["content"])
+        offset = page["next_offset"]
+    assert "".join(pages) == PAGE
+
+    with pytest.raises(BlobNotFoundError):
+        policy.read("0" * 32)
+
+
+def test_structured_results_are_spilled_as_indented_json():
+    policy = OutputPolicy(InMemoryBlobStore(), max_result_chars=1_000)
+    rows = [{"id": i, "name": f"row {i}"} for i in range(100)]
+
+    handle = policy.apply(_result(rows))["result"]["handle"]
+
+    assert json.loads(policy.blob_store.get(handle)) == rows
+
+
+def test_file_blob_store(tmp_path):
+    store = FileBlobStore(tmp_path)
+
+    handle = store.put("ünïcode" * 10)
+
+    assert store.put("ünïcode" * 10) == handle
+    assert FileBlobStore(tmp_path).get(handle) == "ünïcode" * 10
+    assert store.delete(handle) and not store.delete(handle)
+    with pytest.raises(BlobNotFoundError):
+        store.get("../../etc/passwd")
+
+
+def test_file_blob_store_deletes_the_old_results(tmp_path):
+    store = FileBlobStore(tmp_path, max_age_secs=60)
+    old = store.put("old result")
+    hour_ago = time.time() - 3_600
+    os.utime(store.directory / f"{old}.txt", (hour_ago, hour_ago))
+
+    new = store.put("new result")
+
+    assert store.get(new) == "new result"
+    with pytest.raises(BlobNotFoundError):
+        store.get(old)
+    assert store.cleanup(max_age_secs=60) == 0
+
+
+@tool()
+def visit_webpage(url: str) -> str:
+    """Returns the markdown of a webpage"""
+    return PAGE
+
+
+class HandleLlm(ScriptedLlm):
+    """Replaces `HANDLE` in the responses with the handle of the spilled page, from the last tool result"""
+
+    def __call__(self, prompt: Prompt) -> str:
+        response = super().__call__(prompt)
+        if "HANDLE" in response:
+            content = json.loads(prompt.messages[-1]["content"])
+            response = response.replace("HANDLE", content["result"]["handle"])
+        return response
+
+
+def test_agent_keeps_the_prompts_bounded():
+    llm = HandleLlm(
+        json_action("visit_webpage", {"url": "https://example.com"}),
+        json_action("read_result", {"handle": "HANDLE", "offset": 500}),
+        json_action("visit_webpage", {"url": "https://example.com/2"}),
+        json_action("terminate", {"message": "Done"}),
+    )
+    agent = make_agent(
+        llm,
+        agent_language=AgentJsonActionLanguage(),
+        tools=[visit_webpage],
+        output_policy=OutputPolicy(InMemoryBlobStore(), max_result_chars=4_000),
+    )
+
+    memory = agent.run("Summarise example.com")
+
+    page = json.loads(memory.get_memories()[4]["content"])["result"]
+    assert page["content"] == PAGE[500:2_500]
+    assert max(sum(len(m["content"]) for m in p.messages) for p in llm.prompts) < 25_000
+
+
+def test_agent_keeps_the_final_answer_whole():
+    answer = PAGE[:10_000]
+    agent = make_agent(
+        ScriptedLlm(json_action("terminate", {"message": answer})),
+        agent_language=AgentJsonActionLanguage(),
+        output_policy=OutputPolicy(InMemoryBlobStore(), max_result_chars=1_000),
+    )
+
+    memory = agent.run("Write a long answer")
+
+    assert json.loads(memory.get_memories()[-1]["content"])["result"] == answer
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import threading
+
+import httpx
+
+from game.action.library.default import user_input
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.prompt import Prompt
+from game.serve import AgentApp
+from game.suspension import InMemorySuspendedRunStore
+from game.template import AgentTemplate
+
+
+class EchoLlm(Llm):
+    """Terminates with the user inputs of the session, waiting for `release` if set"""
+
+    def __init__(self, release: threading.Event = None):
+        self.release = release
+
+    @property
+    def name(self) -> str:
+        return "EchoLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        if self.release is not None:
+            self.release.wait(5)
+        task = prompt.messages[-1]["content"]
+        if task == "ask":
+            return json.dumps({"tool": "user_input", "args": {"message": "Sure?"}})
+        inputs = [
+            m["content"]
+            for m in prompt.messages
+            if m["content"] in ("a", "b", "c", "d")
+        ]
+        message = f"inputs: {','.join(inputs)}"
+        return json.dumps({"tool": "terminate", "args": {"message": message}})
+
+
+def _app(llm: Llm = None, **kwargs) -> AgentApp:
+    template = AgentTemplate(
+        name="echo",
+        goals=[Goal(priority=1, name="Echo", description="Echo the user")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=llm or EchoLlm(),
+        tools=[user_input],
+        debug_log_memory=False,
+    )
+    return AgentApp([template], **kwargs)
+
+
+def _client(app: AgentApp) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+def test_runs_continue_their_session():
+    async def scenario():
+        async with _client(_app()) as client:
+            first = (await client.post("/agents/echo/runs", json={"input": "a"})).json()
+            second = await client.post(
+                "/agents/echo/runs",
+                json={"input": "b", "session_id": first["session_id"]},
+            )
+            session = await client.get(f"/sessions/{first['session_id']}")
+            unknown = await client.post(
+                "/agents/echo/runs", json={"input": "c", "session_id": "nope"}
+            )
+            missing_agent = await client.post("/agents/nope/runs", json={"input": "a"})
+            return first, second, session, unknown, missing_agent
+
+    first, second, session, unknown, missing_agent = asyncio.run(scenario())
+
+    assert first["status"] == "completed"
+    assert first["result"] == "inputs: a"
+    assert second.json()["result"] == "inputs: a,b"
+    assert len(session.json()["memories"]) == 6
+    assert unknown.status_code == 404 and missing_agent.status_code == 404
+
+
+def test_runs_stream_server_sent_events():
+    async def scenario():
+        async with _client(_app()) as client:
+            return await client.post(
+                "/agents/echo/runs", json={"input": "a", "stream": True}
+            )
+
+    response = asyncio.run(scenario())
+
+    assert response.headers["content-type"] == "text/event-stream"
+    events = [
+        (lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: ")))
+        for lines in (e.split("\n") for e in response.text.strip().split("\n\n"))
+    ]
+    assert [name for name, _ in events] == ["started", "tool", "iteration", "completed"]
+    assert events[1][1]["tool"] == "terminate"
+    assert "llm" in events[2][1]["durations_ms"]
+    assert events[3][1]["result"] == "inputs: a"
+
+
+def test_full_queue_is_rejected_and_shutdown_drains():
+    release = threading.Event()
+    app = _app(EchoLlm(release), max_concurrency=1, max_queue=1)
+
+    async def scenario():
+        async with _client(app) as client:
+            running = asyncio.create_task(
+                client.post("/agents/echo/runs", json={"input": "a"})
+            )
+            await asyncio.sleep(0.05)
+            queued = asyncio.create_task(
+                client.post("/agents/echo/runs", json={"input": "b"})
+            )
+            await asyncio.sleep(0.05)
+            rejected = await client.post("/agents/echo/runs", json={"input": "c"})
+            stats = app.stats()["echo"]
+
+            shutdown = asyncio.create_task(app.shutdown(timeout_secs=5))
+            await asyncio.sleep(0.05)
+            refused = await client.post("/agents/echo/runs", json={"input": "d"})
+            release.set()
+            return (
+                await running,
+                await queued,
+                rejected,
+                refused,
+                stats,
+                await shutdown,
+            )
+
+    running, queued, rejected, refused, stats, drained = asyncio.run(scenario())
+
+    assert (stats["running"], stats["queued"]) == (1, 1)
+    assert rejected.status_code == 503 and "retry-after" in rejected.headers
+    assert refused.status_code == 503
+    assert running.json()["status"] == queued.json()["status"] == "completed"
+    assert drained
+    assert app.stats()["echo"]["completed"] == 2
+
+
+def test_suspended_runs_are_resumed():
+    async def scenario():
+        app = _app(suspended_run_store=InMemorySuspendedRunStore())
+        async with _client(app) as client:
+            suspended = (
+                await client.post("/agents/echo/runs", json={"input": "ask"})
+            ).json()
+            resumed = await client.post(
+                "/agents/echo/resume",
+                json={
+                    "session_id": suspended["session_id"],
+                    "token": suspended["token"],
+                    "reply": "yes",
+                },
+            )
+            again = await client.post(
+                "/agents/echo/resume",
+                json={
+                    "session_id": suspended["session_id"],
+                    "token": suspended["token"],
+                    "reply": "yes",
+                },
+            )
+            return suspended, resumed, again
+
+    suspended, resumed, again = asyncio.run(scenario())
+
+    assert (suspended["status"], suspended["message"]) == ("suspended", "Sure?")
+    assert resumed.json()["status"] == "completed"
+    assert again.status_code == 404
+
+
+def test_suspended_runs_only_resume_in_their_session():
+    async def scenario():
+        app = _app(suspended_run_store=InMemorySuspendedRunStore())
+        async with _client(app) as client:
+            suspended = (
+                await client.post("/agents/echo/runs", json={"input": "ask"})
+            ).json()
+            other = (
+                await client.post("/agents/echo/runs", json={"input": "a"})
+            ).json()["session_id"]
+            responses = []
+            for session_id in (other, suspended["session_id"]):
+                response = await client.post(
+                    "/agents/echo/resume",
+                    json={
+                        "session_id": session_id,
+                        "token": suspended["token"],
+                        "reply": "yes",
+                    },
+                )
+                responses.append(response)
+            other_session = await client.get(f"/sessions/{other}")
+            return responses, other_session.json()
+
+    (stolen, resumed), other_session = asyncio.run(scenario())
+
+    assert stolen.status_code == 404
+    # the other session keeps its memory, and the owner can still resume the run
+    assert "ask" not in json.dumps(other_session["memories"])
+    assert resumed.json()["status"] == "completed"
@@ -0,0 +1,83 @@
+import pytest
+
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+from game.session import InMemorySessionStore, LruSessionStore, memory_size
+
+
+def _memory(session: int, items: int = 10) -> DictMemory:
+    memory = DictMemory()
+    memory.add_memory(MemoryItem("user", f"session {session}", agent="agent"))
+    for i in range(items):
+        memory.add_memory(
+            MemoryItem("environment", payload={"result": "x" * 100, "i": i})
+        )
+    return memory
+
+
+def test_in_memory_store():
+    store = InMemorySessionStore()
+    memory = _memory(0)
+    store.put("a", memory)
+
+    assert store.get("a") is memory and "a" in store and len(store) == 1
+    assert store.delete("a") and not store.delete("a")
+    assert store.get("a") is None
+
+
+def test_lru_store_spills_cold_sessions_and_reloads_them(tmp_path):
+    budget = memory_size(_memory(0)) * 3
+    store = LruSessionStore(tmp_path, max_resident_bytes=budget)
+    memories = {f"s{i}": _memory(i) for i in range(10)}
+    for session_id, memory in memories.items():
+        store.put(session_id, memory)
+
+    stats = store.stats()
+    assert stats["resident_bytes"] <= budget
+    assert (stats["resident_sessions"], stats["spilled_sessions"]) == (3, 7)
+    assert stats["evictions"] == 7
+    assert len(list(tmp_path.glob("*.snap"))) == 7
+    assert len(store) == 10 and all(session_id in store for session_id in memories)
+
+    assert store.get("s9") is memories["s9"]
+    reloaded = store.get("s0")
+    assert [m.to_dict() for m in reloaded.get_memories()] == [
+        m.to_dict() for m in memories["s0"].get_memories()
+    ]
+    assert store.get("unknown") is None
+
+    stats = store.stats()
+    assert (stats["hits"], stats["reloads"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["reload_secs_max"] > 0
+    # reloading `s0` evicted the least recently used resident session
+    assert (stats["resident_sessions"], stats["evictions"]) == (3, 8)
+
+
+def test_lru_store_put_and_delete_spilled_sessions(tmp_path):
+    store = LruSessionStore(tmp_path, max_resident_bytes=1)
+    store.put("a", _memory(0))
+    store.put("b", _memory(1))
+    assert (tmp_path / "a.snap").exists()
+
+    store.put("a", _memory(2))
+    assert not (tmp_path / "a.snap").exists() and (tmp_path / "b.snap").exists()
+
+    assert store.delete("b") and not (tmp_path / "b.snap").exists()
+    assert not store.delete("b")
+
+
+def test_lru_store_recovers_spilled_sessions(tmp_path):
+    store = LruSessionStore(tmp_path, max_resident_bytes=1)
+    store.put("a", _memory(0))
+    store.put("b", _memory(1))
+
+    restarted = LruSessionStore(tmp_path)
+
+    assert "a" in restarted and "b" not in restarted
+    assert restarted.get("a").get_memories()[0]["content"] == "session 0"
+
+
+def test_lru_store_rejects_unsafe_session_ids(tmp_path):
+    with pytest.raises(ValueError):
+        LruSessionStore(tmp_path).put("../a", _memory(0))
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from game.action.library.default import user_input
+from game.agent import Agent
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.memory.dict_memory import DictMemory
+from game.memory.item import MemoryItem
+from game.prompt import Prompt
+from game.suspension import (
+    InMemorySuspendedRunStore,
+    RunSuspended,
+    SnapshotSuspendedRunStore,
+    SuspendedRun,
+    SuspendedRunNotFoundError,
+)
+
+
+class AskThenTerminateLlm(Llm):
+    """Asks the user once, then terminates with the last message of the prompt"""
+
+    @property
+    def name(self) -> str:
+        return "AskThenTerminateLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        if not any("Where to?" in str(m.get("content")) for m in prompt.messages):
+            return json.dumps({"tool": "user_input", "args": {"message": "Where to?"}})
+        last = prompt.messages[-1]["content"]
+        return json.dumps({"tool": "terminate", "args": {"message": f"got {last}"}})
+
+
+def _agent(store, name: str = "travel_agent") -> Agent:
+    return Agent(
+        name=name,
+        goals=[Goal(priority=1, name="Plan", description="Plan the trip")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=AskThenTerminateLlm(),
+        tools=[user_input],
+        debug_log_memory=False,
+        suspended_run_store=store,
+    )
+
+
+@pytest.fixture(params=["memory", "snapshot"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySuspendedRunStore()
+    return SnapshotSuspendedRunStore(tmp_path / "suspended", compression_level=1)
+
+
+def test_run_suspends_on_user_input_and_resumes(store):
+    with pytest.raises(RunSuspended) as suspended:
+        _agent(store).run(user_input="Plan my trip", action_context_props={"a": 1})
+
+    assert suspended.value.message == "Where to?"
+    assert len(store) == 1
+
+    # eg another agent instance of another process sharing the store
+    memory = _agent(store).resume(suspended.value.token, reply="Lisbon")
+
+    items = memory.get_memories()
+    assert [m["type"] for m in items] == [
+        "user",
+        "assistant",
+        "environment",
+        "assistant",
+        "environment",
+    ]
+    reply = json.loads(items[2]["content"])
+    assert (reply["action"], reply["result"]) == ("user_input", "Lisbon")
+    assert "Lisbon" in json.loads(items[-1]["content"])["result"]
+    assert len(store) == 0
+
+
+def test_resuming_twice_fails(store):
+    with pytest.raises(RunSuspended) as suspended:
+        _agent(store).run(user_input="Plan my trip")
+    _agent(store).resume(suspended.value.token, reply="Lisbon")
+
+    with pytest.raises(SuspendedRunNotFoundError):
+        _agent(store).resume(suspended.value.token, reply="Lisbon")
+
+
+def test_other_agents_cannot_resume_the_run(store):
+    with pytest.raises(RunSuspended) as suspended:
+        _agent(store).run(
+            user_input="Plan my trip", action_context_props={"session_id": "a"}
+        )
+    token = suspended.value.token
+
+    with pytest.raises(SuspendedRunNotFoundError):
+        _agent(store, name="other_agent").resume(token, reply="Lisbon")
+    with pytest.raises(SuspendedRunNotFoundError):
+        _agent(store).resume(
+            token, reply="Lisbon", expected_properties={"session_id": "b"}
+        )
+
+    # the run stays in the store for its owner
+    assert len(store) == 1
+    memory = _agent(store).resume(
+        token, reply="Lisbon", expected_properties={"session_id": "a"}
+    )
+    assert "Lisbon" in memory.get_memories()[-1]["content"]
+
+
+def test_resume_requires_a_store():
+    with pytest.raises(ValueError):
+        _agent(None).resume("token", reply="Lisbon")
+
+
+def test_stores_keep_the_run_state(store):
+    memory = DictMemory()
+    memory.add_memory(MemoryItem("user", "Plan my trip", agent="travel_agent"))
+    token = store.save(
+        SuspendedRun(
+            agent_name="travel_agent",
+            memory=memory,
+            iteration=3,
+            tool_name="user_input",
+            message="Where to?",
+            properties={"user_id": 42},
+        )
+    )
+
+    run = store.pop(token)
+
+    assert (run.token, run.agent_name, run.iteration) == (token, "travel_agent", 3)
+    assert (run.tool_name, run.message) == ("user_input", "Where to?")
+    assert run.properties == {"user_id": 42}
+    assert run.memory.get_memories()[0]["content"] == "Plan my trip"
+
+
+def test_snapshot_store_rejects_path_tokens(tmp_path):
+    with pytest.raises(SuspendedRunNotFoundError):
+        SnapshotSuspendedRunStore(tmp_path).pop("../secret")
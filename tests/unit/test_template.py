@@ -0,0 +1,61 @@
+from game.action.library.default import terminate
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.prompt import Prompt
+from game.template import AgentTemplate
+
+
+class EchoLlm(Llm):
+    @property
+    def name(self) -> str:
+        return "EchoLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        task = prompt.messages[-1]["content"]
+        return f'{{"tool": "terminate", "args": {{"message": "echo {task}"}}}}'
+
+
+def _template(**kwargs) -> AgentTemplate:
+    return AgentTemplate(
+        name="echo_agent",
+        goals=[Goal(priority=1, name="Echo", description="Echo the user")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=EchoLlm(),
+        debug_log_memory=False,
+        **kwargs,
+    )
+
+
+def test_spawned_agents_share_the_immutable_parts():
+    tools = []
+    template = _template(tools=tools)
+    first, second = template.spawn(), template.spawn(name="other", max_iterations=3)
+
+    assert tools == []
+    assert first is not second
+    assert first.actions is second.actions and first.llm is second.llm
+    assert first.actions.get_action("terminate").function is terminate.function
+    assert (first.name, first.max_iterations) == ("echo_agent", 50)
+    assert (second.name, second.max_iterations) == ("other", 3)
+    assert second.description == template.description
+
+
+def test_spawned_agents_run_independently():
+    template = _template()
+    first = template.spawn().run(user_input="one")
+    second = template.spawn(name="other").run(user_input="two")
+
+    assert "echo one" in first.get_memories()[-1]["content"]
+    assert "echo two" in second.get_memories()[-1]["content"]
+    assert {m["agent"] for m in second.get_memories()} == {"other"}
+
+
+def test_spawned_agents_count_their_own_stats():
+    template = _template()
+    first, second = template.spawn(), template.spawn()
+    first.run(user_input="one")
+
+    assert first.repair_stats.responses == 1
+    assert second.repair_stats.responses == 0
+    assert first.structured_output_stats is not second.structured_output_stats
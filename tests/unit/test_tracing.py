@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from game import tracing
+from game.action.library.multi_agent import call_agents_parallel
+from tests.unit.helpers import TERMINATE, ScriptedLlm, make_agent
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter()
+    previous = tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(previous)
+
+
+def test_tracing_is_disabled_by_default():
+    assert not tracing.is_enabled()
+    with tracing.start_span("noop") as span:
+        span.set_attribute("key", "value")
+    assert span is tracing.NO_OP_SPAN
+
+
+def test_span_nesting_and_errors(exporter):
+    with pytest.raises(ValueError):
+        with tracing.start_span("root", {"key": 1}) as root:
+            with tracing.start_span("child"):
+                pass
+            raise ValueError("boom")
+
+    child, exported_root = exporter.spans
+    assert exported_root is root and exported_root.status == tracing.SpanStatus.ERROR
+    assert child.parent_span_id == root.span_id and child.trace_id == root.trace_id
+    assert root.parent_span_id is None and root.attributes == {"key": 1}
+    assert child.duration_ms >= 0
+
+
+def test_sub_agent_runs_nest_under_the_calling_tool(exporter):
+    worker = make_agent(name="worker", llm=ScriptedLlm(TERMINATE))
+    manager = make_agent(
+        name="manager",
+        llm=ScriptedLlm(
+            {
+                "tool": "call_agents_parallel",
+                "args": {"calls": [{"agent_name": "worker", "task": "work"}] * 2},
+            },
+            TERMINATE,
+        ),
+        managed_agents=[worker],
+        multi_agents_memory_model=call_agents_parallel,
+    )
+    manager.run(user_input="delegate")
+
+    spans = {s.span_id: s for s in exporter.spans}
+    assert len({s.trace_id for s in spans.values()}) == 1
+
+    def path(span):
+        names = []
+        while span:
+            names.append(span.name)
+            span = spans.get(span.parent_span_id)
+        return names[::-1]
+
+    worker_runs = [
+        s
+        for s in spans.values()
+        if s.name == "agent.run" and s.attributes["agent.name"] == "worker"
+    ]
+    assert len(worker_runs) == 2
+    assert path(worker_runs[0]) == [
+        "agent.run",
+        "agent.iteration",
+        "environment.execute_action",
+        "agent.call",
+        "agent.run",
+    ]
+
+    manager_run = next(s for s in spans.values() if s.parent_span_id is None)
+    assert manager_run.attributes["agent.iterations"] == 2
+    prompt_span = next(s for s in spans.values() if s.name == "agent.construct_prompt")
+    assert prompt_span.attributes["prompt.messages"] > 0
+    assert prompt_span.attributes["prompt.tools"] == 2
+
+
+def test_otlp_file_exporter(tmp_path):
+    exporter = tracing.OtlpJsonFileExporter(tmp_path / "traces.jsonl")
+    previous = tracing.set_exporter(exporter)
+    try:
+        with tracing.start_span("root", {"tokens": 3, "ratio": 0.5}):
+            with tracing.start_span("child"):
+                pass
+    finally:
+        tracing.set_exporter(previous)
+        exporter.shutdown()
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    child, root = [
+        json.loads(l)["resourceSpans"][0]["scopeSpans"][0]["spans"][0] for l in lines
+    ]
+    assert child["parentSpanId"] == root["spanId"] and "parentSpanId" not in root
+    assert root["attributes"] == [
+        {"key": "tokens", "value": {"intValue": "3"}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+    ]
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+
+from game.action import tool
+from game.agent import Agent
+from game.hooks import Stage
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.template import AgentTemplate
+from game.turn import Turn
+from tests.unit.helpers import TERMINATE, ScriptedLlm, make_agent
+
+
+class CountingLanguage(AgentFunctionCallingActionLanguage):
+    def __init__(self):
+        super().__init__()
+        self.parses = 0
+
+    def parse_response(self, response: str) -> dict:
+        self.parses += 1
+        return super().parse_response(response)
+
+
+DELETE = {"tool": "delete_file", "args": {"path": "notes.txt"}}
+
+deleted = []
+
+
+@tool()
+def delete_file(path: str) -> str:
+    """Deletes a file"""
+    deleted.append(path)
+    return f"Deleted {path}"
+
+
+def _agent(llm: Llm, **kwargs) -> Agent:
+    return make_agent(llm, tools=[delete_file], **kwargs)
+
+
+def test_the_response_is_parsed_once_per_iteration():
+    language = CountingLanguage()
+    agent = _agent(ScriptedLlm(DELETE, DELETE, TERMINATE), agent_language=language)
+
+    agent.run("Clean up")
+
+    assert language.parses == 3
+
+
+def test_a_stage_inserted_before_the_tool_can_replace_it():
+    deleted.clear()
+    turns: list[Turn] = []
+
+    def guardrail(turn: Turn) -> None:
+        if turn.invocation and turn.invocation["tool"] == "delete_file":
+            turn.result = {"tool_executed": False, "error": "Deleting isn't allowed"}
+
+    agent = _agent(ScriptedLlm(DELETE, TERMINATE))
+    agent.add_turn_stage("guardrail", guardrail, before=Stage.TOOL)
+    agent.add_turn_stage("record", turns.append)
+
+    memory = agent.run("Clean up")
+
+    assert deleted == []
+    assert "Deleting isn't allowed" in memory.get_memories()[2]["content"]
+    assert [n for n, _ in agent.turn_stages].index("guardrail") == 3
+    assert [t.action.name for t in turns] == ["delete_file", "terminate"]
+    assert not turns[0].terminate and turns[1].terminate
+    assert set(turns[0].timings) == {n for n, _ in agent.turn_stages}
+    assert all(ns >= 0 for ns in turns[0].timings.values())
+
+
+def test_unknown_anchor():
+    agent = _agent(ScriptedLlm(TERMINATE))
+
+    with pytest.raises(ValueError):
+        agent.add_turn_stage("guardrail", lambda turn: None, after="unknown")
+
+
+def test_copies_run_their_own_stages():
+    deleted.clear()
+    agent = _agent(ScriptedLlm(TERMINATE))
+    agent.add_turn_stage("noop", lambda turn: None)
+
+    copied = copy.copy(agent)
+    spawned = AgentTemplate(
+        goals=agent.goals,
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=agent.llm,
+    ).spawn()
+
+    assert copied.turn_stages[0][1].__self__ is copied
+    assert copied.turn_stages[-1] == agent.turn_stages[-1]
+    assert spawned.turn_stages[0][1].__self__ is spawned
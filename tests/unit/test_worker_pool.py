@@ -0,0 +1,163 @@
+import os
+import time
+
+import pytest
+
+from game.action import tool
+from game.action.context import ActionContext
+from game.action.library.default import terminate
+from game.action.library.multi_agent import call_agent_memory_handoff
+from game.agent import Agent
+from game.budget import Budget, BudgetExceeded
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.memory.dict_memory import DictMemory
+from game.prompt import Prompt
+from game.worker_pool import (
+    AgentWorkerPool,
+    ProcessAgentRegistry,
+    WorkerPoolBusyError,
+    WorkerPoolError,
+)
+
+
+class ScriptedLlm(Llm):
+    def __init__(self, response: str):
+        self.response = response
+
+    @property
+    def name(self) -> str:
+        return "ScriptedLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        return self.response
+
+
+@tool()
+def crash() -> str:
+    """Kills the worker process"""
+    os._exit(1)
+
+
+@tool()
+def sleep() -> str:
+    """Sleeps for a while"""
+    time.sleep(30)
+    return "slept"
+
+
+def build_sleeping_agent() -> Agent:
+    return Agent(
+        name="sleeping_agent",
+        goals=[Goal(priority=1, name="Sleep", description="Sleep")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=ScriptedLlm('{"tool": "sleep", "args": {}}'),
+        tools=[sleep, terminate],
+        max_iterations=1,
+    )
+
+
+def build_echo_agent() -> Agent:
+    return Agent(
+        name="echo_agent",
+        description="Echoes the pid of its process",
+        goals=[Goal(priority=1, name="Echo", description="Echo")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=ScriptedLlm(
+            f'{{"tool": "terminate", "args": {{"message": "pid {os.getpid()}"}}}}'
+        ),
+        tools=[terminate],
+        debug_log_memory=False,
+    )
+
+
+def build_crashing_agent() -> Agent:
+    return Agent(
+        name="crashing_agent",
+        goals=[Goal(priority=1, name="Crash", description="Crash")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=ScriptedLlm('{"tool": "crash", "args": {}}'),
+        tools=[crash, terminate],
+        max_iterations=1,
+    )
+
+
+@pytest.fixture
+def registry():
+    registry = ProcessAgentRegistry(mp_context="fork")
+    yield registry
+    registry.shutdown()
+
+
+def test_remote_agent_runs_in_worker_process(registry):
+    agent = registry.register_process_agent(build_echo_agent, workers=2)
+    assert registry.get_agent("echo_agent") is agent
+    assert registry.get_agent_descriptions() == [
+        {"echo_agent": "Echoes the pid of its process"}
+    ]
+
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "previous message"})
+    result_memory = agent.run("echo", memory=memory)
+
+    assert result_memory is memory
+    assert len(memory.items) == 4
+    assert memory.items[-1]["type"] == "environment"
+    assert f"pid {os.getpid()}" not in memory.items[-1]["content"]
+
+
+def test_handoff_tool_works_with_remote_agents(registry):
+    registry.register_process_agent(build_echo_agent)
+    manager = Agent(
+        goals=[Goal(priority=1, name="Manage", description="Manage")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=ScriptedLlm("unused"),
+        agent_registry=registry,
+        multi_agents_memory_model=call_agent_memory_handoff,
+    )
+    memory = DictMemory()
+    memory.add_memory({"type": "user", "content": "hi"})
+    result = call_agent_memory_handoff(
+        ActionContext({"memory": memory, "agent_registry": manager.agent_registry}),
+        "echo_agent",
+        "echo",
+    )
+    assert result["success"]
+    assert "pid" in result["result"]
+    assert len(memory.items) == 4
+
+
+def test_crashed_worker_is_restarted(registry):
+    agent = registry.register_process_agent(build_crashing_agent)
+    with pytest.raises(WorkerPoolError):
+        agent.run("crash")
+    assert registry.pools["crashing_agent"].restarts == 1
+    assert registry.health_check() == 0
+
+
+def test_remote_agents_stop_at_the_deadline_of_the_budget(registry):
+    agent = registry.register_process_agent(build_sleeping_agent)
+
+    start = time.monotonic()
+    with pytest.raises(WorkerPoolError):
+        agent.run("sleep", budget=Budget(max_seconds=0.5))
+
+    assert time.monotonic() - start < 10
+    assert registry.pools["sleeping_agent"].restarts == 1
+    budget = Budget()
+    budget.cancel()
+    with pytest.raises(BudgetExceeded):
+        agent.run("sleep", budget=budget)
+
+
+def test_backpressure():
+    pool = AgentWorkerPool(build_echo_agent, workers=1, max_pending=0)
+    try:
+        pool._pending.acquire()
+        with pytest.raises(WorkerPoolBusyError):
+            pool.run("echo", [])
+        pool._pending.release()
+        assert pool.run("echo", [])[-1]["type"] == "environment"
+    finally:
+        pool.shutdown()
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from game.work_queue import InMemoryBroker, JobStatus, SQLiteBroker
+
+
+@pytest.fixture(params=["in_memory", "sqlite"])
+def broker(request, tmp_path):
+    if request.param == "in_memory":
+        return InMemoryBroker()
+    return SQLiteBroker(tmp_path / "jobs.db")
+
+
+def test_submit_lease_complete(broker):
+    job_id = broker.submit("module:factory", "hi")
+    job = broker.lease("worker")
+    assert job.id == job_id and job.status == JobStatus.LEASED and job.attempts == 1
+    assert broker.lease("other_worker") is None
+
+    assert not broker.complete(job_id, "other_worker", {"result": "nope"})
+    assert broker.complete(job_id, "worker", {"result": "done"})
+    job = broker.wait(job_id, timeout=1)
+    assert job.status == JobStatus.DONE and job.result == {"result": "done"}
+
+
+def test_failed_jobs_are_retried(broker):
+    job_id = broker.submit("module:factory", "hi", max_attempts=2)
+    assert broker.fail(broker.lease("worker").id, "worker", "boom")
+    assert broker.get_job(job_id).status == JobStatus.PENDING
+
+    assert broker.fail(broker.lease("worker").id, "worker", "boom again")
+    job = broker.get_job(job_id)
+    assert job.status == JobStatus.FAILED and job.error == "boom again"
+    assert broker.lease("worker") is None
+
+
+def test_expired_leases_are_released(broker):
+    job_id = broker.submit("module:factory", "hi", max_attempts=2)
+    broker.lease("dead_worker", lease_secs=0.01)
+    time.sleep(0.02)
+
+    job = broker.lease("worker", lease_secs=0.01)
+    assert job.id == job_id and job.attempts == 2
+    assert not broker.extend_lease(job_id, "dead_worker", 10)
+    time.sleep(0.02)
+
+    assert broker.lease("worker") is None
+    assert broker.get_job(job_id).status == JobStatus.FAILED
+
+
+def test_fair_scheduling_across_agent_specs(broker):
+    for i in range(3):
+        broker.submit("module:busy_agent", f"busy {i}")
+    broker.submit("module:other_agent", "other")
+
+    specs = [broker.lease("worker").agent_spec for _ in range(3)]
+    assert specs[1] == "module:other_agent"
+
+
+def test_lease_filters_agent_specs(broker):
+    broker.submit("module:a", "a")
+    job_id = broker.submit("module:b", "b")
+    assert broker.lease("worker", agent_specs=["module:b"]).id == job_id
+    assert broker.lease("worker", agent_specs=["module:b"]) is None
@@ -0,0 +1,186 @@
+import multiprocessing
+import socket
+
+import pytest
+
+from game.action.library.default import terminate
+from game.agent import Agent
+from game.goal import Goal
+from game.language import AgentFunctionCallingActionLanguage
+from game.llm.base import Llm
+from game.prompt import Prompt
+from game.work_queue import (
+    BrokerServer,
+    InMemoryBroker,
+    JobStatus,
+    QueueWorker,
+    RemoteBroker,
+    SQLiteBroker,
+)
+
+AGENT_SPEC = "tests.unit.work_queue.test_worker:build_agent"
+
+
+class EchoLlm(Llm):
+    @property
+    def name(self) -> str:
+        return "EchoLlm"
+
+    def __call__(self, prompt: Prompt) -> str:
+        task = prompt.messages[-1]["content"]
+        return f'{{"tool": "terminate", "args": {{"message": "echo {task}"}}}}'
+
+
+def build_agent() -> Agent:
+    return Agent(
+        name="echo_agent",
+        goals=[Goal(priority=1, name="Echo", description="Echo")],
+        agent_language=AgentFunctionCallingActionLanguage(),
+        llm=EchoLlm(),
+        tools=[terminate],
+        debug_log_memory=False,
+    )
+
+
+def test_worker_runs_jobs_and_fails_unknown_agents():
+    broker = InMemoryBroker()
+    missing_spec = "tests.unit.work_queue.test_worker:missing"
+    job_id = broker.submit(AGENT_SPEC, "hi")
+    bad_job_id = broker.submit(missing_spec, "hi", 1)
+    other_job_id = broker.submit("os:system", "hi")
+
+    worker = QueueWorker(broker, [AGENT_SPEC, missing_spec], poll_interval=0.01)
+    assert worker.run(idle_timeout=0.05) == 2
+    job = broker.get_job(job_id)
+    assert job.status == JobStatus.DONE
+    assert "echo hi" in job.result["result"]
+    assert len(job.result["memories"]) == 3
+    assert broker.get_job(bad_job_id).status == JobStatus.FAILED
+    # the jobs of other specs are left to the workers running them
+    assert broker.get_job(other_job_id).status == JobStatus.PENDING
+
+
+class UnfilteredBroker(InMemoryBroker):
+    """Leases the jobs of any agent spec, eg a compromised broker server"""
+
+    def lease(self, worker_id, lease_secs=60.0, agent_specs=None):
+        return super().lease(worker_id, lease_secs)
+
+
+def test_worker_only_runs_the_allowed_agent_specs():
+    broker = UnfilteredBroker()
+    job_id = broker.submit(
+        "tests.unit.work_queue.test_worker:build_agent.__globals__", "hi", 1
+    )
+
+    QueueWorker(broker, [AGENT_SPEC]).run(max_jobs=1)
+
+    job = broker.get_job(job_id)
+    assert job.status == JobStatus.FAILED and "isn't allowed" in job.error
+    with pytest.raises(ValueError):
+        QueueWorker(broker, [])
+
+
+def _run_worker(db_path: str) -> None:
+    QueueWorker(SQLiteBroker(db_path), [AGENT_SPEC], poll_interval=0.01).run(
+        idle_timeout=1.0
+    )
+
+
+def test_several_worker_processes_share_a_sqlite_queue(tmp_path):
+    broker = SQLiteBroker(tmp_path / "jobs.db")
+    job_ids = [broker.submit(AGENT_SPEC, f"task {i}") for i in range(12)]
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_run_worker, args=(str(tmp_path / "jobs.db"),))
+        for _ in range(3)
+    ]
+    for p in processes:
+        p.start()
+    jobs = [broker.wait(job_id, timeout=30) for job_id in job_ids]
+    for p in processes:
+        p.join()
+
+    assert all(job.status == JobStatus.DONE for job in jobs)
+    assert [job.attempts for job in jobs] == [1] * 12
+    assert all(f"echo task {i}" in job.result["result"] for i, job in enumerate(jobs))
+
+
+def test_remote_broker():
+    server = BrokerServer(InMemoryBroker())
+    server.start()
+    try:
+        broker = RemoteBroker(*server.address)
+        job_id = broker.submit(AGENT_SPEC, "remote")
+        assert QueueWorker(broker, [AGENT_SPEC]).run(max_jobs=1) == 1
+        assert broker.get_job(job_id).status == JobStatus.DONE
+        assert broker.get_job("missing") is None
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class LostReplyFile:
+    """Sends the requests but loses the first reply, like a connection dropped after the server applied a request"""
+
+    def __init__(self, file):
+        self.file = file
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def readline(self) -> bytes:
+        return b""
+
+    def close(self) -> None:
+        self.closed = True
+        self.file.close()
+
+
+def test_remote_broker_retries_are_applied_once():
+    broker = InMemoryBroker()
+    server = BrokerServer(broker)
+    server.start()
+    try:
+        remote = RemoteBroker(*server.address)
+        job_id = remote.submit(AGENT_SPEC, "first")
+
+        lost = remote._local.file = LostReplyFile(remote._local.file)
+        retried_job_id = remote.submit(AGENT_SPEC, "second")
+        assert lost.closed
+        remote._local.file = LostReplyFile(remote._local.file)
+        leased = remote.lease("worker")
+
+        assert len(broker.jobs) == 2 and retried_job_id in broker.jobs
+        assert leased.id == job_id
+        assert remote.lease("worker").id == retried_job_id
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_remote_broker_retries_failed_connections(monkeypatch):
+    server = BrokerServer(InMemoryBroker())
+    server.start()
+    create_connection = socket.create_connection
+    attempts = []
+
+    def refuse_once(*args, **kwargs):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise ConnectionRefusedError("refused")
+        return create_connection(*args, **kwargs)
+
+    monkeypatch.setattr(socket, "create_connection", refuse_once)
+    try:
+        remote = RemoteBroker(*server.address)
+        assert remote.get_job(remote.submit(AGENT_SPEC, "task")) is not None
+        assert len(attempts) == 2
+    finally:
+        server.shutdown()
+        server.server_close()